@@ -1,6 +1,10 @@
 from django.contrib import admin
+from django.http import HttpResponse
+from django.shortcuts import get_object_or_404
+from django.urls import path
+from django.utils.html import format_html
 
-from api.models import Channel, Channel2Frontend
+from api.models import Booking, Channel, Channel2Frontend, Failover, Lease, LoadSeries, Node, Operation, RequestProfile
 
 
 @admin.register(Channel2Frontend)
@@ -10,7 +14,7 @@ class C2FAdmin(admin.ModelAdmin):
 
 @admin.register(Channel)
 class ChannelAdmin(admin.ModelAdmin):
-    list_display = ("__str__", "streamed", "bigbluebutton", "bbb_live")
+    list_display = ("__str__", "streamed", "bigbluebutton", "bbb_live", "stream_edge", "standby_edge", "stream_chat")
 
     def streamed(self, channel):
         return channel.bbb_live is not None
@@ -21,3 +25,68 @@ class ChannelAdmin(admin.ModelAdmin):
             return "-"
         else:
             return str(channel.bbb_chat.bbb)
+
+
+@admin.register(Node)
+class NodeAdmin(admin.ModelAdmin):
+    list_display = ("__str__", "url", "last_seen")
+
+
+@admin.register(Lease)
+class LeaseAdmin(admin.ModelAdmin):
+    list_display = ("__str__", "owner", "expires")
+
+
+@admin.register(Failover)
+class FailoverAdmin(admin.ModelAdmin):
+    list_display = ("__str__", "component", "failed_live", "replacement_live", "detected_at", "recovery_seconds")
+
+
+@admin.register(Operation)
+class OperationAdmin(admin.ModelAdmin):
+    list_display = ("__str__", "state", "status_code", "created")
+    readonly_fields = ("steps",)
+
+
+@admin.register(RequestProfile)
+class RequestProfileAdmin(admin.ModelAdmin):
+    list_display = ("__str__", "status_code", "seconds", "user", "created", "download")
+    exclude = ("stats",)
+    readonly_fields = ("method", "path", "status_code", "seconds", "user", "summary")
+
+    def download(self, profile):
+        return format_html("<a href=\"{}/download/\">.prof</a>", profile.id)
+
+    def get_urls(self):
+        return [
+            path("<int:profile_id>/download/", self.admin_site.admin_view(self.download_view)),
+            *super().get_urls(),
+        ]
+
+    def download_view(self, request, profile_id):
+        profile = get_object_or_404(RequestProfile, id=profile_id)
+        response = HttpResponse(bytes(profile.stats), content_type="application/octet-stream")
+        response["Content-Disposition"] = f"attachment; filename=request-{profile.id}.prof"
+        return response
+
+    def has_add_permission(self, request):
+        return False
+
+
+@admin.register(LoadSeries)
+class LoadSeriesAdmin(admin.ModelAdmin):
+    list_display = ("meeting_id", "name", "resolution", "start")
+    list_filter = ("resolution", "name")
+    search_fields = ("meeting_id",)
+    exclude = ("values",)
+    readonly_fields = ("meeting_id", "name", "resolution", "start")
+
+    def has_add_permission(self, request):
+        return False
+
+
+@admin.register(Booking)
+class BookingAdmin(admin.ModelAdmin):
+    list_display = ("meeting_id", "start", "end", "created")
+    search_fields = ("meeting_id",)
+    ordering = ("start",)
@@ -0,0 +1,99 @@
+import math
+import threading
+import time
+
+from django.conf import settings
+
+
+class Rejected(Exception):
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"Retry after {retry_after:.2f}s")
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """
+    Token bucket holding up to `burst` tokens, refilled by `rate` tokens per second
+    """
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def take(self):
+        """
+        Take a token.
+
+        Raises `Rejected` with the seconds until the next token, if the bucket is empty.
+        """
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens < 1:
+                raise Rejected((1 - self._tokens) / self.rate)
+            self._tokens -= 1
+
+    def refund(self):
+        with self._lock:
+            self._tokens = min(self.burst, self._tokens + 1)
+
+    @property
+    def idle(self) -> bool:
+        with self._lock:
+            self._refill(time.monotonic())
+            return self._tokens >= self.burst
+
+
+class JoinAdmission:
+    """
+    Admission control for joinStream with a global and a per channel bucket.
+
+    The buckets live in the worker process, so the configured rates apply per worker.
+    Joins over the rate are rejected right away, waiting would hold one of the few sync workers.
+    """
+
+    max_channels = 10000
+
+    def __init__(self):
+        self.global_bucket = TokenBucket(settings.JOIN_RATE, settings.JOIN_BURST)
+        self.channel_buckets = {}
+        self._lock = threading.Lock()
+
+    def _channel_bucket(self, meeting_id: str) -> TokenBucket:
+        with self._lock:
+            bucket = self.channel_buckets.get(meeting_id)
+            if bucket is None:
+                if len(self.channel_buckets) >= self.max_channels:
+                    self.channel_buckets = {
+                        key: value for key, value in self.channel_buckets.items() if not value.idle
+                    }
+                bucket = TokenBucket(settings.JOIN_CHANNEL_RATE, settings.JOIN_CHANNEL_BURST)
+                self.channel_buckets[meeting_id] = bucket
+            return bucket
+
+    def admit(self, meeting_id: str):
+        """
+        Take the join's tokens.
+
+        Raises `Rejected` carrying the number of seconds the client should retry after.
+        """
+        self.global_bucket.take()
+        try:
+            self._channel_bucket(meeting_id).take()
+        except Rejected:
+            self.global_bucket.refund()
+            raise
+
+
+def retry_after_header(rejected: Rejected) -> str:
+    return str(max(1, math.ceil(rejected.retry_after)))
+
+
+join_admission = JoinAdmission() if settings.JOIN_ADMISSION else None
@@ -0,0 +1,176 @@
+"""
+Capacity booked in advance for scheduled meetings
+
+Each `Booking` reserves one streamer and, with `EDGE_CAPACITY` set, one edge channel (two with `EDGE_REDUNDANCY`)
+from its start to its end.
+Conflicts are found with an `IntervalIndex` of the upcoming bookings kept by each process.
+Bookings and cancellations of the process itself update its index, it is only rebuilt after those of other
+processes or changes in the admin.
+
+Changes take the `BookingLock` row by updating it. Unlike `select_for_update()`, which SQLite ignores,
+this also serializes them on SQLite, where it locks the whole database.
+
+From `BOOKING_LEAD` seconds before its start a booking holds back its capacity:
+unbooked meetings only get what is left after all booked meetings which didn't open or start yet.
+"""
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Optional, Set
+
+from django.conf import settings
+from django.db import OperationalError, transaction
+from django.db.models import Count, F, Max
+from django.utils import timezone
+
+from api.intervals import IntervalIndex
+from api.models import Booking, BookingLock, Channel
+from children.models import BBBLive, ChildState, StreamEdge
+
+# Attempts to take the booking lock, SQLite gives up waiting for its database lock after a timeout
+LOCK_ATTEMPTS = 3
+
+_lock = threading.Lock()
+_index = IntervalIndex()
+_version = None
+
+
+def _current_version():
+    lock = BookingLock.objects.filter(id=1).values_list("version", flat=True).first()
+    version = Booking.objects.aggregate(count=Count("id"), last=Max("id"))
+    return lock, version["count"], version["last"]
+
+
+def get_index() -> IntervalIndex:
+    """
+    Index of the bookings which didn't end yet, keyed by `(booking id, meeting id)`
+    """
+    global _index, _version
+    version = _current_version()
+    with _lock:
+        if version != _version:
+            _index = IntervalIndex(
+                (start.timestamp(), end.timestamp(), (pk, meeting_id))
+                for pk, meeting_id, start, end in Booking.objects.filter(end__gt=timezone.now())
+                .values_list("id", "meeting_id", "start", "end")
+            )
+            _version = version
+        return _index
+
+
+def _locked(change):
+    """
+    Run `change(index)` in a transaction holding the booking lock
+
+    `change` applies its changes to the index as well, so it stays current without a rebuild.
+    """
+    global _version
+    for attempt in range(1, LOCK_ATTEMPTS + 1):
+        try:
+            with transaction.atomic():
+                BookingLock.objects.get_or_create(id=1)
+                before = _current_version()
+                BookingLock.objects.filter(id=1).update(version=F("version") + 1)
+                # Bookings which ended a day ago are of no use anymore, those in the index don't overlap anything
+                Booking.objects.filter(end__lt=timezone.now() - timedelta(days=1)).delete()
+                with _lock:
+                    if _version == before:
+                        # Nothing else changed since the index was built
+                        _version = _current_version()
+
+                index = get_index()
+                result = change(index)
+                with _lock:
+                    if index is _index:
+                        _version = _current_version()
+                return result
+        except OperationalError:
+            if attempt == LOCK_ATTEMPTS:
+                raise
+            time.sleep(0.1 * attempt)
+
+
+def _edge_slots() -> int:
+    """
+    Edge channels a meeting takes, with `EDGE_REDUNDANCY` a second one for its standby
+    """
+    return 2 if settings.EDGE_REDUNDANCY else 1
+
+
+def capacity() -> int:
+    """
+    Number of meetings which can stream at the same time
+    """
+    streamers = BBBLive.objects.filter(state=ChildState.ACTIVE).count()
+    if settings.EDGE_CAPACITY is None:
+        return streamers
+    slots = StreamEdge.objects.filter(state=ChildState.ACTIVE).count() * settings.EDGE_CAPACITY
+    return min(streamers, slots // _edge_slots())
+
+
+def book(meeting_id: str, start: datetime, end: datetime) -> Optional[Booking]:
+    """
+    Reserve capacity for a meeting, None if the window is full at some point
+
+    Raises `OperationalError` if the booking lock couldn't be taken.
+    """
+    def change(index):
+        if index.max_overlap(start.timestamp(), end.timestamp()) >= capacity():
+            return None
+        booking = Booking.objects.create(meeting_id=meeting_id, start=start, end=end)
+        with _lock:
+            index.add(start.timestamp(), end.timestamp(), (booking.id, meeting_id))
+        return booking
+
+    return _locked(change)
+
+
+def cancel(booking_id: int) -> bool:
+    """
+    Free a booking's capacity, False for an unknown booking
+
+    Raises `OperationalError` if the booking lock couldn't be taken.
+    """
+    def change(index):
+        booking = Booking.objects.filter(id=booking_id).first()
+        if booking is None:
+            return False
+        booking.delete()
+        with _lock:
+            try:
+                index.remove((booking_id, booking.meeting_id))
+            except ValueError:
+                # Ended before the index was built
+                pass
+        return True
+
+    return _locked(change)
+
+
+def booked_now(now: datetime = None) -> Set[str]:
+    """
+    Meetings whose booking holds back capacity right now
+    """
+    now = (now or timezone.now()).timestamp()
+    return {key[1] for _, _, key in get_index().overlapping(now, now + settings.BOOKING_LEAD + 1)}
+
+
+def reserved_streamers(exclude: str = None) -> int:
+    """
+    Streamers held back for booked meetings which aren't streaming yet
+    """
+    booked = booked_now() - {exclude}
+    if not booked:
+        return 0
+    streaming = Channel.objects.filter(meeting_id__in=booked, bbb_live__isnull=False).count()
+    return len(booked) - streaming
+
+
+def reserved_edges(exclude: str = None) -> int:
+    """
+    Edge channels held back for booked meetings which didn't open their channel yet
+    """
+    booked = booked_now() - {exclude}
+    if not booked:
+        return 0
+    return (len(booked) - Channel.objects.filter(meeting_id__in=booked).count()) * _edge_slots()
@@ -0,0 +1,248 @@
+"""
+Sharded ownership of meetings across several controller nodes
+
+Meetings are hashed into `CLUSTER_SHARDS` shards. Each shard is owned by the node holding
+its lease in the shared database. Only the owner orchestrates a shard's meetings; other
+nodes forward those requests to it. Leases are renewed and balanced by `manage.py cluster_heartbeat`.
+
+With `CLUSTER_ENABLED = False` this node owns everything.
+"""
+import hashlib
+import hmac
+import math
+import threading
+import zlib
+from contextlib import contextmanager
+from datetime import timedelta
+
+import requests
+from django.conf import settings
+from django.core.signing import BadSignature, TimestampSigner
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Q
+from django.http import HttpResponse, JsonResponse
+from django.utils import timezone
+from requests import RequestException
+
+from api.models import Lease, Node
+from children import deadline
+
+
+FORWARDED_HEADER = "X-Controller-Forwarded"
+
+
+def shard_of(meeting_id: str) -> int:
+    return zlib.crc32(meeting_id.encode("utf-8")) % settings.CLUSTER_SHARDS
+
+
+def _shard_lease(shard: int) -> str:
+    return f"shard-{shard}"
+
+
+def acquire(name: str) -> bool:
+    """
+    Take or renew a lease, returns whether this node holds it now
+    """
+    now = timezone.now()
+    expires = now + timedelta(seconds=settings.CLUSTER_LEASE_TTL)
+    node = settings.CLUSTER_NODE_NAME
+
+    taken = Lease.objects.filter(name=name).filter(Q(owner=node) | Q(expires__lt=now)).update(
+        owner=node, expires=expires
+    )
+    if taken:
+        return True
+
+    try:
+        with transaction.atomic():
+            Lease.objects.create(name=name, owner=node, expires=expires)
+        return True
+    except IntegrityError:
+        return False
+
+
+def release(name: str):
+    Lease.objects.filter(name=name, owner=settings.CLUSTER_NODE_NAME).delete()
+
+
+def holds(name: str) -> bool:
+    """
+    Whether this node may run a job guarded by the lease `name`
+    """
+    if not settings.CLUSTER_ENABLED:
+        return True
+    return acquire(name)
+
+
+@contextmanager
+def keeping(name: str, release_after: bool):
+    """
+    Renew the held lease `name` while the block runs, so a long job doesn't lose it halfway
+
+    With `release_after` the lease is released afterwards, instead of expiring while nobody renews it.
+    """
+    if not settings.CLUSTER_ENABLED:
+        yield
+        return
+
+    stop = threading.Event()
+
+    def renew():
+        try:
+            while not stop.wait(settings.CLUSTER_LEASE_TTL / 3):
+                acquire(name)
+        finally:
+            connection.close()
+
+    renewer = threading.Thread(target=renew, name=f"lease-{name}", daemon=True)
+    renewer.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        renewer.join()
+        if release_after:
+            release(name)
+
+
+def owned_shards():
+    """
+    Shards this node owns, None meaning all of them
+    """
+    if not settings.CLUSTER_ENABLED:
+        return None
+    names = Lease.objects.filter(
+        name__startswith="shard-", owner=settings.CLUSTER_NODE_NAME, expires__gte=timezone.now()
+    ).values_list("name", flat=True)
+    return [int(name[len("shard-"):]) for name in names]
+
+
+def local_channels(queryset):
+    """
+    Restrict a channel queryset to the shards owned by this node
+    """
+    shards = owned_shards()
+    if shards is None:
+        return queryset
+    return queryset.filter(shard__in=shards)
+
+
+def owner_of(meeting_id: str):
+    """
+    Get the node owning a meeting, None if it is this node
+    """
+    if not settings.CLUSTER_ENABLED:
+        return None
+
+    name = _shard_lease(shard_of(meeting_id))
+    lease = Lease.objects.filter(name=name, expires__gte=timezone.now()).first()
+    if lease is None:
+        # Orphaned shard, whoever sees it first takes it
+        if acquire(name):
+            return None
+        lease = Lease.objects.get(name=name)
+
+    if lease.owner == settings.CLUSTER_NODE_NAME:
+        return None
+    return Node.objects.filter(name=lease.owner).first()
+
+
+def _forward_digest(method: str, path: str, body: bytes) -> str:
+    return hashlib.sha256(f"{method} {path}\n".encode("utf-8") + body).hexdigest()
+
+
+def _forward_signer():
+    return TimestampSigner(key=settings.SHARED_SECRET, salt="api.cluster.forward")
+
+
+def is_forwarded(request) -> bool:
+    """
+    Whether the request was forwarded by another node, signed with the SHARED_SECRET
+    """
+    value = request.headers.get(FORWARDED_HEADER)
+    if value is None:
+        return False
+    try:
+        signed = _forward_signer().unsign(value, max_age=settings.CLUSTER_LEASE_TTL)
+    except BadSignature:
+        return False
+    _, _, digest = signed.rpartition(":")
+    return hmac.compare_digest(digest, _forward_digest(request.method, request.get_full_path(), request.body))
+
+
+def forward_to_owner(request, meeting_id: str):
+    """
+    Forward a request to the node owning the meeting
+
+    Returns the owner's response or None, if this node is responsible.
+    """
+    if is_forwarded(request):
+        return None
+
+    node = owner_of(meeting_id)
+    if node is None:
+        return None
+
+    headers = {
+        "content-type": request.content_type,
+        "user-agent": "bbb-controller",
+        FORWARDED_HEADER: _forward_signer().sign(
+            f"{settings.CLUSTER_NODE_NAME}:{_forward_digest(request.method, request.get_full_path(), request.body)}"
+        ),
+    }
+    timeout = deadline.remaining()
+    if timeout == 0.0:
+        return JsonResponse(
+            {"success": False, "message": "The deadline was exceeded before forwarding to the meeting's controller."},
+            status=504,
+            reason="The deadline was exceeded."
+        )
+    if timeout is not None:
+        # Hand the rest of the budget on to the owner
+        headers["X-Request-Timeout"] = str(timeout)
+
+    try:
+        response = requests.request(
+            request.method,
+            node.url.rstrip("/") + request.get_full_path(),
+            data=request.body,
+            headers=headers,
+            allow_redirects=False,
+            verify=settings.VERIFY_SSL_CERTS,
+            timeout=timeout,
+        )
+    except RequestException:
+        # Doing the work here could orchestrate the meeting twice
+        return JsonResponse(
+            {"success": False, "message": f"Couldn't reach the meeting's controller '{node}'."},
+            status=502,
+            reason="Couldn't reach the meeting's controller."
+        )
+
+    forwarded = HttpResponse(response.content, status=response.status_code, reason=response.reason,
+                             content_type=response.headers.get("content-type"))
+    if "location" in response.headers:
+        forwarded["Location"] = response.headers["location"]
+    return forwarded
+
+
+def heartbeat():
+    """
+    Announce this node, renew its leases and balance the shards between all alive nodes
+    """
+    now = timezone.now()
+    node = settings.CLUSTER_NODE_NAME
+    Node.objects.update_or_create(name=node, defaults={"url": settings.CLUSTER_NODE_URL, "last_seen": now})
+
+    alive = Node.objects.filter(last_seen__gte=now - timedelta(seconds=settings.CLUSTER_LEASE_TTL)).count()
+    target = math.ceil(settings.CLUSTER_SHARDS / max(alive, 1))
+
+    held = []
+    for shard in range(settings.CLUSTER_SHARDS):
+        name = _shard_lease(shard)
+        if len(held) >= target:
+            # Hand over surplus shards, so new nodes get their share
+            release(name)
+        elif acquire(name):
+            held.append(shard)
+    return held
@@ -0,0 +1,77 @@
+"""
+Index of half-open intervals `[start, end)` answering overlap queries
+
+Intervals are kept sorted by start. The list is split into blocks of `BLOCK` intervals, each knowing
+its latest end, so a query skips every block which ended before the queried window began.
+Past intervals cost one comparison per block, only overlapping ones are looked at individually.
+"""
+import bisect
+from typing import Hashable, Iterable, List, Tuple
+
+BLOCK = 64
+
+
+class IntervalIndex:
+
+    def __init__(self, intervals: Iterable[Tuple[float, float, Hashable]] = ()):
+        items = sorted(intervals, key=lambda item: item[0])
+        self._starts = [start for start, _, _ in items]
+        self._ends = [end for _, end, _ in items]
+        self._keys = [key for _, _, key in items]
+        self._block_ends = []
+        self._rebuild_blocks(0)
+
+    def __len__(self):
+        return len(self._starts)
+
+    def _rebuild_blocks(self, index: int):
+        first = index // BLOCK
+        del self._block_ends[first:]
+        for offset in range(first * BLOCK, len(self._ends), BLOCK):
+            self._block_ends.append(max(self._ends[offset:offset + BLOCK]))
+
+    def add(self, start: float, end: float, key: Hashable):
+        index = bisect.bisect_right(self._starts, start)
+        self._starts.insert(index, start)
+        self._ends.insert(index, end)
+        self._keys.insert(index, key)
+        self._rebuild_blocks(index)
+
+    def remove(self, key: Hashable):
+        index = self._keys.index(key)
+        del self._starts[index], self._ends[index], self._keys[index]
+        self._rebuild_blocks(index)
+
+    def overlapping(self, start: float, end: float) -> List[Tuple[float, float, Hashable]]:
+        """
+        All intervals sharing some time with `[start, end)`
+        """
+        stop = bisect.bisect_left(self._starts, end)
+        found = []
+        for block, block_end in enumerate(self._block_ends):
+            offset = block * BLOCK
+            if offset >= stop:
+                break
+            if block_end <= start:
+                continue
+            for i in range(offset, min(offset + BLOCK, stop)):
+                if self._ends[i] > start:
+                    found.append((self._starts[i], self._ends[i], self._keys[i]))
+        return found
+
+    def max_overlap(self, start: float, end: float) -> int:
+        """
+        Highest number of intervals running at the same time within `[start, end)`
+        """
+        changes = []
+        for other_start, other_end, _ in self.overlapping(start, end):
+            changes.append((max(other_start, start), 1))
+            changes.append((min(other_end, end), -1))
+        # Ends sort before starts at the same time, intervals are half-open
+        changes.sort(key=lambda change: (change[0], change[1]))
+
+        running = highest = 0
+        for _, change in changes:
+            running += change
+            highest = max(highest, running)
+        return highest
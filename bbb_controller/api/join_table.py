@@ -0,0 +1,85 @@
+"""
+Signed assignment table of channels to frontends
+
+The table lets `join_handler.py` answer joinStream without entering django.
+Joins redirected by the handler are appended to a spool file and folded back into `Channel2Frontend`.
+"""
+import hashlib
+import hmac
+import json
+import os
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db.models import F
+
+from api.models import Channel2Frontend
+from children.models import ChildState
+
+
+def sign(payload: str, secret: str) -> str:
+    return hmac.new(secret.encode("utf-8"), payload.encode("utf-8"), hashlib.sha256).hexdigest()
+
+
+def build_join_table() -> dict:
+    channels = {}
+    frontends = {}
+    # Channels served only by inactive frontends are left to django's fallback
+    c2fs = Channel2Frontend.objects.filter(frontend__state=ChildState.ACTIVE).select_related("channel", "frontend")
+    for c2f in c2fs:
+        channels.setdefault(c2f.channel.meeting_id, []).append([c2f.frontend_id, c2f.viewers])
+        frontends[c2f.frontend_id] = [c2f.frontend.url, c2f.frontend.secret]
+
+    # Weight frontends by how far they are behind the channel's busiest frontend
+    for assignments in channels.values():
+        most = max(viewers for _, viewers in assignments)
+        for assignment in assignments:
+            assignment[1] = most - assignment[1] + 1
+
+    return {
+        "created": int(time.time()),
+        "channels": channels,
+        "frontends": frontends,
+    }
+
+
+def write_join_table(table: dict, path=None):
+    path = str(path or settings.JOIN_TABLE_PATH)
+    payload = json.dumps(table, separators=(",", ":"))
+    content = json.dumps({"payload": payload, "signature": sign(payload, settings.SHARED_SECRET)})
+
+    # The table contains the frontends' secrets
+    tmp_path = path + ".tmp"
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o640)
+    with os.fdopen(fd, "w") as file:
+        file.write(content)
+    os.replace(tmp_path, path)
+
+
+def fold_join_spool(path=None) -> int:
+    """
+    Add the joins recorded by the join handler to the viewer counters
+
+    Returns the number of folded joins.
+    """
+    path = str(path or settings.JOIN_SPOOL_PATH)
+    folding_path = path + ".folding"
+
+    # A leftover from an interrupted run is folded first
+    if not os.path.exists(folding_path):
+        try:
+            os.replace(path, folding_path)
+        except FileNotFoundError:
+            return 0
+
+    with open(folding_path) as file:
+        joins = Counter(tuple(line.rstrip("\n").split("\t")) for line in file if line.count("\t") == 1)
+
+    for (meeting_id, frontend_id), count in joins.items():
+        Channel2Frontend.objects.filter(
+            channel__meeting_id=meeting_id, frontend_id=frontend_id
+        ).update(viewers=F("viewers") + count)
+
+    os.remove(folding_path)
+    return sum(joins.values())
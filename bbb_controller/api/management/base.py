@@ -0,0 +1,43 @@
+import time
+
+from django.conf import settings
+from django.core.management import BaseCommand
+from django.db import close_old_connections
+
+from api.cluster import holds, keeping
+
+
+class PeriodicCommand(BaseCommand):
+    """
+    Command which runs once or, given `--interval`, repeats forever
+
+    Subclasses implement `run_once`.
+    Commands doing fleet-wide work name a `lease`, so only one controller node runs them at a time.
+    Commands working on channels should restrict themselves to `api.cluster.local_channels`.
+    """
+
+    lease = None
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--interval", type=float, default=None,
+            help="Repeat every INTERVAL seconds instead of running once"
+        )
+
+    def handle(self, *args, **options):
+        interval = options["interval"]
+        while True:
+            started = time.monotonic()
+            if self.lease is None:
+                self.run_once(**options)
+            elif holds(self.lease):
+                # Without another run before the lease expires, hand it to whichever node runs first
+                with keeping(self.lease, release_after=interval is None or interval >= settings.CLUSTER_LEASE_TTL):
+                    self.run_once(**options)
+            if interval is None:
+                return
+            close_old_connections()
+            time.sleep(max(0.0, interval - (time.monotonic() - started)))
+
+    def run_once(self, **options):
+        raise NotImplementedError
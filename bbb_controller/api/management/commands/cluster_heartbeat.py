@@ -0,0 +1,15 @@
+from django.conf import settings
+
+from api.cluster import heartbeat
+from api.management.base import PeriodicCommand
+
+
+class Command(PeriodicCommand):
+    help = "Announce this controller node and renew and balance its shard leases"
+
+    def run_once(self, **options):
+        if not settings.CLUSTER_ENABLED:
+            return
+        shards = heartbeat()
+        if options["verbosity"] > 1:
+            self.stdout.write(f"Holding {len(shards)} of {settings.CLUSTER_SHARDS} shards")
@@ -0,0 +1,16 @@
+from django.contrib.auth import get_user_model
+from django.core.management import BaseCommand, CommandError
+
+from api.middleware import PROFILE_HEADER, profile_token
+
+
+class Command(BaseCommand):
+    help = "Print a header which makes the controller profile a request"
+
+    def add_arguments(self, parser):
+        parser.add_argument("username", help="Staff user the profiles are triggered by")
+
+    def handle(self, *args, **options):
+        if not get_user_model().objects.filter(username=options["username"], is_staff=True).exists():
+            raise CommandError(f"There is no staff user '{options['username']}'")
+        self.stdout.write(f"{PROFILE_HEADER}: {profile_token(options['username'])}")
@@ -0,0 +1,13 @@
+from api.join_table import build_join_table, fold_join_spool, write_join_table
+from api.management.base import PeriodicCommand
+
+
+class Command(PeriodicCommand):
+    help = "Fold the join handler's spool into the viewer counters and publish a new join table"
+
+    def run_once(self, **options):
+        joins = fold_join_spool()
+        table = build_join_table()
+        write_join_table(table)
+        if options["verbosity"] > 1:
+            self.stdout.write(f"Folded {joins} joins, published {len(table['channels'])} channels")
@@ -0,0 +1,99 @@
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from api import streams
+from api.management.base import PeriodicCommand
+from api.models import Channel, OrphanSighting
+from children.models import BBBChat, BBBLive, StreamChat, StreamEdge
+
+
+# name, model, listing method, key of the listed meeting ids, channel lookup, stopping method
+CHECKS = [
+    ("bbb-chat", BBBChat, BBBChat.running_chats, "chats", ["bbb_chat"], BBBChat.end_chat),
+    ("stream-chat", StreamChat, StreamChat.running_chats, "chats", ["stream_chat"], StreamChat.end_chat),
+    ("bbb-live", BBBLive, BBBLive.running_streams, "streams", ["bbb_live", "prewarmed_live"], BBBLive.stop_stream),
+    ("stream-edge", StreamEdge, StreamEdge.open_channels, "channels", ["stream_edge", "standby_edge"],
+     StreamEdge.close_channel),
+]
+
+
+class Command(PeriodicCommand):
+    help = "Stop streams, chats and channels running on children without a matching channel"
+    lease = "reconcile_orphans"
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument(
+            "--dry-run", action="store_true",
+            help="Only report orphans and missing work, don't stop anything"
+        )
+
+    def run_once(self, **options):
+        now = timezone.now()
+        # Work started by an openChannel or startStream, which didn't save its channel yet, looks orphaned as well
+        grace = now - timedelta(seconds=settings.ORPHAN_GRACE)
+        sighted = set()
+
+        for name, model, list_running, key, lookups, stop in CHECKS:
+            children = list(model.objects.all())
+            with ThreadPoolExecutor(max_workers=max(1, min(len(children), 16))) as executor:
+                responses = list(executor.map(list_running, children))
+
+            # Meeting ids each child should be working on
+            expected = defaultdict(set)
+            for lookup in lookups:
+                for child_id, meeting_id in Channel.objects.filter(**{f"{lookup}__isnull": False}) \
+                        .values_list(lookup, "meeting_id"):
+                    expected[child_id].add(meeting_id)
+
+            for child, response in zip(children, responses):
+                if not response["success"]:
+                    self.stderr.write(f"{name} '{child}': couldn't list running work: {response['message']}")
+                    continue
+
+                running = (response.get("content") or {}).get(key)
+                if not isinstance(running, list):
+                    self.stderr.write(f"{name} '{child}': couldn't list running work: malformed response")
+                    continue
+
+                running = set(running)
+                for meeting_id in sorted(expected[child.id] - running):
+                    self.stdout.write(f"{name} '{child}': missing '{meeting_id}'")
+
+                for meeting_id in sorted(running - expected[child.id]):
+                    # Don't race a channel which was assigned in the meantime
+                    assigned = Q()
+                    for lookup in lookups:
+                        assigned |= Q(**{lookup: child})
+                    if Channel.objects.filter(assigned, meeting_id=meeting_id).exists():
+                        continue
+
+                    sighting, _ = OrphanSighting.objects.get_or_create(
+                        child=f"{name} {child}", meeting_id=meeting_id, defaults={"first_seen": now}
+                    )
+                    sighted.add(sighting.pk)
+                    if sighting.first_seen > grace:
+                        self.stdout.write(f"{name} '{child}': possible orphan '{meeting_id}', checking again later")
+                        continue
+
+                    if options["dry_run"]:
+                        self.stdout.write(f"{name} '{child}': orphan '{meeting_id}'")
+                        continue
+
+                    response = stop(child, meeting_id)
+                    if response["success"]:
+                        self.stdout.write(f"{name} '{child}': stopped orphan '{meeting_id}'")
+                    else:
+                        self.stderr.write(f"{name} '{child}': couldn't stop orphan '{meeting_id}': "
+                                          f"{response['message']}")
+
+        # Forget what turned out to have a channel or isn't running anymore
+        OrphanSighting.objects.exclude(pk__in=sighted).delete()
+
+        if not options["dry_run"]:
+            streams.admit(wait=True)
@@ -0,0 +1,36 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from api.management.base import PeriodicCommand
+from api.models import Channel2Frontend
+from children.models import StreamFrontend
+
+
+class Command(PeriodicCommand):
+    help = "Replace the counted joins with the viewer counts reported by the frontends"
+    lease = "reconcile_viewers"
+
+    def run_once(self, **options):
+        frontends = list(StreamFrontend.objects.all())
+        with ThreadPoolExecutor(max_workers=max(1, min(len(frontends), 16))) as executor:
+            responses = dict(zip(frontends, executor.map(StreamFrontend.viewer_counts, frontends)))
+
+        changed = []
+        for frontend, response in responses.items():
+            if not response["success"]:
+                self.stderr.write(f"Couldn't get viewers from '{frontend}': {response['message']}")
+                continue
+
+            viewers = (response.get("content") or {}).get("viewers")
+            if not isinstance(viewers, dict):
+                self.stderr.write(f"Couldn't get viewers from '{frontend}': malformed response")
+                continue
+
+            for c2f in Channel2Frontend.objects.filter(frontend=frontend).select_related("channel"):
+                count = viewers.get(c2f.channel.meeting_id, 0)
+                if c2f.viewers != count:
+                    c2f.viewers = count
+                    changed.append(c2f)
+
+        Channel2Frontend.objects.bulk_update(changed, ["viewers"], batch_size=500)
+        if options["verbosity"] > 1:
+            self.stdout.write(f"Updated {len(changed)} viewer counts")
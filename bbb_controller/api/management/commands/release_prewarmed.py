@@ -0,0 +1,34 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from api import streams
+from api.cluster import local_channels
+from api.management.base import PeriodicCommand
+from api.models import Channel
+
+
+class Command(PeriodicCommand):
+    help = "Release prewarmed streamers whose stream wasn't started within PREWARM_TTL"
+
+    def run_once(self, **options):
+        expired = local_channels(Channel.objects).filter(
+            prewarmed_live__isnull=False,
+            prewarmed_at__lt=timezone.now() - timedelta(seconds=settings.PREWARM_TTL)
+        ).select_related("prewarmed_live")
+
+        for channel in expired:
+            response = channel.prewarmed_live.stop_stream(channel.meeting_id)
+            if not response["success"]:
+                self.stderr.write(f"Couldn't release '{channel.prewarmed_live}': {response['message']}")
+
+            # The streamer is handed back to the pool either way, a failed stop can't be retried sensibly
+            channel.prewarmed_live = None
+            channel.prewarmed_at = None
+            channel.save()
+
+            if options["verbosity"] > 1:
+                self.stdout.write(f"Released prewarmed streamer of '{channel}'")
+
+        streams.admit(wait=True)
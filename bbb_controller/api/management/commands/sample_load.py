@@ -0,0 +1,36 @@
+from collections import defaultdict
+
+from api.management.base import PeriodicCommand
+from api.models import Channel, Channel2Frontend
+from api.timeseries import prune, record
+
+
+class Command(PeriodicCommand):
+    help = "Sample viewers and assigned children of every channel into the load time-series"
+    lease = "sample_load"
+
+    def run_once(self, **options):
+        samples = {}
+        fleet = defaultdict(int)
+
+        for meeting_id, bbb_live, stream_edge in Channel.objects.values_list("meeting_id", "bbb_live", "stream_edge"):
+            samples[(meeting_id, "viewers")] = 0
+            samples[(meeting_id, "streamer")] = bbb_live or 0
+            samples[(meeting_id, "edge")] = stream_edge or 0
+            fleet["channels"] += 1
+            fleet["streams"] += bbb_live is not None
+
+        for meeting_id, frontend, viewers in Channel2Frontend.objects.values_list(
+                "channel__meeting_id", "frontend", "viewers"):
+            samples[(meeting_id, f"viewers:{frontend}")] = viewers
+            samples[(meeting_id, "viewers")] += viewers
+            fleet[f"viewers:{frontend}"] += viewers
+            fleet["viewers"] += viewers
+
+        samples.update({("", name): value for name, value in fleet.items()})
+        samples.setdefault(("", "channels"), 0)
+        record(samples)
+        deleted = prune()
+
+        if options["verbosity"] > 1:
+            self.stdout.write(f"Recorded {len(samples)} samples, deleted {deleted} old windows")
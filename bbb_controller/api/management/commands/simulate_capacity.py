@@ -0,0 +1,84 @@
+import sys
+import time
+
+from django.core.management import BaseCommand, CommandError
+from django.utils.module_loading import import_string
+
+from api.simulation import POLICIES, Simulation, read_trace, synthetic_trace
+
+
+def _policy(name: str):
+    """
+    A policy from `api.simulation.POLICIES` or the dotted path of a policy factory
+    """
+    if name in POLICIES:
+        return POLICIES[name]()
+    try:
+        return import_string(name)()
+    except ImportError as err:
+        raise CommandError(f"Unknown policy '{name}': {err}")
+
+
+class Command(BaseCommand):
+    help = "Replay a trace of meetings against scheduling policies and report load, rejections and imbalance"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--trace", default=None,
+            help="File of 'time,event,meeting_id[,user]' lines, '-' for stdin. Without it a synthetic trace is used"
+        )
+        parser.add_argument("--days", type=int, default=1, help="Days of the synthetic trace")
+        parser.add_argument("--meetings", type=int, default=100, help="Meetings per day of the synthetic trace")
+        parser.add_argument("--viewers", type=int, default=200, help="Average viewers per synthetic meeting")
+        parser.add_argument("--seed", type=int, default=0, help="Seed of the synthetic trace")
+
+        parser.add_argument("--edges", type=int, default=4)
+        parser.add_argument("--streamers", type=int, default=40)
+        parser.add_argument("--frontends", type=int, default=8)
+        parser.add_argument("--edge-capacity", type=int, default=None, help="Channels per edge")
+        parser.add_argument("--frontend-capacity", type=int, default=None, help="Viewers per frontend")
+
+        names = ", ".join(POLICIES)
+        parser.add_argument("--edge-policy", default="least_loaded", help=f"One of {names} or a dotted path")
+        parser.add_argument("--streamer-policy", default="first", help=f"One of {names} or a dotted path")
+        parser.add_argument("--frontend-policy", default="least_loaded", help=f"One of {names} or a dotted path")
+
+    def handle(self, *args, **options):
+        if options["trace"] is None:
+            events = synthetic_trace(options["days"], options["meetings"], options["viewers"], options["seed"])
+        elif options["trace"] == "-":
+            events = read_trace(sys.stdin)
+        else:
+            try:
+                events = read_trace(open(options["trace"]))
+            except OSError as err:
+                raise CommandError(f"Couldn't read the trace: {err}")
+
+        simulation = Simulation(
+            options["edges"], options["streamers"], options["frontends"],
+            _policy(options["edge_policy"]), _policy(options["streamer_policy"]), _policy(options["frontend_policy"]),
+            edge_capacity=options["edge_capacity"], frontend_capacity=options["frontend_capacity"],
+        )
+        started = time.perf_counter()
+        try:
+            report = simulation.run(events).report()
+        except ValueError as err:
+            raise CommandError(str(err))
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(
+            f"Replayed {report['events']} events covering {report['duration'] / 3600:.1f}h in {elapsed:.1f}s"
+        )
+        self.stdout.write(f"{'pool':<10} {'nodes':>6} {'peak':>8} {'mean peak':>10} {'imbalance':>10} "
+                          f"{'requests':>10} {'rejected':>9}")
+        for pool in ("edges", "streamers", "frontends"):
+            row = report[pool]
+            self.stdout.write(
+                f"{pool:<10} {row['nodes']:>6} {row['peak']:>8} {row['mean_peak']:>10.1f} {row['imbalance']:>10.2f} "
+                f"{row['requests']:>10} {row['rejection_rate']:>9.2%}"
+            )
+        if options["verbosity"] > 1:
+            for pool in (simulation.edges, simulation.streamers, simulation.frontends):
+                self.stdout.write(", ".join(f"{node}: {peak}" for node, peak in pool.peak.items()))
+        if report["unknown_meetings"]:
+            self.stderr.write(f"Events for meetings without channel: {report['unknown_meetings']}")
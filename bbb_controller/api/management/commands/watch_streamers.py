@@ -0,0 +1,238 @@
+from concurrent.futures import ThreadPoolExecutor
+from xml.etree.ElementTree import ParseError
+
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+from requests import RequestException
+
+from api import streams
+from api.cluster import local_channels
+from api.management.base import PeriodicCommand
+from api.models import Channel, Failover
+from api.scheduling import free_streamers
+from children.bbb_api import BBBError
+from children.models import ChildState, StreamEdge
+
+
+def _is_running(channel):
+    response = channel.bbb_live.stream_status(channel.meeting_id)
+    return response["success"] and response.get("content", {}).get("running", True)
+
+
+def _open_channels(edge):
+    """
+    Meeting ids the edge has channels open for, None if it doesn't answer properly
+    """
+    response = edge.open_channels()
+    if not response["success"]:
+        return None
+    try:
+        return set(response["content"]["channels"])
+    except (KeyError, TypeError):
+        return None
+
+
+def _meeting_password(channel, failover):
+    """
+    The password to restart the stream with, None after recording in the failover why the bbb couldn't tell it
+    """
+    try:
+        return channel.meeting_password
+    except (RequestException, BBBError, ParseError, KeyError) as err:
+        failover.message = f"Couldn't get the meeting's password: {err!r}"[:255]
+        failover.save()
+        return None
+
+
+class Command(PeriodicCommand):
+    help = "Restart streams whose bbb-live died on another streamer and switch streams of failed edges to their standby"
+
+    def run_once(self, **options):
+        # Edges first, a streamer pushing to a dead edge isn't worth moving
+        self.watch_edges(options)
+
+        channels = list(local_channels(Channel.objects).filter(bbb_live__isnull=False).select_related("bbb_live"))
+        with ThreadPoolExecutor(max_workers=max(1, min(len(channels), 16))) as executor:
+            running = list(executor.map(_is_running, channels))
+
+        now = timezone.now()
+        healthy = []
+        for channel, is_running in zip(channels, running):
+            if is_running:
+                channel.live_seen_at = now
+                channel.live_failures = 0
+                healthy.append(channel)
+                continue
+
+            # Counted in the database, so runs without '--interval' add up as well
+            Channel.objects.filter(pk=channel.pk).update(live_failures=F("live_failures") + 1)
+            channel.live_failures += 1
+            if channel.live_failures >= settings.WATCHDOG_FAILURES:
+                self.fail_over(channel, options)
+
+        Channel.objects.bulk_update(healthy, ["live_seen_at", "live_failures"], batch_size=500)
+
+        # Streamers may also be freed outside the controller's endpoints, e.g. in the admin
+        streams.admit(wait=True)
+
+    def watch_edges(self, options):
+        """
+        Switch the channels of edges, which don't answer, to their standby
+
+        An edge is judged by answering at all. A single channel missing on an answering edge is left to the frontends,
+        disabling an edge in the admin only keeps new channels away.
+        """
+        channels = list(
+            local_channels(Channel.objects).filter(standby_edge__isnull=False)
+            .select_related("stream_edge", "standby_edge", "bbb_live")
+        )
+        edges = {channel.stream_edge_id: channel.stream_edge for channel in channels}
+        edges.update({channel.standby_edge_id: channel.standby_edge for channel in channels})
+        with ThreadPoolExecutor(max_workers=max(1, min(len(edges), 16))) as executor:
+            open_channels = dict(zip(edges, executor.map(_open_channels, edges.values())))
+
+        failing = {edge_id for edge_id, meeting_ids in open_channels.items() if meeting_ids is None}
+        local_channels(Channel.objects).filter(edge_failures__gt=0).exclude(stream_edge_id__in=failing) \
+            .update(edge_failures=0)
+
+        for channel in channels:
+            if channel.stream_edge_id not in failing:
+                continue
+
+            # Counted in the database, so runs without '--interval' add up as well
+            Channel.objects.filter(pk=channel.pk).update(edge_failures=F("edge_failures") + 1)
+            channel.edge_failures += 1
+            if channel.edge_failures < settings.WATCHDOG_FAILURES:
+                continue
+
+            standby = open_channels[channel.standby_edge_id]
+            if standby is None or channel.meeting_id not in standby:
+                # Switching wouldn't help, keep checking in case the edge recovers
+                if options["verbosity"] > 0:
+                    self.stderr.write(f"Can't switch '{channel}', its standby '{channel.standby_edge}' isn't ready")
+                continue
+            self.switch_edge(channel, options)
+
+    def switch_edge(self, channel, options):
+        """
+        Let the channel's streamer push to the standby edge, which the frontends already know
+        """
+        now = timezone.now()
+        failed = channel.stream_edge
+        failover = Failover(
+            meeting_id=channel.meeting_id,
+            component="stream-edge",
+            failed_live=str(failed),
+            failed_at=now,
+            detected_at=now,
+        )
+
+        if channel.bbb_live is not None:
+            # Before stopping anything, without it the stream couldn't be started again
+            password = _meeting_password(channel, failover)
+            if password is None:
+                return
+
+            channel.bbb_live.stop_stream(channel.meeting_id)
+            response = channel.bbb_live.start_stream(channel.standby_rtmp_uri, channel.meeting_id, password)
+            if not response["success"]:
+                message = f"Couldn't restart '{channel.bbb_live}' on the standby: {response['message']}"
+                # The failed edge may still take part of the viewers
+                if channel.bbb_live.start_stream(channel.rtmp_uri, channel.meeting_id, password)["success"]:
+                    message += ", restarted on the failed edge"
+                else:
+                    message += ", the stream is down"
+                failover.message = message[:255]
+                failover.save()
+                return
+
+        # The channel continues without a standby, opening a new one would involve every frontend again
+        # Unlike save() this doesn't insert the channel again, if endStream deleted it meanwhile
+        updated = Channel.objects.filter(pk=channel.pk, stream_edge=failed).update(
+            stream_edge=channel.standby_edge,
+            rtmp_uri=channel.standby_rtmp_uri,
+            standby_edge=None,
+            standby_rtmp_uri="",
+            edge_failures=0,
+            version=F("version") + 1,
+        )
+        if not updated:
+            failover.message = "The channel was closed or changed during the failover."
+            failover.save()
+            return
+        failed.close_channel(channel.meeting_id)
+        channel.stream_edge = channel.standby_edge
+
+        # Take the edge out of the pool until an admin looked at it
+        StreamEdge.objects.filter(pk=failed.pk, state=ChildState.ACTIVE).update(state=ChildState.DISABLED)
+
+        recovered = timezone.now()
+        failover.replacement_live = str(channel.stream_edge)
+        failover.recovered_at = recovered
+        failover.recovery_seconds = (recovered - failover.detected_at).total_seconds()
+        failover.save()
+
+        if options["verbosity"] > 0:
+            self.stdout.write(
+                f"Switched '{channel}' from edge '{failed}' to '{channel.stream_edge}' "
+                f"in {failover.recovery_seconds:.1f}s"
+            )
+
+    def fail_over(self, channel, options):
+        now = timezone.now()
+        failed = channel.bbb_live
+        failover = Failover.objects.filter(
+            meeting_id=channel.meeting_id, component="bbb-live", recovered_at=None
+        ).first()
+        if failover is None:
+            failover = Failover(
+                meeting_id=channel.meeting_id,
+                failed_live=str(failed),
+                failed_at=channel.live_seen_at or now,
+                detected_at=now,
+            )
+
+        # Before stopping anything, without it the stream couldn't be started again
+        password = _meeting_password(channel, failover)
+        if password is None:
+            return
+
+        # Take the streamer out of the pool until an admin looked at it
+        failed.stop_stream(channel.meeting_id)
+        failed.state = ChildState.DISABLED
+        failed.save()
+
+        replacement = free_streamers().first()
+        if replacement is None:
+            failover.message = "All streamers are already busy."
+            failover.save()
+            return
+
+        response = replacement.start_stream(channel.rtmp_uri, channel.meeting_id, password)
+        if not response["success"]:
+            failover.message = f"Couldn't start '{replacement}': {response['message']}"[:255]
+            failover.save()
+            return
+
+        recovered = timezone.now()
+        # Unlike save() this doesn't insert the channel again, if endStream deleted it meanwhile
+        updated = Channel.objects.filter(pk=channel.pk).update(
+            bbb_live=replacement, live_seen_at=recovered, live_failures=0, version=F("version") + 1
+        )
+        if not updated:
+            replacement.stop_stream(channel.meeting_id)
+            failover.message = "The stream was ended during the failover."
+            failover.save()
+            return
+
+        failover.replacement_live = str(replacement)
+        failover.recovered_at = recovered
+        failover.recovery_seconds = (recovered - failover.failed_at).total_seconds()
+        failover.message = ""
+        failover.save()
+
+        if options["verbosity"] > 0:
+            self.stdout.write(
+                f"Moved '{channel}' from '{failed}' to '{replacement}' in {failover.recovery_seconds:.1f}s"
+            )
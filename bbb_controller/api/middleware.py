@@ -0,0 +1,91 @@
+import cProfile
+import io
+import marshal
+import pstats
+import random
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import signing
+from django.core.exceptions import MiddlewareNotUsed
+
+from api.models import RequestProfile
+
+
+PROFILE_HEADER = "X-Profile"
+_signer = signing.TimestampSigner(salt="api.profiling")
+
+
+def profile_token(username: str) -> str:
+    """
+    Value for the 'X-Profile' header, valid for PROFILING_TOKEN_MAX_AGE seconds
+    """
+    return _signer.sign(username)
+
+
+def _requested_by(request):
+    """
+    Get the staff user who signed the request's 'X-Profile' header, if any
+    """
+    token = request.headers.get(PROFILE_HEADER)
+    if token is None:
+        return None
+    try:
+        username = _signer.unsign(token, max_age=settings.PROFILING_TOKEN_MAX_AGE)
+    except signing.BadSignature:
+        return None
+    if not get_user_model().objects.filter(username=username, is_staff=True, is_active=True).exists():
+        return None
+    return username
+
+
+class ProfilingMiddleware:
+    """
+    Profile requests triggered by a staff user's signed 'X-Profile' header
+    or sampled with PROFILING_SAMPLE_RATE and store them as `RequestProfile`
+
+    Django drops the middleware at startup unless PROFILING_ENABLED is set.
+    """
+
+    def __init__(self, get_response):
+        if not settings.PROFILING_ENABLED:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        user = _requested_by(request)
+        if user is None and random.random() >= settings.PROFILING_SAMPLE_RATE:
+            return self.get_response(request)
+
+        profile = cProfile.Profile()
+        started = time.perf_counter()
+        profile.enable()
+        try:
+            response = self.get_response(request)
+        finally:
+            profile.disable()
+        seconds = time.perf_counter() - started
+
+        self.store(request, response, profile, seconds, user or "")
+        return response
+
+    @staticmethod
+    def store(request, response, profile, seconds, user):
+        summary = io.StringIO()
+        stats = pstats.Stats(profile, stream=summary)
+        stats.sort_stats("cumulative").print_stats(40)
+
+        RequestProfile.objects.create(
+            method=request.method,
+            path=request.get_full_path()[:255],
+            status_code=response.status_code,
+            seconds=seconds,
+            user=user,
+            summary=summary.getvalue(),
+            stats=marshal.dumps(stats.stats),
+        )
+
+        # Keep only the newest profiles
+        keep = RequestProfile.objects.order_by("-created").values_list("id", flat=True)[:settings.PROFILING_KEEP]
+        RequestProfile.objects.exclude(id__in=list(keep)).delete()
@@ -0,0 +1,20 @@
+# Generated by Django 3.2.25 on 2026-10-19 15:15
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('children', '0003_auto_20210507_1524'),
+        ('api', '0004_channel_frontends'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='channel',
+            name='stream_chat',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='children.streamchat'),
+        ),
+    ]
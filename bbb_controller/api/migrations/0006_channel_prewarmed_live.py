@@ -0,0 +1,25 @@
+# Generated by Django 3.2.25 on 2026-10-19 15:18
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('children', '0003_auto_20210507_1524'),
+        ('api', '0005_channel_stream_chat'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='channel',
+            name='prewarmed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='channel',
+            name='prewarmed_live',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='prewarmed_channel', to='children.bbblive'),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 3.2.25 on 2026-10-19 15:19
+
+import zlib
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def assign_shards(apps, schema_editor):
+    Channel = apps.get_model("api", "Channel")
+    for channel in Channel.objects.all():
+        channel.shard = zlib.crc32(channel.meeting_id.encode("utf-8")) % settings.CLUSTER_SHARDS
+        channel.save(update_fields=["shard"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_channel_prewarmed_live'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Lease',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('owner', models.CharField(default='', max_length=255)),
+                ('expires', models.DateTimeField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Node',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('url', models.CharField(default='', max_length=255)),
+                ('last_seen', models.DateTimeField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='channel',
+            name='shard',
+            field=models.PositiveSmallIntegerField(db_index=True, default=0),
+        ),
+        migrations.RunPython(assign_shards, migrations.RunPython.noop),
+    ]
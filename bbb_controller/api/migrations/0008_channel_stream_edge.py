@@ -0,0 +1,50 @@
+# Generated by Django 3.2.25 on 2026-10-19 15:21
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def assign_first_edge(apps, schema_editor):
+    # Channels were opened on the first edge before the edge was recorded
+    Channel = apps.get_model("api", "Channel")
+    StreamEdge = apps.get_model("children", "StreamEdge")
+    edge = StreamEdge.objects.order_by("id").first()
+    if edge is not None:
+        Channel.objects.update(stream_edge=edge)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('children', '0004_child_state'),
+        ('api', '0007_cluster'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='channel',
+            name='stream_edge',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, to='children.streamedge'),
+        ),
+        migrations.RunPython(assign_first_edge, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='channel',
+            name='bbb_chat',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, to='children.bbbchat'),
+        ),
+        migrations.AlterField(
+            model_name='channel',
+            name='bbb_live',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, to='children.bbblive'),
+        ),
+        migrations.AlterField(
+            model_name='channel',
+            name='stream_chat',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, to='children.streamchat'),
+        ),
+        migrations.AlterField(
+            model_name='channel2frontend',
+            name='frontend',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='children.streamfrontend'),
+        ),
+    ]
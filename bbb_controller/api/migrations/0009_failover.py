@@ -0,0 +1,32 @@
+# Generated by Django 3.2.25 on 2026-10-19 15:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_channel_stream_edge'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Failover',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('meeting_id', models.CharField(default='', max_length=255)),
+                ('failed_live', models.CharField(default='', max_length=255)),
+                ('replacement_live', models.CharField(blank=True, default='', max_length=255)),
+                ('failed_at', models.DateTimeField()),
+                ('detected_at', models.DateTimeField()),
+                ('recovered_at', models.DateTimeField(blank=True, null=True)),
+                ('recovery_seconds', models.FloatField(blank=True, null=True)),
+                ('message', models.CharField(blank=True, default='', max_length=255)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='channel',
+            name='live_seen_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
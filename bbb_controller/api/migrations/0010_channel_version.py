@@ -0,0 +1,18 @@
+# Generated by Django 3.2.25 on 2026-10-19 15:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_failover'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='channel',
+            name='version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
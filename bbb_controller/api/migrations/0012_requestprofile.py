@@ -0,0 +1,27 @@
+# Generated by Django 3.2.25 on 2026-10-19 15:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_operation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RequestProfile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('method', models.CharField(default='', max_length=16)),
+                ('path', models.CharField(default='', max_length=255)),
+                ('status_code', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('seconds', models.FloatField(default=0)),
+                ('user', models.CharField(blank=True, default='', max_length=150)),
+                ('summary', models.TextField(blank=True, default='')),
+                ('stats', models.BinaryField(default=b'')),
+            ],
+        ),
+    ]
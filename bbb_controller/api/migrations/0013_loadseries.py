@@ -0,0 +1,32 @@
+# Generated by Django 3.2.25 on 2026-10-19 15:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_requestprofile'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LoadSeries',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('meeting_id', models.CharField(blank=True, default='', max_length=255)),
+                ('name', models.CharField(default='', max_length=64)),
+                ('resolution', models.CharField(choices=[('raw', 'raw'), ('minute', 'minute'), ('hour', 'hour')], default='raw', max_length=8)),
+                ('start', models.DateTimeField()),
+                ('values', models.BinaryField(default=b'')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='loadseries',
+            index=models.Index(fields=['resolution', 'start'], name='api_loadser_resolut_a84c04_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='loadseries',
+            unique_together={('meeting_id', 'name', 'resolution', 'start')},
+        ),
+    ]
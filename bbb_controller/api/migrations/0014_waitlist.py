@@ -0,0 +1,36 @@
+# Generated by Django 3.2.25 on 2026-10-19 15:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0013_loadseries'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='channel',
+            name='tenant',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.AlterField(
+            model_name='operation',
+            name='state',
+            field=models.CharField(choices=[('pending', 'pending'), ('running', 'running'), ('waiting', 'waiting'), ('succeeded', 'succeeded'), ('failed', 'failed')], default='pending', max_length=16),
+        ),
+        migrations.CreateModel(
+            name='WaitingStart',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('meeting_id', models.CharField(default='', max_length=255, unique=True)),
+                ('tenant', models.CharField(blank=True, default='', max_length=255)),
+                ('priority', models.IntegerField(default=0)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('dispatched', models.BooleanField(default=False)),
+                ('operation', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='api.operation')),
+            ],
+        ),
+    ]
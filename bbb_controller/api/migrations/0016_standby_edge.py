@@ -0,0 +1,30 @@
+# Generated by Django 3.2.25 on 2026-10-19 15:46
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('children', '0005_childcall'),
+        ('api', '0015_booking'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='channel',
+            name='standby_edge',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='standby_channel', to='children.streamedge'),
+        ),
+        migrations.AddField(
+            model_name='channel',
+            name='standby_rtmp_uri',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='failover',
+            name='component',
+            field=models.CharField(default='bbb-live', max_length=32),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 3.2.25 on 2026-10-19 15:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0017_channel_live_failures'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrphanSighting',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('child', models.CharField(max_length=255)),
+                ('meeting_id', models.CharField(max_length=255)),
+                ('first_seen', models.DateTimeField()),
+            ],
+            options={
+                'unique_together': {('child', 'meeting_id')},
+            },
+        ),
+    ]
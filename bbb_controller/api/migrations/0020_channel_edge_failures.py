@@ -0,0 +1,18 @@
+# Generated by Django 3.2.25 on 2026-10-19 16:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0019_bookinglock'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='channel',
+            name='edge_failures',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+    ]
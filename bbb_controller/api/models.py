@@ -1,28 +1,238 @@
+import uuid
+
 from django.db import models
 from django.utils.functional import cached_property
 
-from children.models import BBBChat, BBBLive, StreamFrontend
+from children.models import BBBChat, BBBLive, StreamChat, StreamEdge, StreamFrontend
+
+
+class Node(models.Model):
+    name = models.CharField(max_length=255, unique=True)
+    url = models.CharField(default="", max_length=255)
+    last_seen = models.DateTimeField()
+
+    def __str__(self):
+        return self.name
+
+
+class Lease(models.Model):
+    name = models.CharField(max_length=255, unique=True)
+    owner = models.CharField(default="", max_length=255)
+    expires = models.DateTimeField()
+
+    def __str__(self):
+        return self.name
+
+
+class BookingLock(models.Model):
+    """
+    Single row serializing changes to the bookings between processes, see `api.booking`
+    """
+    version = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"bookings v{self.version}"
 
 
 class Channel2Frontend(models.Model):
     channel = models.ForeignKey("Channel", on_delete=models.CASCADE)
-    frontend = models.ForeignKey(StreamFrontend, on_delete=models.CASCADE)
+    frontend = models.ForeignKey(StreamFrontend, on_delete=models.PROTECT)
     viewers = models.PositiveIntegerField(default=0)
 
 
 class Channel(models.Model):
     meeting_id = models.CharField(default="", max_length=255)
+    shard = models.PositiveSmallIntegerField(default=0, db_index=True)
     rtmp_uri = models.CharField(default="", max_length=255)
     frontends = models.ManyToManyField(StreamFrontend, through=Channel2Frontend)
+    stream_edge = models.ForeignKey(StreamEdge, on_delete=models.PROTECT, null=True, blank=True)
+
+    # Second edge the channel is open on with EDGE_REDUNDANCY, bbb-live switches to it if stream_edge fails
+    standby_edge = models.ForeignKey(
+        StreamEdge, on_delete=models.PROTECT, null=True, blank=True, related_name="standby_channel"
+    )
+    standby_rtmp_uri = models.CharField(default="", max_length=255, blank=True)
 
     internal_meeting_id = models.CharField(default="", max_length=255, blank=True)
-    bbb_chat = models.ForeignKey(BBBChat, on_delete=models.CASCADE, null=True, blank=True)
-    bbb_live = models.ForeignKey(BBBLive, on_delete=models.CASCADE, null=True, blank=True)
+    bbb_chat = models.ForeignKey(BBBChat, on_delete=models.PROTECT, null=True, blank=True)
+    bbb_live = models.ForeignKey(BBBLive, on_delete=models.PROTECT, null=True, blank=True)
+    stream_chat = models.ForeignKey(StreamChat, on_delete=models.PROTECT, null=True, blank=True)
+
+    # Streamer reserved and prepared at openChannel, taken over by startStream
+    prewarmed_live = models.ForeignKey(
+        BBBLive, on_delete=models.SET_NULL, null=True, blank=True, related_name="prewarmed_channel"
+    )
+    prewarmed_at = models.DateTimeField(null=True, blank=True)
+
+    # Who the stream is for, streamers are shared fairly between tenants on the waitlist
+    tenant = models.CharField(default="", max_length=255, blank=True)
+
+    # Last time the watchdog found the stream running and its failed checks since
+    live_seen_at = models.DateTimeField(null=True, blank=True)
+    live_failures = models.PositiveSmallIntegerField(default=0)
+    # Failed checks in a row of the stream edge, which didn't answer its openChannels
+    edge_failures = models.PositiveSmallIntegerField(default=0)
+
+    # Bumped on every save, clients see changes through the ETags of channelStatus and listChannels
+    version = models.PositiveIntegerField(default=0)
 
     @cached_property
     def meeting_password(self):
-        return str(self.bbb_chat.bbb.api.get_meeting_info(self.meeting_id)["xml"]["attendeePW"])
+        return str(self.bbb_chat.bbb.api.get_meeting_info(self.meeting_id)["attendeePW"])
+
+    def save(self, *args, **kwargs):
+        self.version += 1
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return self.meeting_id
+
+
+class Failover(models.Model):
+    meeting_id = models.CharField(default="", max_length=255)
+    # Type of the failed child, "bbb-live" or "stream-edge"
+    component = models.CharField(default="bbb-live", max_length=32)
+    failed_live = models.CharField(default="", max_length=255)
+    replacement_live = models.CharField(default="", max_length=255, blank=True)
+    # Last time the stream was seen running, or its start if it never was
+    failed_at = models.DateTimeField()
+    detected_at = models.DateTimeField()
+    recovered_at = models.DateTimeField(null=True, blank=True)
+    recovery_seconds = models.FloatField(null=True, blank=True)
+    message = models.CharField(default="", max_length=255, blank=True)
 
     def __str__(self):
         return self.meeting_id
 
+
+class OrphanSighting(models.Model):
+    """
+    Work found on a child without a matching channel, see 'manage.py reconcile_orphans'
+    """
+    child = models.CharField(max_length=255)
+    meeting_id = models.CharField(max_length=255)
+    first_seen = models.DateTimeField()
+
+    class Meta:
+        unique_together = [("child", "meeting_id")]
+
+    def __str__(self):
+        return self.meeting_id
+
+
+class Operation(models.Model):
+    PENDING = "pending"
+    RUNNING = "running"
+    # Queued on the waitlist until a streamer is free
+    WAITING = "waiting"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+    STATES = [(state, state) for state in (PENDING, RUNNING, WAITING, SUCCEEDED, FAILED)]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    kind = models.CharField(default="", max_length=255)
+    meeting_id = models.CharField(default="", max_length=255, db_index=True)
+    state = models.CharField(choices=STATES, default=PENDING, max_length=16)
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    message = models.CharField(default="", max_length=255, blank=True)
+    # List of {"name", "state", "started", "seconds"}
+    steps = models.JSONField(default=list, blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+    updated = models.DateTimeField(auto_now=True)
+
+    @property
+    def finished(self):
+        return self.state in (self.SUCCEEDED, self.FAILED)
+
+    def as_dict(self):
+        return {
+            "operation_id": str(self.id),
+            "kind": self.kind,
+            "meeting_id": self.meeting_id,
+            "state": self.state,
+            "status_code": self.status_code,
+            "message": self.message,
+            "steps": self.steps,
+        }
+
+    def __str__(self):
+        return f"{self.kind} {self.meeting_id}"
+
+
+class WaitingStart(models.Model):
+    """
+    A startStream waiting for a free streamer, see `api.waitlist`
+    """
+    meeting_id = models.CharField(default="", max_length=255, unique=True)
+    tenant = models.CharField(default="", max_length=255, blank=True)
+    priority = models.IntegerField(default=0)
+    operation = models.ForeignKey(Operation, on_delete=models.CASCADE)
+    created = models.DateTimeField(auto_now_add=True)
+    # Handed a streamer and being started
+    dispatched = models.BooleanField(default=False)
+
+    def __str__(self):
+        return self.meeting_id
+
+
+class Booking(models.Model):
+    """
+    A streamer and an edge reserved for a meeting from `start` to `end`, see `api.booking`
+    """
+    meeting_id = models.CharField(default="", max_length=255, db_index=True)
+    start = models.DateTimeField()
+    end = models.DateTimeField(db_index=True)
+    created = models.DateTimeField(auto_now_add=True)
+
+    def as_dict(self):
+        return {
+            "booking_id": self.id,
+            "meeting_id": self.meeting_id,
+            "start": self.start.timestamp(),
+            "end": self.end.timestamp(),
+        }
+
+    def __str__(self):
+        return f"{self.meeting_id} {self.start} - {self.end}"
+
+
+class RequestProfile(models.Model):
+    created = models.DateTimeField(auto_now_add=True)
+    method = models.CharField(default="", max_length=16)
+    path = models.CharField(default="", max_length=255)
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    seconds = models.FloatField(default=0)
+    # Who triggered the profile, empty for sampled requests
+    user = models.CharField(default="", max_length=150, blank=True)
+    # Most expensive functions as text
+    summary = models.TextField(default="", blank=True)
+    # Marshalled pstats, as written by pstats.Stats.dump_stats
+    stats = models.BinaryField(default=b"")
+
+    def __str__(self):
+        return f"{self.method} {self.path}"
+
+
+class LoadSeries(models.Model):
+    """
+    One window of a load time-series, see `api.timeseries`
+    """
+    RAW = "raw"
+    MINUTE = "minute"
+    HOUR = "hour"
+    RESOLUTIONS = [(resolution, resolution) for resolution in (RAW, MINUTE, HOUR)]
+
+    # Empty for fleet-wide series
+    meeting_id = models.CharField(default="", max_length=255, blank=True)
+    name = models.CharField(default="", max_length=64)
+    resolution = models.CharField(choices=RESOLUTIONS, default=RAW, max_length=8)
+    start = models.DateTimeField()
+    # array("i") of one value per step, -1 meaning no sample
+    values = models.BinaryField(default=b"")
+
+    class Meta:
+        unique_together = [("meeting_id", "name", "resolution", "start")]
+        indexes = [models.Index(fields=["resolution", "start"])]
+
+    def __str__(self):
+        return f"{self.meeting_id or 'fleet'} {self.name} {self.resolution} {self.start}"
@@ -0,0 +1,132 @@
+"""
+Long running requests done in the background
+
+An operation runs in a thread of the worker which received the request.
+Its progress is stored in `Operation`, where clients follow it with operationStatus or operationEvents.
+"""
+import json
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db import connection
+from django.http import JsonResponse
+from django.utils import timezone
+
+from api.models import Operation
+
+logger = logging.getLogger("api.operations")
+
+
+class Progress:
+    """
+    Record the steps of an operation
+
+    Without an operation every call is a no-op, so synchronous requests can share the code.
+    """
+
+    def __init__(self, operation: Operation = None):
+        self.operation = operation
+        self._started = None
+
+    def _close_step(self, state):
+        step = self.operation.steps[-1]
+        step["state"] = state
+        if self._started is None:
+            # Opened by an earlier run, e.g. before waiting for a streamer
+            seconds = (timezone.now() - datetime.fromisoformat(step["started"])).total_seconds()
+        else:
+            seconds = time.monotonic() - self._started
+        step["seconds"] = round(seconds, 3)
+
+    def step(self, name: str):
+        if self.operation is None:
+            return
+        if self.operation.steps:
+            self._close_step("done")
+        self._started = time.monotonic()
+        self.operation.steps.append({"name": name, "state": "running", "started": timezone.now().isoformat()})
+        self.operation.state = Operation.RUNNING
+        self.operation.save()
+
+    def finish(self, response: JsonResponse):
+        if self.operation is None:
+            return
+        if response.status_code == 202:
+            # Put on the waitlist, the operation is continued later
+            self.operation.state = Operation.WAITING
+            self.operation.message = json.loads(response.content).get("message", "")[:255]
+            self.operation.save()
+            return
+        succeeded = response.status_code < 400
+        if self.operation.steps:
+            self._close_step("done" if succeeded else "failed")
+        self.operation.state = Operation.SUCCEEDED if succeeded else Operation.FAILED
+        self.operation.status_code = response.status_code
+        self.operation.message = json.loads(response.content).get("message", "")[:255]
+        self.operation.save()
+
+
+def run_operation(operation: Operation, run) -> threading.Thread:
+    """
+    Run `run(progress)` for an existing operation in a background thread
+    """
+    def target():
+        progress = Progress(operation)
+        try:
+            progress.finish(run(progress))
+        except Exception:
+            logger.exception(f"Operation '{operation}' failed", extra={"meeting_id": operation.meeting_id})
+            progress.finish(JsonResponse({"success": False, "message": "Internal error"}, status=500))
+        finally:
+            connection.close()
+
+    thread = threading.Thread(target=target, name=f"operation-{operation.id}", daemon=True)
+    thread.start()
+    return thread
+
+
+def expire_stale(operations):
+    """
+    Fail the pending and running operations, which didn't change for longer than any run may take
+
+    Their thread died with its worker, e.g. killed by gunicorn's timeout or a restart.
+    Without a REQUEST_BUDGET runs have no upper limit, so only waiting operations, which lost their place
+    on the waitlist, expire.
+    """
+    now = timezone.now()
+    operations.filter(state=Operation.WAITING, waitingstart=None).update(
+        state=Operation.FAILED, status_code=500, message="The operation lost its place on the waitlist.", updated=now
+    )
+    if settings.REQUEST_BUDGET is None:
+        return
+    operations.filter(
+        state__in=[Operation.PENDING, Operation.RUNNING],
+        updated__lt=now - timedelta(seconds=settings.REQUEST_BUDGET + settings.COMPENSATION_BUDGET),
+    ).update(state=Operation.FAILED, status_code=500, message="The operation was interrupted.", updated=now)
+
+
+def start_operation(kind: str, meeting_id: str, run) -> JsonResponse:
+    """
+    Run `run(progress)` in the background and answer with the operation's id
+
+    A retry while the meeting's operation is unfinished gets the running operation's id.
+    """
+    expire_stale(Operation.objects.filter(kind=kind, meeting_id=meeting_id))
+    operation = Operation.objects.filter(
+        kind=kind, meeting_id=meeting_id, state__in=[Operation.PENDING, Operation.RUNNING, Operation.WAITING]
+    ).first()
+    if operation is None:
+        operation = Operation.objects.create(kind=kind, meeting_id=meeting_id)
+        content = operation.as_dict()
+        run_operation(operation, run)
+    else:
+        content = operation.as_dict()
+
+    return JsonResponse(
+        {"success": True, "message": "The operation has been started.", "content": content},
+        status=202,
+        reason="Accepted"
+    )
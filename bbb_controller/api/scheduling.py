@@ -0,0 +1,8 @@
+from children.models import BBBLive, ChildState
+
+
+def free_streamers():
+    """
+    Active streamers neither streaming nor prewarmed for a channel
+    """
+    return BBBLive.objects.filter(state=ChildState.ACTIVE, channel=None, prewarmed_channel=None)
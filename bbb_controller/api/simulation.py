@@ -0,0 +1,266 @@
+"""
+Replay a trace of meetings against the scheduling policies without any children
+
+A trace is a stream of `Event`s in time order:
+- open: openChannel, the channel gets an edge
+- start: startStream, the channel gets a free streamer
+- join: joinStream, the user gets one of the channel's frontends
+- leave: a user left, only known from recorded traces
+- end: endStream, everything of the channel is released
+
+A policy is a callable `policy(nodes, loads, key)` picking one of `nodes`, where `loads` maps
+each node to its current load and `key` is the meeting or user id.
+Nodes at their capacity are never offered to a policy.
+"""
+import random
+from collections import Counter, defaultdict
+from typing import Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional
+
+from api.hashring import get_ring
+
+EVENTS = ("open", "start", "join", "leave", "end")
+
+
+class Event(NamedTuple):
+    time: float
+    kind: str
+    meeting_id: str
+    user: str = ""
+
+
+def read_trace(lines: Iterable[str]) -> Iterator[Event]:
+    """
+    Parse a trace of `time,event,meeting_id[,user]` lines, skipping blank lines and `#` comments
+    """
+    for number, line in enumerate(lines, start=1):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        fields = line.split(",")
+        if len(fields) < 3 or fields[1] not in EVENTS:
+            raise ValueError(f"Line {number} isn't 'time,event,meeting_id[,user]': {line!r}")
+        yield Event(float(fields[0]), fields[1], fields[2], fields[3] if len(fields) > 3 else "")
+
+
+def synthetic_trace(days: int, meetings: int, viewers: int, seed: int = 0) -> Iterator[Event]:
+    """
+    Lectures of 90 minutes starting between 8:00 and 18:00
+
+    Viewers join during the first 10 minutes, a fifth leaves before the end.
+    Events are generated one day at a time, so long traces need little memory.
+    """
+    rng = random.Random(seed)
+    for day in range(days):
+        events = []
+        for i in range(meetings):
+            meeting_id = f"d{day}-m{i}"
+            begin = day * 86400 + rng.uniform(8 * 3600, 18 * 3600)
+            end = begin + 90 * 60
+            events.append(Event(begin, "open", meeting_id))
+            events.append(Event(begin + rng.uniform(0, 60), "start", meeting_id))
+            for user in range(max(0, int(rng.gauss(viewers, viewers / 4)))):
+                joined = begin + 60 + rng.expovariate(1 / 120) % 600
+                events.append(Event(joined, "join", meeting_id, f"u{user}"))
+                if rng.random() < 0.2:
+                    events.append(Event(rng.uniform(joined, end), "leave", meeting_id, f"u{user}"))
+            events.append(Event(end, "end", meeting_id))
+        events.sort()
+        yield from events
+
+
+def least_loaded(nodes, loads, key):
+    return min(nodes, key=loads.__getitem__)
+
+
+def first(nodes, loads, key):
+    return nodes[0]
+
+
+def uniform(nodes, loads, key):
+    return random.choice(nodes)
+
+
+def consistent_hash(nodes, loads, key, load_factor=1.25):
+    return get_ring(frozenset(nodes)).lookup(key, {node: loads[node] for node in nodes}, load_factor)
+
+
+def round_robin():
+    """
+    Build a policy cycling through the nodes
+    """
+    counter = 0
+
+    def policy(nodes, loads, key):
+        nonlocal counter
+        counter += 1
+        return nodes[counter % len(nodes)]
+
+    return policy
+
+
+# Policies by name, factories are called once per simulation
+POLICIES: Dict[str, Callable] = {
+    "least_loaded": lambda: least_loaded,
+    "first": lambda: first,
+    "uniform": lambda: uniform,
+    "consistent_hash": lambda: consistent_hash,
+    "round_robin": round_robin,
+}
+
+
+class Pool:
+    """
+    Nodes of one child type with their current and peak load
+    """
+
+    def __init__(self, name: str, size: int, capacity: Optional[int]):
+        self.name = name
+        self.nodes = [f"{name}-{i}" for i in range(size)]
+        self.capacity = capacity
+        self.load = dict.fromkeys(self.nodes, 0)
+        self.peak = dict.fromkeys(self.nodes, 0)
+        self.requests = 0
+        self.rejected = 0
+
+    def available(self, nodes: List[str]) -> List[str]:
+        if self.capacity is None:
+            return nodes
+        return [node for node in nodes if self.load[node] < self.capacity]
+
+    def add(self, node: str, amount: int = 1):
+        load = self.load[node] + amount
+        self.load[node] = load
+        if load > self.peak[node]:
+            self.peak[node] = load
+
+    def report(self) -> dict:
+        peaks = list(self.peak.values())
+        mean = sum(peaks) / len(peaks) if peaks else 0
+        return {
+            "nodes": len(peaks),
+            "peak": max(peaks, default=0),
+            "mean_peak": mean,
+            "imbalance": max(peaks) / mean if mean else 1.0,
+            "requests": self.requests,
+            "rejected": self.rejected,
+            "rejection_rate": self.rejected / self.requests if self.requests else 0.0,
+        }
+
+
+class _Channel:
+    __slots__ = ("edge", "streamer", "viewers", "users")
+
+    def __init__(self, edge):
+        self.edge = edge
+        self.streamer = None
+        # Viewers per frontend counted for this channel, like `Channel2Frontend.viewers`
+        self.viewers = Counter()
+        self.users = {}
+
+
+class Simulation:
+    """
+    Replay events against an edge, a streamer and a frontend policy
+
+    Every channel is opened on all frontends, like `OpenChannel` does.
+    Edges and frontends take up to their capacity, None meaning unlimited. Each streamer takes one stream.
+    """
+
+    def __init__(self, edges: int, streamers: int, frontends: int,
+                 edge_policy: Callable, streamer_policy: Callable, frontend_policy: Callable,
+                 edge_capacity: Optional[int] = None, frontend_capacity: Optional[int] = None):
+        self.edges = Pool("edge", edges, edge_capacity)
+        self.streamers = Pool("streamer", streamers, 1)
+        self.frontends = Pool("frontend", frontends, frontend_capacity)
+        self.edge_policy = edge_policy
+        self.streamer_policy = streamer_policy
+        self.frontend_policy = frontend_policy
+        self.channels: Dict[str, _Channel] = {}
+        self.events = 0
+        self.unknown = defaultdict(int)
+        self.duration = 0.0
+        self._first = None
+
+    def run(self, events: Iterable[Event]):
+        handlers = {"open": self.open, "start": self.start, "join": self.join, "leave": self.leave, "end": self.end}
+        for event in events:
+            if self._first is None:
+                self._first = event.time
+            self.duration = event.time - self._first
+            self.events += 1
+            handlers[event.kind](event)
+        return self
+
+    def _pick(self, pool: Pool, policy: Callable, nodes: List[str], loads: dict, key: str):
+        pool.requests += 1
+        nodes = pool.available(nodes)
+        if not nodes:
+            pool.rejected += 1
+            return None
+        return policy(nodes, loads, key)
+
+    def open(self, event: Event):
+        if event.meeting_id in self.channels:
+            return
+        edge = self._pick(self.edges, self.edge_policy, self.edges.nodes, self.edges.load, event.meeting_id)
+        if edge is None:
+            return
+        self.edges.add(edge)
+        self.channels[event.meeting_id] = _Channel(edge)
+
+    def start(self, event: Event):
+        channel = self.channels.get(event.meeting_id)
+        if channel is None:
+            self.unknown["start"] += 1
+            return
+        if channel.streamer is not None:
+            return
+        streamer = self._pick(self.streamers, self.streamer_policy, self.streamers.nodes, self.streamers.load,
+                              event.meeting_id)
+        if streamer is None:
+            return
+        self.streamers.add(streamer)
+        channel.streamer = streamer
+
+    def join(self, event: Event):
+        channel = self.channels.get(event.meeting_id)
+        if channel is None:
+            self.unknown["join"] += 1
+            return
+        frontend = self._pick(self.frontends, self.frontend_policy, self.frontends.nodes, channel.viewers,
+                              event.user or event.meeting_id)
+        if frontend is None:
+            return
+        self.frontends.add(frontend)
+        channel.viewers[frontend] += 1
+        channel.users[event.user] = frontend
+
+    def leave(self, event: Event):
+        channel = self.channels.get(event.meeting_id)
+        frontend = channel and channel.users.pop(event.user, None)
+        if frontend is None:
+            self.unknown["leave"] += 1
+            return
+        self.frontends.add(frontend, -1)
+        channel.viewers[frontend] -= 1
+
+    def end(self, event: Event):
+        channel = self.channels.pop(event.meeting_id, None)
+        if channel is None:
+            self.unknown["end"] += 1
+            return
+        self.edges.add(channel.edge, -1)
+        if channel.streamer is not None:
+            self.streamers.add(channel.streamer, -1)
+        for frontend, viewers in channel.viewers.items():
+            self.frontends.add(frontend, -viewers)
+
+    def report(self) -> dict:
+        return {
+            "events": self.events,
+            "duration": self.duration,
+            "unknown_meetings": dict(self.unknown),
+            "edges": self.edges.report(),
+            "streamers": self.streamers.report(),
+            "frontends": self.frontends.report(),
+        }
@@ -0,0 +1,208 @@
+"""
+Starting streams
+
+Shared by startStream and everything handing freed streamers to the waitlist, including the management commands.
+"""
+import time
+from xml.etree.ElementTree import ParseError
+
+from django.conf import settings
+from django.db.models import Count
+from django.http import JsonResponse
+from django.utils import timezone
+from requests import RequestException
+
+from children import deadline
+from children.bbb_api import BBBError
+from children.models import BBB, BBBChat, ChildState, StreamChat
+from api import booking, waitlist
+from api.models import Channel
+from api.operations import Progress
+from api.scheduling import free_streamers
+
+
+def forward_response(name: str, response: dict, status=500):
+    msg = f"Couldn't start '{name}': {response['message']}"
+    return JsonResponse(
+        {"success": False, "message": msg},
+        status=504 if deadline.exceeded() else status,
+        reason=msg
+    )
+
+
+def free_streamer(meeting_id: str):
+    """
+    A free streamer, unless all free ones are held back for booked meetings
+    """
+    streamers = free_streamers()
+    if meeting_id not in booking.booked_now() and \
+            streamers.count() <= booking.reserved_streamers(exclude=meeting_id):
+        return None
+    return streamers.first()
+
+
+def _unassign(channel: Channel):
+    channel.bbb_chat = None
+    channel.bbb_live = None
+    channel.stream_chat = None
+    channel.save()
+
+
+def start_within_budget(meeting_id, progress: Progress, tenant="", priority=0):
+    """
+    `start` in a background thread, which doesn't inherit the request's deadline
+    """
+    # Background threads don't inherit the request's deadline
+    with deadline.deadline(settings.REQUEST_BUDGET):
+        return start(meeting_id, progress, tenant, priority)
+
+
+def start(meeting_id, progress: Progress, tenant="", priority=0):
+    """
+    Start the meeting's stream on a free streamer or put it on the waitlist
+    """
+    # A retry while waiting only learns its position
+    if progress.operation is None:
+        response = waitlist.waiting(meeting_id)
+        if response is not None:
+            return response
+
+    response = _start(meeting_id, progress, tenant, priority)
+    if response.status_code != 202:
+        waitlist.done(meeting_id)
+    return response
+
+
+def _start(meeting_id, progress: Progress, tenant, priority):
+    if Channel.objects.filter(meeting_id=meeting_id).count() == 0:
+        return JsonResponse(
+            {"success": False, "message": "There is no channel for this meeting"},
+            status=404,
+            reason="There is no channel for this meeting"
+        )
+    channel = Channel.objects.filter(meeting_id=meeting_id).last()
+
+    if channel.bbb_live is not None:
+        return JsonResponse(
+            {"success": False, "message": "The stream has already been started."},
+            status=304,
+            reason="The stream has already been started."
+        )
+
+    # Search in bbb instances for meeting id
+    progress.step("find meeting")
+    errors = []
+    for bbb in BBB.objects.all():
+        try:
+            if bbb.api.is_meeting_running(meeting_id):
+                break
+        except (RequestException, BBBError, ParseError) as err:
+            # The meeting may still be on one of the others
+            errors.append(f"'{bbb}': {err!r}")
+    else:
+        if errors:
+            message = f"No matching running meeting found, couldn't ask {', '.join(errors)}"[:1000]
+            return JsonResponse(
+                {"success": False, "message": message},
+                status=504 if deadline.exceeded() else 502,
+                reason="Couldn't ask every bbb."
+            )
+        return JsonResponse(
+            {"success": False, "message": "No matching running meeting found."},
+            status=404,
+            reason="No matching running meeting found."
+        )
+
+    # Get bbb-chat for bbb instance
+    progress.step("assign children")
+    bbb_chat = BBBChat.objects.get(bbb=bbb)
+
+    # Get the prewarmed bbb-live or one without running a stream
+    bbb_live = channel.prewarmed_live or free_streamer(meeting_id)
+    if bbb_live is None:
+        return waitlist.enqueue(meeting_id, tenant, priority, progress)
+
+    # Get stream-chat with least running chats
+    stream_chat = StreamChat.objects.filter(state=ChildState.ACTIVE) \
+        .annotate(channels=Count("channel")).order_by("channels", "id").first()
+    if stream_chat is None:
+        return JsonResponse(
+            {"success": False, "message": "There is no stream-chat registered."},
+            status=503,
+            reason="There is no stream-chat registered."
+        )
+
+    try:
+        info = bbb.api.get_meeting_info(meeting_id)
+        internal_meeting_id, meeting_password = info["internalMeetingID"], info["attendeePW"]
+    except (RequestException, BBBError, ParseError, KeyError) as err:
+        return forward_response("bbb", {"message": repr(err)})
+
+    # Update channel with bbb, streamer and stream's chat
+    channel.internal_meeting_id = internal_meeting_id
+    # Saves asking the bbb again when starting the stream
+    channel.meeting_password = meeting_password
+    channel.bbb_chat = bbb_chat
+    channel.bbb_live = bbb_live
+    channel.stream_chat = stream_chat
+    channel.tenant = tenant
+    channel.prewarmed_live = None
+    channel.prewarmed_at = None
+    channel.save()
+
+    # Start bbb-chat
+    progress.step("start bbb-chat")
+    response = channel.bbb_chat.start_chat(
+        meeting_id,
+        "Stream",
+        stream_chat.api_url,
+        stream_chat.secret
+    )
+    if not response["success"]:
+        _unassign(channel)
+        return forward_response("bbb-chat", response)
+
+    # Start stream's chat
+    progress.step("start stream-chat")
+    response = stream_chat.start_chat(
+        meeting_id,
+        bbb_chat.url,
+        bbb_chat.secret
+    )
+    if not response["success"]:
+        with deadline.grace(settings.COMPENSATION_BUDGET):
+            bbb_chat.end_chat(meeting_id)
+        _unassign(channel)
+        return forward_response("stream-chat", response)
+
+    # Start bbb-live
+    progress.step("start bbb-live")
+    time.sleep(0.5)  # TODO remove it if it doesn't fix bbb-chat's chat_user issue
+    response = channel.bbb_live.start_stream(
+        channel.rtmp_uri,
+        meeting_id,
+        channel.meeting_password
+    )
+    if not response["success"]:
+        with deadline.grace(settings.COMPENSATION_BUDGET):
+            stream_chat.end_chat(meeting_id)
+            bbb_chat.end_chat(meeting_id)
+        _unassign(channel)
+        return forward_response("bbb-live", response)
+
+    channel.live_seen_at = timezone.now()
+    channel.save()
+
+    # Report success
+    return JsonResponse(
+        {"success": True, "message": "Stream started successfully."}
+    )
+
+
+def admit(wait: bool = False) -> int:
+    """
+    Start waiting starts on the freed streamers, see `waitlist.admit`
+
+    Commands run once have to `wait` for the starts, their process exits afterwards.
+    """
+    return waitlist.admit(start_within_budget, wait=wait)
@@ -1,3 +1,860 @@
-from django.test import TestCase
+import json
+import logging
+import os
+import queue
+import random
+import tempfile
+import time
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.management import call_command
+from django.db import OperationalError
+from django.http import HttpResponse, JsonResponse
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+import requests
+from rc_protocol import get_checksum
+
+from api import booking, cluster, timeseries, waitlist
+from api.admission import JoinAdmission, Rejected, TokenBucket, retry_after_header
+from api.hashring import HashRing
+from api.intervals import IntervalIndex
+from api.join_table import fold_join_spool, sign
+from api.middleware import PROFILE_HEADER, ProfilingMiddleware, profile_token
+from api.operations import Progress, expire_stale, start_operation
+from api.views import _flag
+from api.models import Booking, Channel, Channel2Frontend, Failover, Lease, LoadSeries, Operation, OrphanSighting, \
+    RequestProfile, WaitingStart
+from bbb_controller import log
+from children import deadline
+from children.bbb_api import BBBApi
+from children.models import BBB, BBBChat, BBBLive, ChildState, StreamChat, StreamEdge, StreamFrontend
+
+
+class ApiTestCase(TestCase):
+
+    def post(self, endpoint, path="/api/v1/", **params):
+        params["checksum"] = get_checksum(dict(params), settings.SHARED_SECRET, endpoint)
+        return self.client.post(path + endpoint, json.dumps(params), content_type="application/json")
+
+    def get(self, endpoint, path="/api/v1/", **params):
+        params["checksum"] = get_checksum(dict(params), settings.SHARED_SECRET, endpoint)
+        return self.client.get(path + endpoint, params)
+
+
+@override_settings(CLUSTER_ENABLED=True)
+class ForwardSignatureTest(TestCase):
+
+    def request(self, body, header=None):
+        extra = {} if header is None else {"HTTP_X_CONTROLLER_FORWARDED": header}
+        return RequestFactory().post("/api/v1/startStream", body, content_type="application/json", **extra)
+
+    def sign(self, body):
+        digest = cluster._forward_digest("POST", "/api/v1/startStream", body)
+        return cluster._forward_signer().sign(f"node:{digest}")
+
+    def test_signed(self):
+        self.assertTrue(cluster.is_forwarded(self.request(b'{"meeting_id": "a"}', self.sign(b'{"meeting_id": "a"}'))))
+
+    def test_missing_or_unsigned(self):
+        self.assertFalse(cluster.is_forwarded(self.request(b"{}")))
+        self.assertFalse(cluster.is_forwarded(self.request(b"{}", "node")))
+
+    def test_other_body(self):
+        self.assertFalse(cluster.is_forwarded(self.request(b'{"meeting_id": "b"}', self.sign(b'{"meeting_id": "a"}'))))
+
+    @override_settings(SHARED_SECRET="other")
+    def test_other_secret(self):
+        header = cluster._forward_signer().sign("node:x")
+        with override_settings(SHARED_SECRET="secret"):
+            self.assertFalse(cluster.is_forwarded(self.request(b"{}", header)))
+
+
+class ChildRegistryTest(ApiTestCase):
+
+    def register(self, **child):
+        children = json.dumps([dict(type="bbb-live", **child)])
+        return self.post("registerChildren", path="/api/internal/", children=children)
+
+    def test_update_keeps_what_isnt_sent(self):
+        BBBLive.objects.create(url="https://live", secret="secret", state=ChildState.DISABLED)
+        self.assertEqual(self.register(url="https://live").status_code, 200)
+        live = BBBLive.objects.get(url="https://live")
+        self.assertEqual((live.secret, live.state), ("secret", ChildState.DISABLED))
+
+        self.register(url="https://live", state=ChildState.ACTIVE)
+        live.refresh_from_db()
+        self.assertEqual((live.secret, live.state), ("secret", ChildState.ACTIVE))
+
+    def test_new_child_defaults(self):
+        self.register(url="https://live")
+        self.assertEqual(BBBLive.objects.get(url="https://live").state, ChildState.ACTIVE)
+
+    def test_set_state_needs_list_of_urls(self):
+        for urls in ('{"url": 1}', "[1]", "5", "nope"):
+            response = self.post("setChildState", path="/api/internal/", type="bbb-live", urls=urls, state="disabled")
+            self.assertEqual(response.status_code, 400, urls)
+
+
+def fake_children(**endpoints):
+    """
+    Patch the requests to children, answering `endpoints[endpoint](base_url, params)` or a plain success
+    """
+    def request(method, base_url, secret, endpoint, params):
+        if endpoint in endpoints:
+            return endpoints[endpoint](base_url, params)
+        return {"success": True, "message": "ok"}
+    return mock.patch("children.models._request", side_effect=request)
+
+
+@mock.patch.object(Channel, "meeting_password", "password")
+class WatchdogTest(TestCase):
+
+    def setUp(self):
+        self.failing = BBBLive.objects.create(url="https://live0", secret="s")
+        self.spare = BBBLive.objects.create(url="https://live1", secret="s")
+        self.channel = Channel.objects.create(meeting_id="m", rtmp_uri="rtmp://edge/stream/key", bbb_live=self.failing)
+
+    def status(self, base_url, params):
+        return {"success": True, "content": {"running": "live1" in base_url}}
+
+    def test_failures_add_up_over_single_runs(self):
+        with fake_children(streamStatus=self.status) as request:
+            call_command("watch_streamers", verbosity=0)
+            self.channel.refresh_from_db()
+            self.assertEqual((self.channel.bbb_live, self.channel.live_failures), (self.failing, 1))
+
+            call_command("watch_streamers", verbosity=0)
+            self.channel.refresh_from_db()
+            self.assertEqual((self.channel.bbb_live, self.channel.live_failures), (self.spare, 0))
+        self.assertIn("startStream", [call.args[3] for call in request.call_args_list])
+        self.assertEqual(Failover.objects.get().replacement_live, "https://live1")
+
+    def test_ended_during_failover(self):
+        def start(base_url, params):
+            Channel.objects.filter(meeting_id="m").delete()
+            return {"success": True, "message": "started"}
+
+        Channel.objects.filter(pk=self.channel.pk).update(live_failures=settings.WATCHDOG_FAILURES)
+        with fake_children(streamStatus=self.status, startStream=start) as request:
+            call_command("watch_streamers", verbosity=0)
+        self.assertFalse(Channel.objects.exists())
+        self.assertEqual(request.call_args_list[-1].args[1:4:2], ("https://live1/api/v1", "stopStream"))
+
+    def test_bbb_unreachable(self):
+        healthy = Channel.objects.create(meeting_id="h", bbb_live=self.spare)
+        Channel.objects.filter(pk=self.channel.pk).update(live_failures=settings.WATCHDOG_FAILURES)
+        password = mock.PropertyMock(side_effect=requests.ConnectionError("down"))
+        with mock.patch.object(Channel, "meeting_password", password), \
+                fake_children(streamStatus=self.status) as request:
+            call_command("watch_streamers", verbosity=0)
+
+        # Nothing was stopped or disabled, the other channels were still checked
+        self.assertNotIn("stopStream", [call.args[3] for call in request.call_args_list])
+        self.failing.refresh_from_db()
+        healthy.refresh_from_db()
+        self.assertEqual(self.failing.state, ChildState.ACTIVE)
+        self.assertIsNotNone(healthy.live_seen_at)
+        self.assertIn("ConnectionError", Failover.objects.get().message)
+
+
+@mock.patch.object(Channel, "meeting_password", "password")
+class EdgeWatchdogTest(TestCase):
+
+    def setUp(self):
+        self.failing = StreamEdge.objects.create(url="https://edge0", secret="s")
+        self.standby = StreamEdge.objects.create(url="https://edge1", secret="s")
+        self.channel = Channel.objects.create(
+            meeting_id="m", rtmp_uri="rtmp://edge0/stream/a", stream_edge=self.failing,
+            standby_edge=self.standby, standby_rtmp_uri="rtmp://edge1/stream/b",
+            bbb_live=BBBLive.objects.create(url="https://live", secret="s"),
+        )
+        self.answers = {
+            "https://edge0/api/v1": {"success": False, "message": "unreachable"},
+            "https://edge1/api/v1": {"success": True, "content": {"channels": ["m"]}},
+        }
+
+    def run_watchdog(self, runs=2):
+        with fake_children(openChannels=lambda base_url, params: self.answers[base_url]):
+            for _ in range(runs):
+                call_command("watch_streamers", verbosity=0)
+        self.channel.refresh_from_db()
+        self.failing.refresh_from_db()
+
+    def test_switch(self):
+        self.run_watchdog(runs=1)
+        self.assertEqual((self.channel.stream_edge, self.channel.edge_failures), (self.failing, 1))
+
+        self.run_watchdog(runs=1)
+        self.assertEqual(
+            (self.channel.stream_edge, self.channel.rtmp_uri, self.channel.standby_edge, self.channel.edge_failures),
+            (self.standby, "rtmp://edge1/stream/b", None, 0)
+        )
+        self.assertEqual(self.failing.state, ChildState.DISABLED)
+        self.assertEqual(Failover.objects.get().replacement_live, "https://edge1")
+
+    def test_answering_edge(self):
+        # A missing channel or an admin disabling the edge doesn't make it fail
+        self.answers["https://edge0/api/v1"] = {"success": True, "content": {"channels": []}}
+        StreamEdge.objects.filter(pk=self.failing.pk).update(state=ChildState.DISABLED)
+        self.run_watchdog()
+        self.assertEqual((self.channel.stream_edge, self.channel.edge_failures), (self.failing, 0))
+
+    def test_malformed_answer(self):
+        self.answers["https://edge0/api/v1"] = {"success": True, "content": {}}
+        self.run_watchdog()
+        self.assertEqual(self.channel.stream_edge, self.standby)
+
+    def test_bbb_unreachable(self):
+        password = mock.PropertyMock(side_effect=requests.ConnectionError("down"))
+        with mock.patch.object(Channel, "meeting_password", password):
+            self.run_watchdog()
+        self.assertEqual(self.channel.stream_edge, self.failing)
+        self.assertIn("ConnectionError", Failover.objects.get().message)
+
+    def test_standby_refuses_stream(self):
+        def start(base_url, params):
+            return {"success": "edge0" in params["rtmp_uri"], "message": "refused"}
+
+        with fake_children(openChannels=lambda base_url, params: self.answers[base_url], startStream=start):
+            for _ in range(2):
+                call_command("watch_streamers", verbosity=0)
+        self.assertEqual(Failover.objects.get().message,
+                         "Couldn't restart 'https://live' on the standby: refused, restarted on the failed edge")
+
+    def test_standby_not_ready(self):
+        self.answers["https://edge1/api/v1"] = {"success": True, "content": {"channels": []}}
+        self.run_watchdog()
+        self.assertEqual((self.channel.stream_edge, self.channel.edge_failures), (self.failing, 2))
+        self.assertFalse(Failover.objects.exists())
+
+
+class ReconcileViewersTest(TestCase):
+
+    def test_failing_frontend_keeps_its_count(self):
+        channel = Channel.objects.create(meeting_id="m")
+        for name in ("ok", "down", "malformed"):
+            frontend = StreamFrontend.objects.create(url=f"https://{name}", secret="s")
+            Channel2Frontend.objects.create(channel=channel, frontend=frontend, viewers=5)
+
+        answers = {
+            "https://ok/api/v1": {"success": True, "content": {"viewers": {"m": 7}}},
+            "https://down/api/v1": {"success": False, "message": "unreachable"},
+            "https://malformed/api/v1": {"success": True, "content": {"viewers": ["m"]}},
+        }
+        with fake_children(viewerCounts=lambda base_url, params: answers[base_url]):
+            call_command("reconcile_viewers", verbosity=0, stderr=StringIO())
+        viewers = dict(Channel2Frontend.objects.values_list("frontend__url", "viewers"))
+        self.assertEqual(viewers, {"https://ok": 7, "https://down": 5, "https://malformed": 5})
+
+
+class ReconcileOrphansTest(TestCase):
+
+    def setUp(self):
+        StreamEdge.objects.create(url="https://edge", secret="s")
+        self.listings = {"channels": ["orphan"]}
+
+    def run_reconciler(self):
+        with fake_children(
+            openChannels=lambda base_url, params: {"success": True, "content": self.listings},
+            runningChats=lambda base_url, params: {"success": True, "content": {"chats": []}},
+            runningStreams=lambda base_url, params: {"success": True, "content": {"streams": []}},
+        ) as request:
+            call_command("reconcile_orphans", verbosity=0, stdout=mock.Mock(), stderr=mock.Mock())
+        return [call.args[3] for call in request.call_args_list]
+
+    def test_stops_after_grace(self):
+        self.assertNotIn("closeChannel", self.run_reconciler())
+        with override_settings(ORPHAN_GRACE=0):
+            self.assertIn("closeChannel", self.run_reconciler())
+
+    def test_forgets_channels_saved_meanwhile(self):
+        self.run_reconciler()
+        Channel.objects.create(meeting_id="orphan", stream_edge=StreamEdge.objects.get())
+        with override_settings(ORPHAN_GRACE=0):
+            self.assertNotIn("closeChannel", self.run_reconciler())
+        self.assertFalse(OrphanSighting.objects.exists())
+
+    def test_malformed_listing(self):
+        self.listings = {"streams": []}
+        self.assertNotIn("closeChannel", self.run_reconciler())
+
+
+class ChannelETagTest(ApiTestCase):
+
+    def setUp(self):
+        self.channel = Channel.objects.create(meeting_id="m")
+        self.frontends = [StreamFrontend.objects.create(url=f"https://front{i}", secret="s") for i in range(2)]
+        self.channel.frontends.add(self.frontends[0])
+
+    def etags(self):
+        return (
+            self.get("channelStatus", meeting_id="m")["ETag"],
+            self.get("listChannels")["ETag"],
+        )
+
+    def test_not_modified(self):
+        etag = self.get("channelStatus", meeting_id="m")["ETag"]
+        params = {"meeting_id": "m"}
+        params["checksum"] = get_checksum(dict(params), settings.SHARED_SECRET, "channelStatus")
+        response = self.client.get("/api/v1/channelStatus", params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_added_frontend(self):
+        before = self.etags()
+        self.channel.frontends.add(self.frontends[1])
+        after = self.etags()
+        self.assertNotEqual(before[0], after[0])
+        self.assertNotEqual(before[1], after[1])
+
+    def test_viewers_moved_between_frontends(self):
+        self.channel.frontends.add(self.frontends[1])
+        Channel2Frontend.objects.filter(frontend=self.frontends[0]).update(viewers=5)
+        before = self.etags()
+        Channel2Frontend.objects.filter(frontend=self.frontends[0]).update(viewers=0)
+        Channel2Frontend.objects.filter(frontend=self.frontends[1]).update(viewers=5)
+        after = self.etags()
+        self.assertNotEqual(before[0], after[0])
+        self.assertNotEqual(before[1], after[1])
+
+
+class OperationTest(TestCase):
+
+    def test_stale_operation_is_replaced(self):
+        stale = Operation.objects.create(kind="startStream", meeting_id="m", state=Operation.RUNNING)
+        Operation.objects.filter(id=stale.id).update(updated=timezone.now() - timedelta(
+            seconds=settings.REQUEST_BUDGET + settings.COMPENSATION_BUDGET + 1
+        ))
+        with mock.patch("api.operations.run_operation") as run:
+            response = start_operation("startStream", "m", lambda progress: None)
+        self.assertNotEqual(json.loads(response.content)["content"]["operation_id"], str(stale.id))
+        run.assert_called_once()
+        stale.refresh_from_db()
+        self.assertEqual(stale.state, Operation.FAILED)
+
+    def test_running_operation_is_reused(self):
+        running = Operation.objects.create(kind="startStream", meeting_id="m", state=Operation.RUNNING)
+        with mock.patch("api.operations.run_operation") as run:
+            response = start_operation("startStream", "m", lambda progress: None)
+        self.assertEqual(json.loads(response.content)["content"]["operation_id"], str(running.id))
+        run.assert_not_called()
+
+    def test_flag(self):
+        cases = ((True, True), (False, False), ("true", True), ("false", False), ("0", False), (1, True))
+        for value, expected in cases:
+            self.assertIs(_flag(value), expected, value)
+        with self.assertRaises(ValueError):
+            _flag("maybe")
+
+
+class BudgetTest(ApiTestCase):
+
+    @override_settings(CLUSTER_ENABLED=True)
+    def test_forward_with_spent_budget(self):
+        request = RequestFactory().post("/api/v1/startStream", b"{}", content_type="application/json")
+        with mock.patch("api.cluster.owner_of"), mock.patch("api.cluster.requests.request") as forward:
+            with deadline.deadline(0):
+                response = cluster.forward_to_owner(request, "m")
+        self.assertEqual(response.status_code, 504)
+        forward.assert_not_called()
+
+    def test_open_channel_undone_when_budget_runs_out(self):
+        StreamEdge.objects.create(url="https://edge", secret="s")
+        StreamFrontend.objects.create(url="https://front", secret="s")
+
+        def request(method, base_url, secret, endpoint, params):
+            if deadline.exceeded():
+                return {"success": False, "message": "deadline exceeded"}
+            if "edge" in base_url and endpoint == "openChannel":
+                time.sleep(0.2)
+                return {"success": True, "message": "", "content": {"streaming_key": "key"}}
+            return {"success": True, "message": ""}
+
+        params = {"meeting_id": "m"}
+        params["checksum"] = get_checksum(dict(params), settings.SHARED_SECRET, "openChannel")
+        with mock.patch("children.models._request", side_effect=request) as calls:
+            response = self.client.post(
+                "/api/v1/openChannel", json.dumps(params), content_type="application/json", HTTP_X_REQUEST_TIMEOUT="0.1"
+            )
+        self.assertEqual(response.status_code, 504)
+        self.assertFalse(json.loads(response.content)["success"])
+        self.assertFalse(Channel.objects.exists())
+        closed = {call.args[1] for call in calls.call_args_list if call.args[3] == "closeChannel"}
+        self.assertEqual(closed, {"https://edge/api/v1", "https://front/api/v1"})
+
+    def end_stream_slowly(self):
+        edge = StreamEdge.objects.create(url="https://edge", secret="s")
+        live = BBBLive.objects.create(url="https://live", secret="s")
+        Channel.objects.create(meeting_id="m", stream_edge=edge, bbb_live=live)
+
+        def request(method, base_url, secret, endpoint, params):
+            if deadline.exceeded():
+                return {"success": False, "message": "deadline exceeded"}
+            time.sleep(0.15)
+            return {"success": True, "message": ""}
+
+        params = {"meeting_id": "m"}
+        params["checksum"] = get_checksum(dict(params), settings.SHARED_SECRET, "endStream")
+        with mock.patch("children.models._request", side_effect=request) as calls:
+            response = self.client.post(
+                "/api/v1/endStream", json.dumps(params), content_type="application/json", HTTP_X_REQUEST_TIMEOUT="0.1"
+            )
+        return response, [call.args[3] for call in calls.call_args_list]
+
+    def test_end_stream_finishes_teardown(self):
+        response, endpoints = self.end_stream_slowly()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(endpoints, ["stopStream", "closeChannel"])
+        self.assertFalse(Channel.objects.exists())
+
+    @override_settings(COMPENSATION_BUDGET=0.01)
+    def test_end_stream_kept_when_teardown_runs_out(self):
+        response, _ = self.end_stream_slowly()
+        self.assertEqual(response.status_code, 504)
+        self.assertTrue(Channel.objects.exists())
+
+
+class TimeSeriesTest(TestCase):
+
+    def test_record_many_meetings(self):
+        now = timezone.now()
+        samples = {(f"meeting-{i}", "viewers"): i for i in range(1200)}
+        timeseries.record(samples, now)
+        timeseries.record({key: value + 1 for key, value in samples.items()}, now)
+        self.assertEqual(LoadSeries.objects.count(), 3 * 1200)
+
+        _, _, points = timeseries.query(
+            "meeting-7", "viewers", now - timedelta(minutes=1), now + timedelta(minutes=1), resolution=LoadSeries.RAW
+        )
+        self.assertEqual([value for _, value in points], [8])
+
+
+class StartStreamTest(ApiTestCase):
+
+    def setUp(self):
+        for i in range(2):
+            BBBChat.objects.create(bbb=BBB.objects.create(url=f"https://bbb{i}/bigbluebutton/", secret="s"), secret="s")
+        BBBLive.objects.create(url="https://live", secret="s")
+        StreamChat.objects.create(url="https://chat", secret="s")
+        Channel.objects.create(meeting_id="m", rtmp_uri="rtmp://edge/stream/key")
+
+    def running(self, api, meeting_id):
+        if "bbb0" in api.base_url:
+            raise requests.ConnectionError("unreachable")
+        return "bbb1" in api.base_url and self.found
+
+    def start(self):
+        info = {"internalMeetingID": "internal", "attendeePW": "password"}
+        with mock.patch.object(BBBApi, "is_meeting_running", autospec=True, side_effect=self.running), \
+                mock.patch.object(BBBApi, "get_meeting_info", return_value=info), fake_children():
+            return self.post("startStream", meeting_id="m")
+
+    def test_skips_unreachable_bbb(self):
+        self.found = True
+        self.assertEqual(self.start().status_code, 200)
+        channel = Channel.objects.get()
+        self.assertEqual((str(channel.bbb_chat.bbb), channel.internal_meeting_id),
+                         ("https://bbb1/bigbluebutton/", "internal"))
+
+    def test_not_found_with_unreachable_bbb(self):
+        self.found = False
+        self.assertEqual(self.start().status_code, 502)
+
+    def test_least_loaded_stream_chat(self):
+        busy = StreamChat.objects.get()
+        idle = StreamChat.objects.create(url="https://chat2", secret="s")
+        Channel.objects.create(meeting_id="other", stream_chat=busy)
+        self.found = True
+        self.assertEqual(self.start().status_code, 200)
+        self.assertEqual(Channel.objects.get(meeting_id="m").stream_chat, idle)
+
+
+@override_settings(PREWARM_STREAMERS=True)
+class PrewarmTest(ApiTestCase):
+
+    def setUp(self):
+        BBBChat.objects.create(bbb=BBB.objects.create(url="https://bbb/bigbluebutton/", secret="s"), secret="s")
+        StreamEdge.objects.create(url="https://edge", secret="s")
+        StreamChat.objects.create(url="https://chat", secret="s")
+        self.lives = [BBBLive.objects.create(url=f"https://live{i}", secret="s") for i in range(2)]
+
+    def open(self, meeting_id):
+        opened = {"success": True, "message": "", "content": {"streaming_key": "key"}}
+        with fake_children(openChannel=lambda base_url, params: opened) as request:
+            self.assertEqual(self.post("openChannel", meeting_id=meeting_id).status_code, 200)
+        return [call.args[1:4:2] for call in request.call_args_list]
+
+    def test_handover(self):
+        calls = self.open("m")
+        channel = Channel.objects.get()
+        self.assertEqual(channel.prewarmed_live, self.lives[0])
+        self.assertIn(("https://live0/api/v1", "prepareStream"), calls)
+
+        info = {"internalMeetingID": "internal", "attendeePW": "password"}
+        with mock.patch.object(BBBApi, "is_meeting_running", return_value=True), \
+                mock.patch.object(BBBApi, "get_meeting_info", return_value=info), fake_children() as request:
+            self.assertEqual(self.post("startStream", meeting_id="m").status_code, 200)
+        channel.refresh_from_db()
+        self.assertEqual((channel.bbb_live, channel.prewarmed_live, channel.prewarmed_at), (self.lives[0], None, None))
+        self.assertIn(("https://live0/api/v1", "startStream"), [call.args[1:4:2] for call in request.call_args_list])
+
+    def test_release_after_ttl(self):
+        self.open("old")
+        self.open("new")
+        Channel.objects.filter(meeting_id="old").update(
+            prewarmed_at=timezone.now() - timedelta(seconds=settings.PREWARM_TTL + 1)
+        )
+        with fake_children() as request:
+            call_command("release_prewarmed", verbosity=0)
+        calls = [call.args[1:4:2] for call in request.call_args_list]
+        self.assertEqual(calls, [("https://live0/api/v1", "stopStream")])
+        prewarmed = dict(Channel.objects.values_list("meeting_id", "prewarmed_live"))
+        self.assertEqual(prewarmed, {"old": None, "new": self.lives[1].id})
+
+
+class WaitlistTest(TestCase):
+
+    def wait(self, meeting_id, tenant="", priority=0, minutes_ago=0):
+        operation = Operation.objects.create(kind="startStream", meeting_id=meeting_id, state=Operation.WAITING)
+        entry = WaitingStart.objects.create(
+            meeting_id=meeting_id, tenant=tenant, priority=priority, operation=operation
+        )
+        WaitingStart.objects.filter(id=entry.id).update(created=timezone.now() - timedelta(minutes=minutes_ago))
+        return operation
+
+    def test_order(self):
+        busy = BBBLive.objects.create(url="https://live", secret="s")
+        Channel.objects.create(meeting_id="running", bbb_live=busy, tenant="busy")
+        self.wait("old", tenant="busy", minutes_ago=3)
+        self.wait("new", tenant="busy", minutes_ago=1)
+        self.wait("idle", tenant="idle", minutes_ago=2)
+        self.wait("urgent", tenant="busy", priority=1)
+        self.assertEqual([entry.meeting_id for entry in waitlist._queue()], ["urgent", "idle", "old", "new"])
+
+    def test_enqueue_conflict(self):
+        queued = self.wait("m")
+        response = waitlist.enqueue("m", "", 0, Progress())
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(Operation.objects.count(), 1)
+
+        mine = Operation.objects.create(kind="startStream", meeting_id="m")
+        response = waitlist.enqueue("m", "", 0, Progress(mine))
+        self.assertEqual(response.status_code, 409)
+        self.assertIn(str(queued.id), json.loads(response.content)["message"])
+        mine.refresh_from_db()
+        self.assertEqual(mine.state, Operation.PENDING)
+
+    @override_settings(REQUEST_BUDGET=None)
+    def test_without_budget(self):
+        operation = self.wait("m")
+        Operation.objects.filter(id=operation.id).update(updated=timezone.now() - timedelta(hours=1))
+        WaitingStart.objects.update(dispatched=True)
+        self.assertEqual(waitlist.admit(mock.Mock()), 0)
+        self.assertFalse(WaitingStart.objects.get().dispatched)
+
+    @override_settings(CLUSTER_ENABLED=True, CLUSTER_NODE_NAME="this")
+    def test_admit_owned_shards_only(self):
+        BBBLive.objects.create(url="https://live0", secret="s")
+        BBBLive.objects.create(url="https://live1", secret="s")
+        expires = timezone.now() + timedelta(minutes=1)
+        for meeting_id, owner in (("mine", "this"), ("theirs", "other")):
+            Lease.objects.create(name=f"shard-{cluster.shard_of(meeting_id)}", owner=owner, expires=expires)
+            self.wait(meeting_id)
+
+        with mock.patch("api.waitlist.run_operation") as run:
+            self.assertEqual(waitlist.admit(mock.Mock()), 1)
+        self.assertEqual(run.call_args.args[0].meeting_id, "mine")
+        self.assertFalse(WaitingStart.objects.get(meeting_id="theirs").dispatched)
+
+    def test_orphaned_waiting(self):
+        orphan = Operation.objects.create(kind="startStream", meeting_id="a", state=Operation.WAITING)
+        queued = self.wait("b")
+        expire_stale(Operation.objects.all())
+        orphan.refresh_from_db()
+        queued.refresh_from_db()
+        self.assertEqual((orphan.state, queued.state), (Operation.FAILED, Operation.WAITING))
+
+
+class AdmitTest(TransactionTestCase):
+    # The starts run in threads, which only see committed rows
+
+    def test_admit_waits(self):
+        BBBLive.objects.create(url="https://live", secret="s")
+        operation = Operation.objects.create(kind="startStream", meeting_id="m", state=Operation.WAITING)
+        WaitingStart.objects.create(meeting_id="m", operation=operation)
+        started = []
+
+        def start(meeting_id, progress, tenant, priority):
+            time.sleep(0.1)
+            started.append(meeting_id)
+            return JsonResponse({"success": True, "message": "Started"})
+
+        self.assertEqual(waitlist.admit(start, wait=True), 1)
+        self.assertEqual(started, ["m"])
+        operation.refresh_from_db()
+        self.assertEqual(operation.state, Operation.SUCCEEDED)
+
+
+class IntervalIndexTest(TestCase):
+
+    def test_against_brute_force(self):
+        rng = random.Random(4)
+        intervals = []
+        for key in range(300):
+            start = rng.uniform(0, 1000)
+            intervals.append((start, start + rng.uniform(0.5, 50), key))
+        index = IntervalIndex(intervals[:150])
+        for interval in intervals[150:]:
+            index.add(*interval)
+        for interval in intervals[::3]:
+            index.remove(interval[2])
+        remaining = [interval for interval in intervals if interval[2] % 3]
+        self.assertEqual(len(index), len(remaining))
+
+        for _ in range(100):
+            start = rng.uniform(0, 1000)
+            end = start + rng.uniform(0.1, 30)
+            expected = sorted(key for other_start, other_end, key in remaining
+                              if other_start < end and other_end > start)
+            self.assertEqual(sorted(key for _, _, key in index.overlapping(start, end)), expected)
+
+            points = [start] + [other_start for other_start, _, _ in remaining if start < other_start < end]
+            highest = max(sum(a <= point < b for a, b, _ in remaining) for point in points)
+            self.assertEqual(index.max_overlap(start, end), highest)
+
+    def test_half_open(self):
+        index = IntervalIndex([(0, 10, "a"), (10, 20, "b")])
+        self.assertEqual(index.max_overlap(0, 20), 1)
+        self.assertEqual([key for _, _, key in index.overlapping(10, 11)], ["b"])
+
+
+class BookingTest(ApiTestCase):
+
+    def setUp(self):
+        BBBLive.objects.create(url="https://live", secret="s")
+        self.now = timezone.now()
+
+    def at(self, minutes):
+        return self.now + timedelta(minutes=minutes)
+
+    def test_conflicts(self):
+        first = booking.book("a", self.at(10), self.at(70))
+        self.assertIsNotNone(first)
+        self.assertIsNone(booking.book("b", self.at(60), self.at(120)))
+        self.assertIsNotNone(booking.book("c", self.at(70), self.at(120)))
+
+        self.assertTrue(booking.cancel(first.id))
+        self.assertFalse(booking.cancel(first.id))
+        self.assertIsNotNone(booking.book("b", self.at(60), self.at(65)))
+
+    def test_index_kept_current(self):
+        booking.book("a", self.at(10), self.at(20))
+        index = booking.get_index()
+        second = booking.book("b", self.at(30), self.at(40))
+        booking.cancel(second.id)
+        self.assertIs(booking.get_index(), index)
+        self.assertEqual([key[1] for _, _, key in index.overlapping(0, self.at(60).timestamp())], ["a"])
+
+        # Changes in the admin rebuild it
+        Booking.objects.create(meeting_id="c", start=self.at(50), end=self.at(55))
+        self.assertEqual(len(booking.get_index()), 2)
+
+    @override_settings(EDGE_CAPACITY=2, EDGE_REDUNDANCY=True)
+    def test_edge_redundancy(self):
+        BBBLive.objects.create(url="https://live1", secret="s")
+        StreamEdge.objects.create(url="https://edge", secret="s")
+        # Each meeting takes two of the edge's channels
+        self.assertEqual(booking.capacity(), 1)
+        booking.book("a", self.at(-1), self.at(60))
+        self.assertEqual(booking.reserved_edges(), 2)
+
+    def test_busy(self):
+        with mock.patch("api.booking.time.sleep"), \
+                mock.patch.object(booking.BookingLock.objects, "get_or_create", side_effect=OperationalError("locked")):
+            response = self.post(
+                "bookCapacity", meeting_id="a", start=self.at(10).timestamp(), end=self.at(20).timestamp()
+            )
+        self.assertEqual((response.status_code, response["Retry-After"]), (503, "1"))
+
+
+class JoinTableTest(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.table_path = os.path.join(self.directory.name, "join_table.json")
+        self.spool_path = os.path.join(self.directory.name, "join_spool.tsv")
+        channel = Channel.objects.create(meeting_id="m")
+        self.frontends = [StreamFrontend.objects.create(url=f"https://frontend{i}", secret="s") for i in range(3)]
+        self.frontends[2].state = ChildState.DISABLED
+        self.frontends[2].save()
+        for frontend, viewers in zip(self.frontends, (5, 2, 0)):
+            Channel2Frontend.objects.create(channel=channel, frontend=frontend, viewers=viewers)
+
+    def publish(self):
+        with override_settings(JOIN_TABLE_PATH=self.table_path, JOIN_SPOOL_PATH=self.spool_path):
+            call_command("publish_join_table", verbosity=0)
+        with open(self.table_path) as file:
+            content = json.load(file)
+        self.assertEqual(content["signature"], sign(content["payload"], settings.SHARED_SECRET))
+        return json.loads(content["payload"])
+
+    def test_weights(self):
+        table = self.publish()
+        # Inactive frontends are left out, the others are weighted by how far they are behind the busiest
+        weights = {frontend_id: weight for frontend_id, weight in table["channels"]["m"]}
+        self.assertEqual(weights, {self.frontends[0].id: 1, self.frontends[1].id: 4})
+        self.assertEqual(set(table["frontends"]), {str(self.frontends[0].id), str(self.frontends[1].id)})
+
+    def test_fold_spool(self):
+        with open(self.spool_path, "w") as file:
+            file.write(f"m\t{self.frontends[1].id}\n" * 3 + "garbage\n" + f"unknown\t{self.frontends[0].id}\n")
+        table = self.publish()
+        viewers = dict(Channel2Frontend.objects.values_list("frontend_id", "viewers"))
+        self.assertEqual(viewers[self.frontends[1].id], 5)
+        self.assertEqual(sorted(weight for _, weight in table["channels"]["m"]), [1, 1])
+        self.assertFalse(os.path.exists(self.spool_path))
+        self.assertEqual(fold_join_spool(self.spool_path), 0)
+
+
+class HashRingTest(TestCase):
+
+    def test_stable_lookup(self):
+        ring = HashRing(["a", "b", "c", "d"])
+        keys = [f"user{i}" for i in range(1000)]
+        before = {key: ring.lookup(key) for key in keys}
+        self.assertEqual(set(before.values()), {"a", "b", "c", "d"})
+
+        # Only the removed node's keys move
+        ring.remove("d")
+        moved = [key for key in keys if ring.lookup(key) != before[key]]
+        self.assertEqual({before[key] for key in moved}, {"d"})
+
+        ring.add("d")
+        self.assertEqual({key: ring.lookup(key) for key in keys}, before)
+
+    def test_bounded_load(self):
+        ring = HashRing(["a", "b"])
+        loads = {"a": 0, "b": 0}
+        for i in range(100):
+            node = ring.lookup(f"user{i}", loads, 1.25)
+            # ceil(1.25 * (joined + 1) / 2)
+            self.assertLess(loads[node], -(-5 * (i + 1) // 8))
+            loads[node] += 1
+        self.assertLessEqual(max(loads.values()), 63)
+
+    def test_empty(self):
+        self.assertIsNone(HashRing([]).lookup("user", {}))
+
+
+class AdmissionTest(TestCase):
+
+    def setUp(self):
+        self.now = 100.0
+        clock = mock.patch("api.admission.time")
+        self.time = clock.start()
+        self.time.monotonic.side_effect = lambda: self.now
+        self.addCleanup(clock.stop)
+
+    def test_bucket(self):
+        bucket = TokenBucket(rate=10, burst=2)
+        bucket.take()
+        bucket.take()
+        with self.assertRaises(Rejected) as rejected:
+            bucket.take()
+        self.assertAlmostEqual(rejected.exception.retry_after, 0.1)
+
+        self.now += 0.05
+        with self.assertRaises(Rejected) as rejected:
+            bucket.take()
+        self.assertAlmostEqual(rejected.exception.retry_after, 0.05)
+
+        self.now += 1
+        self.assertTrue(bucket.idle)
+        bucket.take()
+
+    @override_settings(JOIN_RATE=10, JOIN_BURST=5, JOIN_CHANNEL_RATE=1, JOIN_CHANNEL_BURST=1)
+    def test_channel_rejection_refunds_global(self):
+        admission = JoinAdmission()
+        admission.admit("a")
+        with self.assertRaises(Rejected):
+            admission.admit("a")
+        self.assertEqual(admission.global_bucket._tokens, 4)
+        admission.admit("b")
+        # Rejected joins don't hold the worker
+        self.time.sleep.assert_not_called()
+
+    def test_retry_after_header(self):
+        self.assertEqual([retry_after_header(Rejected(seconds)) for seconds in (0.2, 1, 2.1)], ["1", "1", "3"])
+
+
+@override_settings(PROFILING_ENABLED=True, PROFILING_SAMPLE_RATE=0.0)
+class ProfilingTest(TestCase):
+
+    def setUp(self):
+        get_user_model().objects.create(username="admin", is_staff=True)
+        self.middleware = ProfilingMiddleware(lambda request: HttpResponse("ok"))
+
+    def request(self, token=None):
+        headers = {} if token is None else {f"HTTP_{PROFILE_HEADER.upper().replace('-', '_')}": token}
+        return self.middleware(RequestFactory().get("/api/v1/listChannels", **headers))
+
+    @override_settings(PROFILING_ENABLED=False)
+    def test_dropped_when_disabled(self):
+        with self.assertRaises(MiddlewareNotUsed):
+            ProfilingMiddleware(lambda request: HttpResponse("ok"))
+
+    def test_signed_header(self):
+        self.assertEqual(self.request(profile_token("admin")).status_code, 200)
+        self.assertEqual(RequestProfile.objects.get().user, "admin")
+
+    def test_unsigned_header(self):
+        for token in ("admin", profile_token("admin") + "x", profile_token("nobody")):
+            self.request(token)
+        self.assertFalse(RequestProfile.objects.exists())
+
+
+class LogTest(TestCase):
+
+    def record(self, msg="Couldn't reach the child", level=logging.WARNING):
+        return logging.makeLogRecord({"name": "api.views", "levelno": level, "levelname": "WARNING", "msg": msg})
+
+    def test_repeat_filter(self):
+        self.now = 0.0
+        repeats = log.RepeatFilter(window=60)
+        with mock.patch("bbb_controller.log.time.monotonic", side_effect=lambda: self.now):
+            self.assertTrue(repeats.filter(self.record()))
+            self.assertFalse(repeats.filter(self.record()))
+            self.assertFalse(repeats.filter(self.record()))
+            self.assertTrue(repeats.filter(self.record("Something else")))
+            self.assertTrue(repeats.filter(self.record(level=logging.INFO)))
+
+            self.now = 61.0
+            record = self.record()
+            self.assertTrue(repeats.filter(record))
+        self.assertEqual(record.repeated, 2)
+
+    def test_drop_counter(self):
+        handler = log.QueueHandler(queue_size=2)
+        # Without the writer thread nothing empties the queue
+        handler.queue = queue.Queue(2)
+        handler._pid = os.getpid()
+        dropped = log.dropped()
+        for _ in range(5):
+            handler.emit(self.record())
+        self.assertEqual(log.dropped() - dropped, 3)
+
+        stream = StringIO()
+        output = logging.StreamHandler(stream)
+        output.setFormatter(log.JsonFormatter())
+        writer = log._Writer(handler.queue, output)
+        writer._reported = dropped
+        writer.handle(handler.queue.get())
+        lines = [json.loads(line) for line in stream.getvalue().splitlines()]
+        self.assertEqual([line["message"] for line in lines],
+                         ["Dropped 3 log records, the queue was full", "Couldn't reach the child"])
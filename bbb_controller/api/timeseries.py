@@ -0,0 +1,129 @@
+"""
+Compact load time-series per channel and for the whole fleet
+
+A series is stored in windows, each a `LoadSeries` row holding an `array("i")` with one value per step.
+Every sample is written into the raw, minute and hour window at once: viewers keep the maximum
+of their step, assignments the last value. Reading a week therefore only touches a few hour or minute rows.
+Windows older than `LOAD_RETENTION` of their resolution are deleted by `prune`.
+"""
+from array import array
+from datetime import datetime, timedelta, timezone as tz
+from typing import Dict, Optional, Tuple
+
+from django.conf import settings
+
+from api.models import LoadSeries
+
+MISSING = -1
+# Meetings per query when loading their windows
+QUERY_CHUNK = 500
+
+
+def _steps():
+    """
+    Step and window length in seconds per resolution
+    """
+    return {
+        LoadSeries.RAW: (settings.LOAD_SAMPLE_INTERVAL, 3600),
+        LoadSeries.MINUTE: (60, 6 * 3600),
+        LoadSeries.HOUR: (3600, 7 * 86400),
+    }
+
+
+def _combine(name: str, old: int, new: int) -> int:
+    if name.startswith("viewers") or name in ("channels", "streams"):
+        return max(old, new)
+    # Assigned child ids
+    return new
+
+
+def _window(timestamp: float, step: int, window: int) -> Tuple[datetime, int]:
+    start = timestamp - timestamp % window
+    return datetime.fromtimestamp(start, tz.utc), int((timestamp - start) // step)
+
+
+def record(samples: Dict[Tuple[str, str], int], now: Optional[datetime] = None):
+    """
+    Write one sample per `(meeting_id, name)` into all resolutions
+    """
+    timestamp = (now or datetime.now(tz.utc)).timestamp()
+    meetings = sorted({meeting_id for meeting_id, _ in samples})
+    for resolution, (step, window) in _steps().items():
+        start, slot = _window(timestamp, step, window)
+        rows = {}
+        # In chunks, since databases limit the variables of a query, e.g. sqlite to 999 in older versions
+        for offset in range(0, len(meetings), QUERY_CHUNK):
+            rows.update(
+                ((row.meeting_id, row.name), row)
+                for row in LoadSeries.objects.filter(
+                    resolution=resolution, start=start, meeting_id__in=meetings[offset:offset + QUERY_CHUNK]
+                )
+            )
+
+        created, updated = [], []
+        for key, value in samples.items():
+            row = rows.get(key)
+            if row is None:
+                row = LoadSeries(meeting_id=key[0], name=key[1], resolution=resolution, start=start,
+                                 values=array("i", [MISSING]) * (window // step))
+                created.append(row)
+                values = row.values
+            else:
+                values = array("i")
+                values.frombytes(bytes(row.values))
+                updated.append(row)
+
+            old = values[slot]
+            values[slot] = value if old == MISSING else _combine(key[1], old, value)
+            row.values = values.tobytes()
+
+        LoadSeries.objects.bulk_create(created, batch_size=500)
+        LoadSeries.objects.bulk_update(updated, ["values"], batch_size=500)
+
+
+def prune(now: Optional[datetime] = None) -> int:
+    """
+    Delete windows which ended longer than their resolution's retention ago
+    """
+    now = now or datetime.now(tz.utc)
+    deleted = 0
+    for resolution, (step, window) in _steps().items():
+        ended_before = now - timedelta(seconds=settings.LOAD_RETENTION[resolution] + window)
+        deleted += LoadSeries.objects.filter(resolution=resolution, start__lt=ended_before).delete()[0]
+    return deleted
+
+
+def pick_resolution(start: datetime, end: datetime) -> str:
+    """
+    Coarsest resolution still giving some detail for the range
+    """
+    seconds = (end - start).total_seconds()
+    if seconds <= 6 * 3600:
+        return LoadSeries.RAW
+    if seconds <= 8 * 86400:
+        return LoadSeries.MINUTE
+    return LoadSeries.HOUR
+
+
+def query(meeting_id: str, name: str, start: datetime, end: datetime, resolution: Optional[str] = None):
+    """
+    Get `(unix time, value)` pairs of a series between `start` and `end`, skipping steps without sample
+    """
+    resolution = resolution or pick_resolution(start, end)
+    step, window = _steps()[resolution]
+    rows = LoadSeries.objects.filter(
+        meeting_id=meeting_id, name=name, resolution=resolution,
+        start__gt=start - timedelta(seconds=window), start__lt=end,
+    ).order_by("start").values_list("start", "values")
+
+    first, last = start.timestamp(), end.timestamp()
+    points = []
+    for window_start, raw in rows:
+        values = array("i")
+        values.frombytes(bytes(raw))
+        offset = window_start.timestamp()
+        for i, value in enumerate(values):
+            timestamp = offset + i * step
+            if value != MISSING and first <= timestamp < last:
+                points.append((int(timestamp), value))
+    return resolution, step, points
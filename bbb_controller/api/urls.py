@@ -8,5 +8,16 @@ urlpatterns = [
     path("v1/startStream", StartStream.as_view()),
     path("v1/joinStream", JoinStream.as_view()),
     path("v1/endStream", EndStream.as_view()),
-    path("internal/bbbObserver", BBBObserver.as_view())
+    path("v1/bookCapacity", BookCapacity.as_view()),
+    path("v1/cancelBooking", CancelBooking.as_view()),
+    path("v1/channelStatus", ChannelStatus.as_view()),
+    path("v1/listChannels", ListChannels.as_view()),
+    path("v1/operationStatus", OperationStatus.as_view()),
+    path("v1/operationEvents", OperationEvents.as_view()),
+    path("internal/bbbObserver", BBBObserver.as_view()),
+    path("internal/registerChildren", RegisterChildren.as_view()),
+    path("internal/setChildState", SetChildState.as_view()),
+    path("internal/poolUtilization", PoolUtilization.as_view()),
+    path("internal/flightRecorder", FlightRecorder.as_view()),
+    path("internal/loadHistory", LoadHistory.as_view()),
 ]
@@ -1,27 +1,98 @@
+import hashlib
 import json
+import logging
 import os
 import time
-
-from django.db.models import Count, F
-from django.http import JsonResponse, HttpResponseRedirect
+from contextlib import nullcontext
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db import OperationalError, transaction
+from django.db.models import Count, F, Max, Sum
+from django.core.exceptions import ValidationError
+from django.http import JsonResponse, HttpResponseRedirect, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
 from django.utils.http import urlencode
 from rc_protocol import get_checksum
 
 from bbb_common_api.views import PostApiPoint, GetApiPoint
-from children.models import BBB, BBBChat, BBBLive, StreamFrontend, StreamEdge, StreamChat
-from api.models import Channel, Channel2Frontend
-
-
-def _forward_response(name: str, response: dict, status=500):
-    msg = f"Couldn't start '{name}': {response['message']}"
-    return JsonResponse(
-        {"success": False, "message": msg},
-        status=status,
-        reason=msg
-    )
-
-
-class OpenChannel(PostApiPoint):
+from children import deadline, recorder
+from children.models import BBB, BBBChat, BBBLive, StreamFrontend, StreamEdge, StreamChat, ChildCall, ChildState, \
+    CHILD_TYPES
+from api import booking, streams, timeseries, waitlist
+from api.admission import join_admission, retry_after_header, Rejected
+from api.cluster import forward_to_owner, shard_of
+from api.hashring import get_ring
+from api.models import Channel, Channel2Frontend, LoadSeries, Operation
+from api.operations import Progress, expire_stale, start_operation
+
+logger = logging.getLogger("api.views")
+
+
+def _flag(value) -> bool:
+    """
+    Parse a boolean parameter sent as json boolean or as string like "true" or "0"
+    """
+    if isinstance(value, str):
+        if value.lower() in ("true", "1", "yes"):
+            return True
+        if value.lower() in ("false", "0", "no", ""):
+            return False
+        raise ValueError(f"Not a boolean: '{value}'")
+    return bool(value)
+
+
+def _budget(request):
+    """
+    Seconds a request may take: REQUEST_BUDGET, shortened by the client's 'X-Request-Timeout' header
+    """
+    try:
+        timeout = float(request.headers["X-Request-Timeout"])
+    except (KeyError, ValueError):
+        return settings.REQUEST_BUDGET
+    if settings.REQUEST_BUDGET is None:
+        return timeout
+    return min(timeout, settings.REQUEST_BUDGET)
+
+
+class _Budgeted:
+    """
+    Run the whole request within its budget, see `children.deadline`
+    """
+
+    def dispatch(self, request, *args, **kwargs):
+        with deadline.deadline(_budget(request)):
+            return super().dispatch(request, *args, **kwargs)
+
+
+def _rtmp_uri(edge: StreamEdge, streaming_key: str) -> str:
+    """
+    Generate rtmp uri from streaming key and edge url
+    """
+    rtmp_uri = os.path.join(edge.url, "stream", streaming_key)
+    _replace = "http"
+    if rtmp_uri.startswith("https"):
+        _replace = "https"
+    return rtmp_uri.replace(_replace, "rtmp")
+
+
+def _close_opened(channel: Channel, frontends):
+    """
+    Undo an openChannel which ran out of budget halfway
+    """
+    with deadline.grace(settings.COMPENSATION_BUDGET):
+        for frontend in frontends:
+            frontend.close_channel(channel.meeting_id)
+        if channel.prewarmed_live:
+            channel.prewarmed_live.stop_stream(channel.meeting_id)
+        for edge in (channel.stream_edge, channel.standby_edge):
+            if edge is not None:
+                edge.close_channel(channel.meeting_id)
+    channel.delete()
+
+
+class OpenChannel(_Budgeted, PostApiPoint):
 
     endpoint = "openChannel"
     required_parameters = ["meeting_id"]
@@ -29,6 +100,10 @@ class OpenChannel(PostApiPoint):
     def safe_post(self, request, parameters, *args, **kwargs):
         meeting_id = parameters["meeting_id"]
 
+        forwarded = forward_to_owner(request, meeting_id)
+        if forwarded is not None:
+            return forwarded
+
         if Channel.objects.filter(meeting_id=meeting_id).count() > 0:
             return JsonResponse(
                 {"success": False, "message": "The channel has already been opened."},
@@ -36,42 +111,91 @@ class OpenChannel(PostApiPoint):
                 reason="The channel has already been opened."
             )
 
-        # Get frontend with least running streams
-        # frontend = StreamFrontend.objects.annotate(channels=Count("channel")).earliest("channels")
-        frontend = StreamEdge.objects.first()
+        # Get edge with least open channels
+        edges = StreamEdge.objects.filter(state=ChildState.ACTIVE) \
+            .annotate(channels=Count("channel", distinct=True) + Count("standby_channel", distinct=True))
+        if settings.EDGE_CAPACITY is not None:
+            edges = edges.filter(channels__lt=settings.EDGE_CAPACITY)
+            free = sum(settings.EDGE_CAPACITY - edge.channels for edge in edges)
+            if meeting_id not in booking.booked_now() and free <= booking.reserved_edges(exclude=meeting_id):
+                return JsonResponse(
+                    {"success": False, "message": "All stream-edges are booked."},
+                    status=503,
+                    reason="All stream-edges are booked."
+                )
+        edges = list(edges.order_by("channels", "id")[:2 if settings.EDGE_REDUNDANCY else 1])
+        edge = edges[0] if edges else None
+        if edge is None:
+            return JsonResponse(
+                {"success": False, "message": "There is no stream-edge available."},
+                status=503,
+                reason="There is no stream-edge available."
+            )
 
-        # Open frontend's channel
-        response = frontend.open_channel(parameters["meeting_id"])
+        # Open edge's channel
+        response = edge.open_channel(parameters["meeting_id"])
         if not response["success"]:
-            return _forward_response("stream-edge", response)
+            return streams.forward_response("stream-edge", response)
 
-        # Generate rtmp uri from streaming key and frontend url
-        _key = response["content"]["streaming_key"]
-        rtmp_uri = os.path.join(frontend.url, "stream", _key)
-        _replace = "http"
-        if rtmp_uri.startswith("https"):
-            _replace = "https"
-        rtmp_uri = rtmp_uri.replace(_replace, "rtmp")
+        rtmp_uri = _rtmp_uri(edge, response["content"]["streaming_key"])
+
+        # Open the channel on a second edge, bbb-live only has to switch over if the first one fails
+        standby_edge, standby_rtmp_uri = None, ""
+        if len(edges) > 1:
+            response = edges[1].open_channel(meeting_id)
+            if response["success"]:
+                standby_edge = edges[1]
+                standby_rtmp_uri = _rtmp_uri(standby_edge, response["content"]["streaming_key"])
+            else:
+                logger.warning(
+                    f"Couldn't open the standby channel on '{edges[1]}': {response['message']}",
+                    extra={"meeting_id": meeting_id, "child": edges[1].url, "endpoint": "openChannel"},
+                )
 
         # Register channel in db
         channel = Channel.objects.create(
             meeting_id=meeting_id,
+            shard=shard_of(meeting_id),
             rtmp_uri=rtmp_uri,
+            stream_edge=edge,
+            standby_edge=standby_edge,
+            standby_rtmp_uri=standby_rtmp_uri,
             internal_meeting_id="",
             bbb_chat=None,
             bbb_live=None,
         )
 
+        # Reserve a streamer and let it prepare, so startStream only has to start it
+        if settings.PREWARM_STREAMERS:
+            bbb_live = streams.free_streamer(meeting_id)
+            if bbb_live is not None and bbb_live.prepare_stream(meeting_id)["success"]:
+                channel.prewarmed_live = bbb_live
+                channel.prewarmed_at = timezone.now()
+                channel.save()
+
         # Signal all frontends to open the channel
+        # With a standby they get both edges, so switching over doesn't need to involve them again
+        if standby_edge is not None:
+            parameters = dict(parameters, stream_edges=[edge.url, standby_edge.url])
         # TODO: what behaviour is desired, when a frontend breaks?
         errors = []
-        for frontend in StreamFrontend.objects.all():
+        frontends = list(StreamFrontend.objects.filter(state=ChildState.ACTIVE))
+        for frontend in frontends:
             response = frontend.open_channel(**parameters)
             if response["success"]:
                 channel.frontends.add(frontend)
             else:
                 errors.append((frontend.url, response["message"]))
 
+        if deadline.exceeded():
+            # Frontends missed out because the budget is spent, don't leave a half opened channel behind
+            _close_opened(channel, frontends)
+            return JsonResponse(
+                {"success": False, "message": "The deadline was exceeded, the channel was closed again."},
+                status=504,
+                reason="The deadline was exceeded."
+            )
+
         if errors:
             if len(errors) == 1:
                 error_msg = f"Couldn't open '{errors[0][0]}': {errors[0][1]}"
@@ -89,7 +213,7 @@ class OpenChannel(PostApiPoint):
             )
 
 
-class StartStream(PostApiPoint):
+class StartStream(_Budgeted, PostApiPoint):
 
     endpoint = "startStream"
     required_parameters = ["meeting_id"]
@@ -97,85 +221,108 @@ class StartStream(PostApiPoint):
     def safe_post(self, request, parameters, *args, **kwargs):
         meeting_id = parameters["meeting_id"]
 
-        if Channel.objects.filter(meeting_id=meeting_id).count() == 0:
+        forwarded = forward_to_owner(request, meeting_id)
+        if forwarded is not None:
+            return forwarded
+
+        tenant = str(parameters.get("tenant", ""))
+        try:
+            priority = waitlist.priority_of(tenant, int(parameters["priority"]) if "priority" in parameters else None)
+        except (TypeError, ValueError):
             return JsonResponse(
-                {"success": False, "message": "There is no channel for this meeting"},
-                status=404,
-                reason="There is no channel for this meeting"
+                {"success": False, "message": "Parameter priority has to be an integer."},
+                status=400,
+                reason="Parameter priority has to be an integer."
             )
-        channel = Channel.objects.filter(meeting_id=meeting_id).last()
-
-        if channel.bbb_live is not None:
+        try:
+            run_async = _flag(parameters.get("async", False))
+        except ValueError:
             return JsonResponse(
-                {"success": False, "message": "The stream has already been started."},
-                status=304,
-                reason="The stream has already been started."
+                {"success": False, "message": "Parameter async has to be a boolean."},
+                status=400,
+                reason="Parameter async has to be a boolean."
             )
 
-        # Search in bbb instances for meeting id
-        for bbb in BBB.objects.all():
-            if bbb.api.is_meeting_running(meeting_id).is_meeting_running():
-                break
-        else:
-            return JsonResponse(
-                {"success": False, "message": "No matching running meeting found."},
-                status=404,
-                reason="No matching running meeting found."
+        if run_async:
+            return start_operation(
+                self.endpoint, meeting_id,
+                lambda progress: streams.start_within_budget(meeting_id, progress, tenant, priority)
             )
+        return streams.start(meeting_id, Progress(), tenant, priority)
+
+
+def _bookings_busy():
+    response = JsonResponse(
+        {"success": False, "message": "The bookings are busy, try again."},
+        status=503,
+        reason="The bookings are busy, try again."
+    )
+    response["Retry-After"] = "1"
+    return response
 
-        # Get bbb-chat for bbb instance
-        bbb_chat = BBBChat.objects.get(bbb=bbb)
 
-        # Get bbb-live without running a stream
-        bbb_live = BBBLive.objects.filter(channel=None).first()
-        if bbb_live is None:
+class BookCapacity(PostApiPoint):
+
+    endpoint = "bookCapacity"
+    required_parameters = ["meeting_id", "start", "end"]
+
+    def safe_post(self, request, parameters, *args, **kwargs):
+        try:
+            start = datetime.fromtimestamp(float(parameters["start"]), timezone.utc)
+            end = datetime.fromtimestamp(float(parameters["end"]), timezone.utc)
+        except (TypeError, ValueError, OverflowError, OSError):
             return JsonResponse(
-                {"success": False, "message": "All streamers are already busy."},
-                status=503,
-                reason="All streamers are already busy."
+                {"success": False, "message": "Parameters start and end have to be unix timestamps."},
+                status=400,
+                reason="Parameters start and end have to be unix timestamps."
+            )
+        if end <= start or end <= timezone.now() or end - start > timedelta(seconds=settings.BOOKING_MAX_DURATION):
+            return JsonResponse(
+                {"success": False, "message": "The booking has to end in the future, after it starts "
+                                              "and mustn't be longer than BOOKING_MAX_DURATION."},
+                status=400,
+                reason="Invalid time window"
             )
 
-        # Update channel with bbb and streamer
-        channel.internal_meeting_id = str(bbb.api.get_meeting_info(meeting_id)["xml"]["internalMeetingID"])
-        channel.bbb_chat = bbb_chat
-        channel.bbb_live = bbb_live
-        channel.save()
-
-        # Start bbb-chat
-        response = channel.bbb_chat.start_chat(
-            meeting_id,
-            "Stream",
-            StreamChat.objects.first().api_url,
-            StreamChat.objects.first().secret
+        try:
+            reserved = booking.book(parameters["meeting_id"], start, end)
+        except OperationalError:
+            # Another process held the booking lock for too long
+            return _bookings_busy()
+        if reserved is None:
+            return JsonResponse(
+                {"success": False, "message": "The time window is fully booked."},
+                status=409,
+                reason="The time window is fully booked."
+            )
+        return JsonResponse(
+            {"success": True, "message": "Capacity booked.", "content": reserved.as_dict()}
         )
-        if not response["success"]:
-            return _forward_response("bbb-chat", response)
 
-        # Start stream's chat
-        response = StreamChat.objects.first().start_chat(
-            meeting_id,
-            bbb_chat.url,
-            bbb_chat.secret
-        )
-        if not response["success"]:
-            bbb_chat.end_chat(meeting_id)
-            return _forward_response("stream-chat", response)
-
-        # Start bbb-live
-        time.sleep(0.5)  # TODO remove it if it doesn't fix bbb-chat's chat_user issue
-        response = channel.bbb_live.start_stream(
-            channel.rtmp_uri,
-            meeting_id,
-            channel.meeting_password
-        )
-        if not response["success"]:
-            StreamChat.objects.first().end_chat(meeting_id)
-            bbb_chat.end_chat(meeting_id)
-            return _forward_response("bbb-live", response)
 
-        # Report success
+class CancelBooking(PostApiPoint):
+
+    endpoint = "cancelBooking"
+    required_parameters = ["booking_id"]
+
+    def safe_post(self, request, parameters, *args, **kwargs):
+        try:
+            booking_id = int(parameters["booking_id"])
+        except (TypeError, ValueError):
+            booking_id = None
+        try:
+            cancelled = booking_id is not None and booking.cancel(booking_id)
+        except OperationalError:
+            return _bookings_busy()
+        if not cancelled:
+            return JsonResponse(
+                {"success": False, "message": "Unknown booking"},
+                status=404,
+                reason="Unknown booking"
+            )
+        streams.admit()
         return JsonResponse(
-            {"success": True, "message": "Stream started successfully."}
+            {"success": True, "message": "Booking cancelled."}
         )
 
 
@@ -188,6 +335,18 @@ class JoinStream(GetApiPoint):
         meeting_id = request.GET["meeting_id"]
         user_name = request.GET["user_name"]
 
+        if join_admission is not None:
+            try:
+                join_admission.admit(meeting_id)
+            except Rejected as rejected:
+                response = JsonResponse(
+                    {"success": False, "message": "Too many users are joining right now."},
+                    status=503,
+                    reason="Too many users are joining right now."
+                )
+                response["Retry-After"] = retry_after_header(rejected)
+                return response
+
         try:
             channel = Channel.objects.get(meeting_id=meeting_id)
         except Channel.DoesNotExist:
@@ -197,11 +356,24 @@ class JoinStream(GetApiPoint):
                 reason="No channel was opened for this meeting"
             )
 
-        # Get frontend with least user and increase counter
-        c2f = Channel2Frontend.objects.filter(channel=channel).order_by("viewers").first()
-        c2f.viewers = F("viewers") + 1
-        c2f.save()
-        frontend = c2f.frontend
+        if settings.JOIN_POLICY == "consistent_hash":
+            # Get the user's frontend on the ring, skipping overloaded ones
+            c2fs = list(Channel2Frontend.objects.filter(channel=channel).select_related("frontend"))
+            c2fs = [c2f for c2f in c2fs if c2f.frontend.state == ChildState.ACTIVE] or c2fs
+            loads = {c2f.frontend_id: c2f.viewers for c2f in c2fs}
+            frontend_id = get_ring(frozenset(loads)).lookup(
+                request.GET.get("user_id", user_name),
+                loads,
+                settings.JOIN_HASH_LOAD_FACTOR
+            )
+            frontend = next(c2f.frontend for c2f in c2fs if c2f.frontend_id == frontend_id)
+        else:
+            # Get active frontend with least user and increase counter
+            c2fs = Channel2Frontend.objects.filter(channel=channel).order_by("viewers")
+            c2f = c2fs.filter(frontend__state=ChildState.ACTIVE).first() or c2fs.first()
+            c2f.viewers = F("viewers") + 1
+            c2f.save()
+            frontend = c2f.frontend
 
         get = {
             "meeting_id": meeting_id,
@@ -213,7 +385,7 @@ class JoinStream(GetApiPoint):
         )
 
 
-class EndStream(PostApiPoint):
+class EndStream(_Budgeted, PostApiPoint):
 
     endpoint = "endStream"
     required_parameters = ["meeting_id"]
@@ -222,6 +394,10 @@ class EndStream(PostApiPoint):
     def safe_post(request, parameters, *args, **kwargs):
         meeting_id = parameters["meeting_id"]
 
+        forwarded = forward_to_owner(request, meeting_id)
+        if forwarded is not None:
+            return forwarded
+
         try:
             channel = Channel.objects.get(meeting_id=meeting_id)
         except Channel.DoesNotExist:
@@ -231,31 +407,56 @@ class EndStream(PostApiPoint):
                 reason="No channel was opened for this meeting"
             )
 
+        # The teardown may take COMPENSATION_BUDGET beyond the request's budget,
+        # a channel deleted while still open on some children couldn't be closed anymore
         errors = []
-        if channel.bbb_chat:
-            response = channel.bbb_chat.end_chat(channel.meeting_id)
-            if not response["success"]:
-                errors.append(("bbb-chat", response))
-
-        if channel.bbb_live:
-            response = channel.bbb_live.stop_stream(channel.meeting_id)
-            if not response["success"]:
-                errors.append(("bbb-live", response))
-
-        response = StreamChat.objects.first().end_chat(channel.meeting_id)
-        if not response["success"]:
-            errors.append(("stream-chat", response))
-
-        response = StreamEdge.objects.first().close_channel(channel.meeting_id)
-        if not response["success"]:
-            errors.append(("stream-edge", response))
-
-        for frontend in channel.frontends.all():
-            response = frontend.close_channel(channel.meeting_id)
-            if not response["success"]:
-                errors.append(("stream-frontend", response))
+        budget = deadline.remaining()
+        with deadline.grace(budget + settings.COMPENSATION_BUDGET) if budget is not None else nullcontext():
+            if channel.bbb_chat:
+                response = channel.bbb_chat.end_chat(channel.meeting_id)
+                if not response["success"]:
+                    errors.append(("bbb-chat", response))
+
+            if channel.bbb_live:
+                response = channel.bbb_live.stop_stream(channel.meeting_id)
+                if not response["success"]:
+                    errors.append(("bbb-live", response))
+
+            if channel.prewarmed_live:
+                response = channel.prewarmed_live.stop_stream(channel.meeting_id)
+                if not response["success"]:
+                    errors.append(("bbb-live", response))
+
+            if channel.stream_chat:
+                response = channel.stream_chat.end_chat(channel.meeting_id)
+                if not response["success"]:
+                    errors.append(("stream-chat", response))
+
+            if channel.stream_edge:
+                response = channel.stream_edge.close_channel(channel.meeting_id)
+                if not response["success"]:
+                    errors.append(("stream-edge", response))
+
+            if channel.standby_edge:
+                response = channel.standby_edge.close_channel(channel.meeting_id)
+                if not response["success"]:
+                    errors.append(("stream-edge", response))
+
+            for frontend in channel.frontends.all():
+                response = frontend.close_channel(channel.meeting_id)
+                if not response["success"]:
+                    errors.append(("stream-frontend", response))
+
+            if deadline.exceeded():
+                # Keep the channel, so the skipped steps are done on a retry
+                return JsonResponse(
+                    {"success": False, "message": "The deadline was exceeded, retry to stop the rest."},
+                    status=504,
+                    reason="The deadline was exceeded."
+                )
 
         channel.delete()
+        streams.admit()
 
         if errors:
             for i, error in enumerate(errors):
@@ -278,7 +479,7 @@ class EndStream(PostApiPoint):
             )
 
 
-class BBBObserver(PostApiPoint):
+class BBBObserver(_Budgeted, PostApiPoint):
 
     endpoint = "bbbObserver"
     required_parameters = ["event"]
@@ -312,6 +513,10 @@ class BBBObserver(PostApiPoint):
                     reason="This meeting had no stream."
                 )
 
+            forwarded = forward_to_owner(request, channel.meeting_id)
+            if forwarded is not None:
+                return forwarded
+
             # Deligate logic to EndStream
             return EndStream.safe_post(request, {"meeting_id": channel.meeting_id})
         else:
@@ -321,3 +526,391 @@ class BBBObserver(PostApiPoint):
                 reason="Uninteresting event"
             )
 
+
+def _child_lookup(model):
+    # bbb-chats are addressed by their bbb's url
+    return "bbb__url" if model is BBBChat else "url"
+
+
+# Reverse relations of a child type pointing at the work assigned to it
+_ASSIGNMENTS = {
+    BBB: ["bbbchat__channel"],
+    BBBChat: ["channel"],
+    BBBLive: ["channel", "prewarmed_channel"],
+    StreamEdge: ["channel", "standby_channel"],
+    StreamFrontend: ["channel2frontend"],
+    StreamChat: ["channel"],
+}
+
+
+class RegisterChildren(PostApiPoint):
+
+    endpoint = "registerChildren"
+    required_parameters = ["children"]
+
+    def safe_post(self, request, parameters, *args, **kwargs):
+        """
+        'children': json encoded list of
+        {
+            'type': 'bbb-live',
+            'url': 'https://live.example.com',  # for 'bbb-chat' use 'bbb' and the bbb's url
+            'secret': '...',  # optional for known children
+            'state': 'active'  # optional, known children keep theirs
+        }
+        """
+        try:
+            children = json.loads(parameters["children"])
+            for child in children:
+                if child["type"] not in CHILD_TYPES:
+                    raise ValueError(f"Unknown type '{child['type']}'")
+                if child.get("state", ChildState.ACTIVE) not in ChildState.values:
+                    raise ValueError(f"Unknown state '{child['state']}'")
+                if child["type"] == "bbb-chat":
+                    BBB.objects.get(url=child["bbb"])
+                else:
+                    child["url"]
+        except (ValueError, TypeError, KeyError, BBB.DoesNotExist) as err:
+            return JsonResponse(
+                {"success": False, "message": f"Invalid children: {err!r}"},
+                status=400,
+                reason="Invalid children"
+            )
+
+        created = 0
+        with transaction.atomic():
+            for child in children:
+                model = CHILD_TYPES[child["type"]]
+                # Only change what was sent, e.g. keep the secret and a state set by the watchdog
+                defaults = {key: child[key] for key in ("secret", "state") if key in child}
+                if model is BBBChat:
+                    _, new = BBBChat.objects.update_or_create(bbb=BBB.objects.get(url=child["bbb"]), defaults=defaults)
+                else:
+                    _, new = model.objects.update_or_create(url=child["url"], defaults=defaults)
+                created += new
+        streams.admit()
+
+        return JsonResponse(
+            {"success": True, "message": f"Registered {created} new and updated {len(children) - created} children."}
+        )
+
+
+class SetChildState(PostApiPoint):
+
+    endpoint = "setChildState"
+    required_parameters = ["type", "urls", "state"]
+
+    def safe_post(self, request, parameters, *args, **kwargs):
+        model = CHILD_TYPES.get(parameters["type"])
+        if model is None:
+            return JsonResponse(
+                {"success": False, "message": "Unknown child type."},
+                status=400,
+                reason="Unknown child type."
+            )
+        if parameters["state"] not in ChildState.values:
+            return JsonResponse(
+                {"success": False, "message": "Unknown state."},
+                status=400,
+                reason="Unknown state."
+            )
+
+        try:
+            urls = json.loads(parameters["urls"])
+            if not isinstance(urls, list) or not all(isinstance(url, str) for url in urls):
+                raise ValueError
+        except (TypeError, ValueError):
+            return JsonResponse(
+                {"success": False, "message": "Parameter urls isn't a json encoded list."},
+                status=400,
+                reason="Parameter urls isn't a json encoded list."
+            )
+
+        updated = model.objects.filter(**{f"{_child_lookup(model)}__in": urls}).update(state=parameters["state"])
+        streams.admit()
+        return JsonResponse(
+            {"success": True, "message": f"Set {updated} children to '{parameters['state']}'."}
+        )
+
+
+class PoolUtilization(GetApiPoint):
+
+    endpoint = "poolUtilization"
+
+    def safe_get(self, request, *args, **kwargs):
+        content = {}
+        for name, model in CHILD_TYPES.items():
+            children = model.objects.annotate(**{
+                f"assigned_{i}": Count(lookup, distinct=True) for i, lookup in enumerate(_ASSIGNMENTS[model])
+            })
+
+            pool = {state: 0 for state in ChildState.values}
+            pool.update({"assigned": 0, "idle": 0, "children": []})
+            for child in children:
+                assigned = sum(getattr(child, f"assigned_{i}") for i in range(len(_ASSIGNMENTS[model])))
+                pool[child.state] += 1
+                pool["assigned"] += assigned > 0
+                pool["idle"] += assigned == 0 and child.state == ChildState.ACTIVE
+                pool["children"].append({"url": str(child), "state": child.state, "assigned": assigned})
+
+            active = pool[ChildState.ACTIVE]
+            pool["utilization"] = (active - pool["idle"]) / active if active else 1.0
+            content[name] = pool
+
+        return JsonResponse(
+            {"success": True, "message": "", "content": content}
+        )
+
+
+class FlightRecorder(GetApiPoint):
+
+    endpoint = "flightRecorder"
+    required_parameters = ["meeting_id"]
+
+    def safe_get(self, request, *args, **kwargs):
+        """
+        Every child request made for a meeting, oldest first
+
+        Calls of the last seconds made by other controllers show up once they saved their buffer.
+        """
+        meeting_id = request.GET["meeting_id"]
+        calls = [call.as_dict() for call in ChildCall.objects.filter(meeting_id=meeting_id).order_by("id")]
+        calls += recorder.pending(meeting_id)
+        return JsonResponse(
+            {"success": True, "message": "", "content": {
+                "calls": calls[-settings.FLIGHT_RECORDER_PER_MEETING:],
+                "dropped": recorder.dropped(),
+            }}
+        )
+
+
+class LoadHistory(GetApiPoint):
+
+    endpoint = "loadHistory"
+    required_parameters = ["name"]
+
+    def safe_get(self, request, *args, **kwargs):
+        """
+        A load time-series between 'start' and 'end', by default the last day
+        """
+        now = timezone.now()
+        try:
+            end = datetime.fromtimestamp(float(request.GET["end"]), timezone.utc) \
+                if "end" in request.GET else now
+            start = datetime.fromtimestamp(float(request.GET["start"]), timezone.utc) \
+                if "start" in request.GET else end - timedelta(days=1)
+        except (ValueError, OverflowError, OSError):
+            return JsonResponse(
+                {"success": False, "message": "Parameters start and end have to be unix timestamps."},
+                status=400,
+                reason="Parameters start and end have to be unix timestamps."
+            )
+
+        resolution = request.GET.get("resolution") or None
+        if resolution is not None and resolution not in dict(LoadSeries.RESOLUTIONS):
+            return JsonResponse(
+                {"success": False, "message": "Parameter resolution has to be raw, minute or hour."},
+                status=400,
+                reason="Parameter resolution has to be raw, minute or hour."
+            )
+
+        resolution, step, points = timeseries.query(
+            request.GET.get("meeting_id", ""), request.GET["name"], start, end, resolution
+        )
+        return JsonResponse(
+            {"success": True, "message": "", "content": {
+                "resolution": resolution,
+                "step": step,
+                "points": points,
+            }}
+        )
+
+
+def _etag(*parts):
+    return '"' + hashlib.sha1(":".join(str(part) for part in parts).encode("utf-8")).hexdigest() + '"'
+
+
+def _frontends_version(c2fs) -> tuple:
+    """
+    Changes whenever a frontend is added to or removed from the channels or any of their viewer counts changes
+    """
+    version = c2fs.aggregate(
+        count=Count("id"), last=Max("id"), viewers=Sum("viewers"), weighted=Sum(F("viewers") * F("id")),
+    )
+    return version["count"], version["last"], version["viewers"], version["weighted"]
+
+
+def _conditional(request, etag, build):
+    """
+    Answer with 304 if the client's etag matches, else with the json built by `build`
+    """
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = JsonResponse(build())
+    response["ETag"] = etag
+    return response
+
+
+def _channel_status(channel: Channel):
+    c2fs = list(channel.channel2frontend_set.all())
+    if channel.bbb_live_id:
+        state = "streaming"
+    elif channel.prewarmed_live_id:
+        state = "prewarmed"
+    else:
+        state = "open"
+
+    return {
+        "meeting_id": channel.meeting_id,
+        "state": state,
+        "version": channel.version,
+        "stream_edge": str(channel.stream_edge) if channel.stream_edge else None,
+        "standby_edge": str(channel.standby_edge) if channel.standby_edge else None,
+        "bbb": str(channel.bbb_chat.bbb) if channel.bbb_chat else None,
+        "bbb_live": str(channel.bbb_live) if channel.bbb_live else None,
+        "stream_chat": str(channel.stream_chat) if channel.stream_chat else None,
+        "frontends": [{"url": str(c2f.frontend), "viewers": c2f.viewers} for c2f in c2fs],
+        "viewers": sum(c2f.viewers for c2f in c2fs),
+    }
+
+
+def _channels_with_children():
+    return Channel.objects.select_related(
+        "stream_edge", "standby_edge", "bbb_chat__bbb", "bbb_live", "stream_chat"
+    ).prefetch_related("channel2frontend_set__frontend")
+
+
+class ChannelStatus(GetApiPoint):
+
+    endpoint = "channelStatus"
+    required_parameters = ["meeting_id"]
+
+    def safe_get(self, request, *args, **kwargs):
+        meeting_id = request.GET["meeting_id"]
+
+        version = Channel.objects.filter(meeting_id=meeting_id).values_list("id", "version").first()
+        if version is None:
+            return JsonResponse(
+                {"success": False, "message": "No channel was opened for this meeting"},
+                status=404,
+                reason="No channel was opened for this meeting"
+            )
+
+        etag = _etag(*version, *_frontends_version(Channel2Frontend.objects.filter(channel_id=version[0])))
+        return _conditional(request, etag, lambda: {
+            "success": True,
+            "message": "",
+            "content": _channel_status(_channels_with_children().get(id=version[0])),
+        })
+
+
+class ListChannels(GetApiPoint):
+
+    endpoint = "listChannels"
+
+    def safe_get(self, request, *args, **kwargs):
+        try:
+            page = max(1, int(request.GET.get("page", 1)))
+            page_size = min(500, max(1, int(request.GET.get("page_size", 50))))
+        except ValueError:
+            return JsonResponse(
+                {"success": False, "message": "Parameters page and page_size have to be integers."},
+                status=400,
+                reason="Parameters page and page_size have to be integers."
+            )
+
+        # Any opened, changed or closed channel and any viewer change alters one of these
+        version = Channel.objects.aggregate(
+            count=Count("id"), last=Max("id"), versions=Sum("version"),
+        )
+        etag = _etag(
+            page, page_size, version["count"], version["last"], version["versions"],
+            *_frontends_version(Channel2Frontend.objects.all()),
+        )
+
+        def build():
+            offset = (page - 1) * page_size
+            channels = _channels_with_children().order_by("id")[offset:offset + page_size]
+            return {
+                "success": True,
+                "message": "",
+                "content": {
+                    "page": page,
+                    "page_size": page_size,
+                    "total": version["count"],
+                    "channels": [_channel_status(channel) for channel in channels],
+                },
+            }
+
+        return _conditional(request, etag, build)
+
+
+class OperationStatus(GetApiPoint):
+
+    endpoint = "operationStatus"
+    required_parameters = ["operation_id"]
+
+    def safe_get(self, request, *args, **kwargs):
+        """
+        Long-poll: with 'wait' the response is held up to that many seconds until the operation changed
+        """
+        try:
+            expire_stale(Operation.objects.filter(id=request.GET["operation_id"]))
+            operation = Operation.objects.get(id=request.GET["operation_id"])
+            wait = min(float(request.GET.get("wait", 0)), settings.OPERATION_MAX_WAIT)
+        except (Operation.DoesNotExist, ValidationError, ValueError):
+            return JsonResponse(
+                {"success": False, "message": "Unknown operation"},
+                status=404,
+                reason="Unknown operation"
+            )
+
+        until = time.monotonic() + wait
+        updated = operation.updated
+        while not operation.finished and operation.updated == updated and time.monotonic() < until:
+            time.sleep(settings.OPERATION_POLL_INTERVAL)
+            operation.refresh_from_db()
+
+        return JsonResponse(
+            {"success": True, "message": "", "content": {
+                **operation.as_dict(), **waitlist.waitlist_content(operation)
+            }}
+        )
+
+
+class OperationEvents(GetApiPoint):
+
+    endpoint = "operationEvents"
+    required_parameters = ["operation_id"]
+
+    def safe_get(self, request, *args, **kwargs):
+        """
+        Server-sent events: a 'progress' event on every change and 'finished' at the end
+        """
+        try:
+            expire_stale(Operation.objects.filter(id=request.GET["operation_id"]))
+            operation = Operation.objects.get(id=request.GET["operation_id"])
+        except (Operation.DoesNotExist, ValidationError):
+            return JsonResponse(
+                {"success": False, "message": "Unknown operation"},
+                status=404,
+                reason="Unknown operation"
+            )
+
+        def events():
+            until = time.monotonic() + settings.OPERATION_MAX_WAIT
+            updated = None
+            while True:
+                if operation.updated != updated:
+                    updated = operation.updated
+                    event = "finished" if operation.finished else "progress"
+                    content = {**operation.as_dict(), **waitlist.waitlist_content(operation)}
+                    yield f"event: {event}\ndata: {json.dumps(content)}\n\n"
+                if operation.finished or time.monotonic() >= until:
+                    return
+                time.sleep(settings.OPERATION_POLL_INTERVAL)
+                operation.refresh_from_db()
+
+        response = StreamingHttpResponse(events(), content_type="text/event-stream")
+        response["Cache-Control"] = "no-cache"
+        response["X-Accel-Buffering"] = "no"
+        return response
@@ -0,0 +1,215 @@
+"""
+Waitlist of startStreams while all streamers are busy
+
+Instead of answering 503, a start is queued with up to `WAITLIST_SIZE` others and followed through its
+operation. Whenever streamers are freed `admit` hands them to the waiting starts:
+higher priority first, then the tenant with the fewest running streams, then the oldest.
+Starts waiting longer than `WAITLIST_MAX_WAIT` seconds fail with 503.
+"""
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Count
+from django.http import JsonResponse
+from django.utils import timezone
+
+from api import booking
+from api.cluster import owned_shards, shard_of
+from api.models import Channel, Operation, WaitingStart
+from api.operations import Progress, run_operation
+from api.scheduling import free_streamers
+
+WAIT_STEP = "wait for streamer"
+
+
+def priority_of(tenant: str, priority=None) -> int:
+    if priority is not None:
+        return priority
+    return settings.WAITLIST_TENANT_PRIORITIES.get(tenant, 0)
+
+
+def _queue():
+    """
+    Waiting starts which aren't dispatched yet, in the order they get streamers
+    """
+    running = Counter(dict(
+        Channel.objects.filter(bbb_live__isnull=False).values_list("tenant").annotate(Count("id"))
+    ))
+    waiting = WaitingStart.objects.filter(dispatched=False).select_related("operation")
+    return sorted(waiting, key=lambda entry: (-entry.priority, running[entry.tenant], entry.created, entry.id))
+
+
+def expected_wait(position: int):
+    """
+    Seconds until the start at `position` gets a streamer, None without recent admissions to estimate from
+    """
+    since = timezone.now() - timedelta(seconds=settings.WAITLIST_RATE_WINDOW)
+    admitted = 0
+    for steps in Operation.objects.filter(kind="startStream", updated__gte=since).values_list("steps", flat=True):
+        admitted += any(
+            step["name"] == WAIT_STEP and step["state"] == "done" and step["started"] >= since.isoformat()
+            for step in steps
+        )
+    if not admitted:
+        return None
+    return round(position * settings.WAITLIST_RATE_WINDOW / admitted)
+
+
+def status(meeting_id: str):
+    """
+    Position and expected wait of a meeting's start, None if it isn't waiting
+    """
+    queue = _queue()
+    for position, entry in enumerate(queue, start=1):
+        if entry.meeting_id == meeting_id:
+            return {
+                "operation_id": str(entry.operation_id),
+                "position": position,
+                "waiting": len(queue),
+                "expected_wait": expected_wait(position),
+            }
+    return None
+
+
+def _waiting_response(meeting_id: str):
+    content = status(meeting_id)
+    message = f"All streamers are busy, the start is number {content['position']} on the waitlist."
+    return JsonResponse(
+        {"success": True, "message": message, "content": content},
+        status=202,
+        reason="Accepted"
+    )
+
+
+def _full_response():
+    response = JsonResponse(
+        {"success": False, "message": "All streamers are already busy."},
+        status=503,
+        reason="All streamers are already busy."
+    )
+    if settings.WAITLIST_SIZE:
+        response["Retry-After"] = str(settings.WAITLIST_RETRY_AFTER)
+    return response
+
+
+def waiting(meeting_id: str):
+    """
+    The waiting response, if the meeting's start is waiting and not dispatched
+    """
+    if WaitingStart.objects.filter(meeting_id=meeting_id, dispatched=False).exists():
+        return _waiting_response(meeting_id)
+    return None
+
+
+def _wait(progress: Progress):
+    progress.step(WAIT_STEP)
+    progress.operation.state = Operation.WAITING
+    progress.operation.save()
+
+
+def enqueue(meeting_id: str, tenant: str, priority: int, progress: Progress) -> JsonResponse:
+    """
+    Put a start on the waitlist, answering 202 with its position or 503 if the waitlist is full
+
+    A dispatched start which found no streamer after all keeps its place.
+    """
+    if WaitingStart.objects.filter(meeting_id=meeting_id, dispatched=True).update(dispatched=False):
+        _wait(progress)
+        return _waiting_response(meeting_id)
+
+    if WaitingStart.objects.count() >= settings.WAITLIST_SIZE:
+        return _full_response()
+
+    synchronous = progress.operation is None
+    try:
+        # The operation only waits along with its waiting start, so a concurrent request can't leave it orphaned
+        with transaction.atomic():
+            if synchronous:
+                # Synchronous callers follow the waiting start through its operation
+                progress = Progress(Operation.objects.create(kind="startStream", meeting_id=meeting_id))
+            _wait(progress)
+            WaitingStart.objects.create(
+                meeting_id=meeting_id, tenant=tenant, priority=priority, operation=progress.operation
+            )
+    except IntegrityError:
+        # Queued by a concurrent request
+        if not synchronous:
+            other = WaitingStart.objects.filter(meeting_id=meeting_id).values_list("operation_id", flat=True).first()
+            message = f"The start is already waiting as operation '{other}'."
+            return JsonResponse({"success": False, "message": message}, status=409, reason=message)
+    return _waiting_response(meeting_id)
+
+
+def done(meeting_id: str):
+    WaitingStart.objects.filter(meeting_id=meeting_id).delete()
+
+
+def _expire():
+    now = timezone.now()
+    # Dispatched by a controller which died before it finished the start
+    # Without a REQUEST_BUDGET starts have no upper limit, so they get as long as they could have waited
+    if settings.REQUEST_BUDGET is None:
+        longest_run = settings.WAITLIST_MAX_WAIT
+    else:
+        longest_run = settings.REQUEST_BUDGET + settings.COMPENSATION_BUDGET
+    WaitingStart.objects.filter(
+        dispatched=True, operation__updated__lt=now - timedelta(seconds=longest_run),
+    ).update(dispatched=False)
+
+    expired = WaitingStart.objects.filter(
+        dispatched=False, created__lt=now - timedelta(seconds=settings.WAITLIST_MAX_WAIT)
+    ).select_related("operation")
+    for entry in expired:
+        Progress(entry.operation).finish(JsonResponse(
+            {"success": False, "message": "No streamer became free in time."},
+            status=503,
+        ))
+        entry.delete()
+
+
+def admit(start, wait: bool = False) -> int:
+    """
+    Hand free streamers to the waiting starts, running `start(meeting_id, progress, tenant, priority)` for each
+
+    The starts run in the background, with `wait` this returns once they finished.
+    Streamers held back for booked meetings only go to those.
+    Only starts of meetings in shards this node owns are admitted, the others are left to their owners.
+    """
+    _expire()
+    free = free_streamers().count() - WaitingStart.objects.filter(dispatched=True).count()
+    booked = booking.booked_now()
+    reserved = booking.reserved_streamers()
+    shards = owned_shards()
+    threads = []
+    for entry in _queue():
+        if free <= 0:
+            break
+        if shards is not None and shard_of(entry.meeting_id) not in shards:
+            continue
+        is_booked = entry.meeting_id in booked
+        if not is_booked and free <= reserved:
+            continue
+        if not WaitingStart.objects.filter(id=entry.id, dispatched=False).update(dispatched=True):
+            # Taken by another controller
+            continue
+        threads.append(run_operation(entry.operation, lambda progress, entry=entry: start(
+            entry.meeting_id, progress, entry.tenant, entry.priority
+        )))
+        free -= 1
+        reserved -= is_booked
+    if wait:
+        for thread in threads:
+            thread.join()
+    return len(threads)
+
+
+def waitlist_content(operation: Operation):
+    """
+    Waitlist status to add to a waiting operation's `as_dict()`
+    """
+    if operation.state != Operation.WAITING:
+        return {}
+    content = status(operation.meeting_id)
+    return {"waitlist": content} if content else {}
@@ -0,0 +1,181 @@
+"""
+Logging which never blocks the request threads
+
+`QueueHandler` only puts records on a bounded queue. A background thread formats them as JSON lines
+and writes them to the stream, so a slow journald only slows down that thread.
+Records which don't fit the queue are dropped and counted, the writer reports the count with its next line.
+
+`RepeatFilter` lets through one of identical warnings or errors, e.g. the same child failing on every request,
+per `window` seconds. The next one after the window carries how many were held back in `repeated`.
+
+This module doesn't depend on django, so `gunicorn.conf.py` uses it for the access and error log as well.
+"""
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+# Attributes passed with `extra` which end up in the JSON lines
+FIELDS = ("meeting_id", "child", "endpoint", "latency", "status_code", "repeated")
+
+_lock = threading.Lock()
+_dropped = 0
+
+
+def dropped() -> int:
+    """
+    Records dropped by this process, because the queue was full
+    """
+    return _dropped
+
+
+class JsonFormatter(logging.Formatter):
+
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for field in FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class RepeatFilter(logging.Filter):
+    """
+    Let through one of identical records of level `WARNING` or above per `window` seconds
+
+    Records are identical with the same logger, level, message, child and exception type.
+    """
+
+    def __init__(self, window: float = 60, size: int = 1000):
+        super().__init__()
+        self.window = window
+        self.size = size
+        self._seen = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno < logging.WARNING:
+            return True
+
+        key = (
+            record.name, record.levelno, str(record.msg), getattr(record, "child", None),
+            record.exc_info[0] if record.exc_info else None,
+        )
+        now = time.monotonic()
+        with self._lock:
+            shown, held = self._seen.get(key, (None, 0))
+            if shown is not None and now - shown < self.window:
+                self._seen[key] = (shown, held + 1)
+                return False
+            if len(self._seen) >= self.size:
+                self._seen = {k: v for k, v in self._seen.items() if now - v[0] < self.window}
+                if len(self._seen) >= self.size:
+                    self._seen.clear()
+            self._seen[key] = (now, 0)
+
+        if held:
+            record.repeated = held
+        return True
+
+
+class _Writer(logging.handlers.QueueListener):
+
+    def __init__(self, records: queue.Queue, handler: logging.Handler):
+        super().__init__(records, handler)
+        self._reported = 0
+
+    def handle(self, record):
+        if _dropped != self._reported:
+            super().handle(logging.makeLogRecord({
+                "name": __name__,
+                "levelno": logging.WARNING,
+                "levelname": "WARNING",
+                "msg": f"Dropped {_dropped - self._reported} log records, the queue was full",
+            }))
+            self._reported = _dropped
+        super().handle(record)
+
+    def stop(self, timeout: float = 5):
+        """
+        Write what is queued, but give up after `timeout` seconds instead of blocking the exit
+        """
+        if self._thread is None:
+            return
+        try:
+            self.queue.put(self._sentinel, timeout=timeout)
+        except queue.Full:
+            return
+        self._thread.join(timeout)
+        self._thread = None
+
+
+class QueueHandler(logging.handlers.QueueHandler):
+    """
+    Hand records to a background writer, dropping them while its queue of `queue_size` records is full
+    """
+
+    def __init__(self, queue_size: int = 10000, stream=None):
+        super().__init__(None)
+        self.queue_size = queue_size
+        self.stream = stream or sys.stdout
+        self._writer = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+
+    def _start(self):
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            # Neither the writer thread nor its queue survive gunicorn's fork, each worker starts its own
+            self.queue = queue.Queue(self.queue_size)
+            handler = logging.StreamHandler(self.stream)
+            handler.setFormatter(JsonFormatter())
+            self._writer = _Writer(self.queue, handler)
+            self._writer.start()
+            self._pid = os.getpid()
+
+    def prepare(self, record):
+        # Resolve everything referring to the caller's state now, the writer only serializes
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        global _dropped
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with _lock:
+                _dropped += 1
+
+    def emit(self, record):
+        if self._pid != os.getpid():
+            self._start()
+        super().emit(record)
+
+    def close(self):
+        if self._writer is not None and self._pid == os.getpid():
+            self._writer.stop()
+            self._writer = None
+            self._pid = None
+        super().close()
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/3.1/ref/settings/
 """
 
+import socket
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -48,6 +49,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'api.middleware.ProfilingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     #'django.middleware.csrf.CsrfViewMiddleware',
@@ -135,3 +137,141 @@ SHARED_SECRET_TIME_DELTA = 5
 VERIFY_SSL_CERTS = True
 if not VERIFY_SSL_CERTS:
     urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+
+# Admission control for joinStream
+# The limits apply per gunicorn worker, so divide your deployment's total by the number of workers.
+JOIN_ADMISSION = True
+# Joins per second and burst size over all channels
+JOIN_RATE = 50
+JOIN_BURST = 100
+# Joins per second and burst size for a single channel
+JOIN_CHANNEL_RATE = 25
+JOIN_CHANNEL_BURST = 50
+
+# Join table published by 'manage.py publish_join_table' for 'join_handler.py'
+JOIN_TABLE_PATH = BASE_DIR / "join_table.json"
+# Joins redirected by 'join_handler.py', folded into the viewer counters on publishing
+JOIN_SPOOL_PATH = BASE_DIR / "join_spool.tsv"
+# Tables older than this many seconds are ignored and joins fall back to django
+JOIN_TABLE_MAX_AGE = 30
+
+# How joinStream picks a channel's frontend:
+# "least_viewers" counts every join and picks the frontend with the fewest,
+# "consistent_hash" keeps a user on the same frontend without writing to the database
+# and relies on reconciled viewer counts for its load bound.
+JOIN_POLICY = "least_viewers"
+# A frontend takes at most this factor of the average load under "consistent_hash"
+JOIN_HASH_LOAD_FACTOR = 1.25
+
+# Reserve and prepare a streamer at openChannel, so startStream only has to start the stream
+PREWARM_STREAMERS = False
+# Seconds after which 'manage.py release_prewarmed' releases an unused prewarmed streamer
+PREWARM_TTL = 1800
+
+# Several controller nodes sharing one database
+# Every node needs the same DATABASES (not sqlite), SHARED_SECRET and CLUSTER_SHARDS,
+# but its own CLUSTER_NODE_NAME and CLUSTER_NODE_URL.
+# Don't change CLUSTER_SHARDS while channels are open.
+CLUSTER_ENABLED = False
+CLUSTER_NODE_NAME = socket.gethostname()
+# Url under which the other nodes reach this node
+CLUSTER_NODE_URL = "https://127.0.0.1"
+CLUSTER_SHARDS = 64
+# Seconds a lease stays valid without renewal by 'manage.py cluster_heartbeat'
+CLUSTER_LEASE_TTL = 30
+
+# Seconds work without a channel has to be seen for, before 'manage.py reconcile_orphans' stops it
+ORPHAN_GRACE = 60
+
+# Failed checks in a row after which 'manage.py watch_streamers' moves a stream to another streamer
+# or, for channels with a standby edge, switches the stream to the standby
+WATCHDOG_FAILURES = 2
+# Open every channel on a second edge as well, see watch_streamers
+EDGE_REDUNDANCY = False
+
+# Longest time in seconds operationStatus (with 'wait') and operationEvents hold a request
+# Gunicorn's sync workers serve one request at a time, so a waiting client holds a whole worker.
+# Keep it short, clients poll again or their EventSource reconnects.
+OPERATION_MAX_WAIT = 2
+# Seconds between checking an operation for changes
+OPERATION_POLL_INTERVAL = 0.25
+
+# Seconds openChannel, startStream and endStream may take, None for no limit
+# Clients can shorten it with the 'X-Request-Timeout' header.
+# Together with COMPENSATION_BUDGET it has to stay below the worker 'timeout' in gunicorn.conf.py,
+# otherwise gunicorn kills the worker before the steps are undone.
+REQUEST_BUDGET = 60
+# Seconds granted to undoing already started steps after a failure, even if the budget is spent
+COMPENSATION_BUDGET = 5
+
+# Profile requests with cProfile, see the admin's request profiles
+# Without PROFILING_ENABLED the middleware is removed at startup and costs nothing.
+PROFILING_ENABLED = False
+# Share of requests profiled at random, besides the ones requested with 'manage.py profile_token'
+PROFILING_SAMPLE_RATE = 0.0
+# Seconds a token from 'manage.py profile_token' stays valid
+PROFILING_TOKEN_MAX_AGE = 3600
+# Number of profiles kept
+PROFILING_KEEP = 200
+
+# Flight recorder of child requests per meeting, see internal/flightRecorder
+# Calls buffered in memory between two saves, the oldest are dropped beyond that
+FLIGHT_RECORDER_BUFFER = 10000
+# Seconds between two saves of the buffer
+FLIGHT_RECORDER_FLUSH_INTERVAL = 5
+# Calls kept per meeting
+FLIGHT_RECORDER_PER_MEETING = 500
+# Characters kept of each response
+FLIGHT_RECORDER_RESPONSE_LENGTH = 500
+# Seconds calls are kept
+FLIGHT_RECORDER_MAX_AGE = 7 * 24 * 60 * 60
+
+# Seconds to wait for each child in the admin's fleet calls
+FLEET_CALL_TIMEOUT = 5
+
+# Load time-series written by 'manage.py sample_load', see internal/loadHistory
+# Seconds between two samples, run sample_load with the same '--interval'
+LOAD_SAMPLE_INTERVAL = 10
+# Seconds each resolution is kept
+LOAD_RETENTION = {
+    "raw": 2 * 24 * 60 * 60,
+    "minute": 30 * 24 * 60 * 60,
+    "hour": 400 * 24 * 60 * 60,
+}
+
+# startStream waits on a waitlist instead of answering 503 while all streamers are busy
+# Starts waiting at most, 0 disables the waitlist
+WAITLIST_SIZE = 100
+# Seconds a start waits before it fails
+WAITLIST_MAX_WAIT = 30 * 60
+# Seconds clients are told to wait with 'Retry-After' when the waitlist is full
+WAITLIST_RETRY_AFTER = 30
+# Seconds of recent admissions the expected wait is estimated from
+WAITLIST_RATE_WINDOW = 60 * 60
+# Priority per tenant for starts without 'priority', higher gets streamers first
+WAITLIST_TENANT_PRIORITIES = {}
+
+# Capacity booked in advance with bookCapacity
+# Channels per stream-edge, None doesn't limit and doesn't book edges
+EDGE_CAPACITY = None
+# Seconds before its start a booking holds back its streamer and edge
+BOOKING_LEAD = 15 * 60
+# Longest booking in seconds
+BOOKING_MAX_DURATION = 24 * 60 * 60
+
+# Logs are written to stdout as JSON lines by a background thread, see bbb_controller/log.py
+# Records waiting for the writer at most, further ones are dropped and counted instead of blocking
+LOG_QUEUE_SIZE = 10000
+# Seconds in which only one of identical warnings or errors is logged
+LOG_REPEAT_WINDOW = 60
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "filters": {
+        "repeats": {"()": "bbb_controller.log.RepeatFilter", "window": LOG_REPEAT_WINDOW},
+    },
+    "handlers": {
+        "queue": {"class": "bbb_controller.log.QueueHandler", "queue_size": LOG_QUEUE_SIZE, "filters": ["repeats"]},
+    },
+    "root": {"level": "INFO", "handlers": ["queue"]},
+}
@@ -0,0 +1,139 @@
+"""
+Compare `children.bbb_api` with bigbluebutton_api_python on large getMeetings responses
+
+Run from the django project's directory: `python -m benchmarks.bbb_api`
+
+Reports for each client
+- parse: milliseconds to extract meetingID, internalMeetingID and running of every meeting
+- memory: peak memory allocated while parsing
+- http: milliseconds per getMeetings against a local keep-alive server
+- url: microseconds to build a checksummed isMeetingRunning url
+"""
+import argparse
+import random
+import threading
+import time
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from bigbluebutton_api_python import BigBlueButton
+from bigbluebutton_api_python.responses import GetMeetingsResponse
+from bigbluebutton_api_python.util import UrlBuilder
+from jxmlease import parse as jxmlease_parse
+
+from children.bbb_api import BBBApi, parse
+
+FIELDS = ("meetingID", "internalMeetingID", "running")
+
+
+def build_response(meetings: int, attendees: int, seed: int) -> bytes:
+    rng = random.Random(seed)
+    parts = ["<response><returncode>SUCCESS</returncode><meetings>"]
+    for i in range(meetings):
+        parts.append(
+            f"<meeting><meetingName>Lecture {i}</meetingName><meetingID>meeting-{i}</meetingID>"
+            f"<internalMeetingID>{rng.getrandbits(160):040x}-{i}</internalMeetingID>"
+            f"<createTime>1600000000000</createTime><createDate>Mon Oct 19 08:00:00 UTC 2026</createDate>"
+            f"<voiceBridge>{70000 + i}</voiceBridge><dialNumber>613-555-1234</dialNumber>"
+            f"<attendeePW>ap-{i}</attendeePW><moderatorPW>mp-{i}</moderatorPW>"
+            f"<running>true</running><duration>0</duration><hasUserJoined>true</hasUserJoined>"
+            f"<recording>false</recording><hasBeenForciblyEnded>false</hasBeenForciblyEnded>"
+            f"<participantCount>{attendees}</participantCount><listenerCount>{attendees}</listenerCount>"
+            f"<voiceParticipantCount>0</voiceParticipantCount><videoCount>0</videoCount>"
+            f"<maxUsers>0</maxUsers><moderatorCount>1</moderatorCount><attendees>"
+        )
+        for j in range(attendees):
+            parts.append(
+                f"<attendee><userID>w_{i}_{j}</userID><fullName>User {j}</fullName><role>VIEWER</role>"
+                f"<isPresenter>false</isPresenter><isListeningOnly>true</isListeningOnly>"
+                f"<hasJoinedVoice>false</hasJoinedVoice><hasVideo>false</hasVideo><clientType>HTML5</clientType>"
+                f"</attendee>"
+            )
+        parts.append("</attendees><metadata/><isBreakout>false</isBreakout></meeting>")
+    parts.append("</meetings></response>")
+    return "".join(parts).encode("utf-8")
+
+
+def library_parse(body: bytes):
+    response = GetMeetingsResponse(jxmlease_parse(body)["response"])
+    return [{field: str(meeting[field]) for field in FIELDS} for meeting in response.get_field("meetings")["meeting"]]
+
+
+def lean_parse(body: bytes):
+    return list(parse((body[i:i + 16384] for i in range(0, len(body), 16384)), FIELDS, record="meeting"))
+
+
+def measure(function, rounds):
+    started = time.perf_counter()
+    for _ in range(rounds):
+        result = function()
+    return (time.perf_counter() - started) / rounds, result
+
+
+def peak_memory(function):
+    tracemalloc.start()
+    function()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+def serve(body: bytes):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/xml")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--meetings", type=int, default=500)
+    parser.add_argument("--attendees", type=int, default=50)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    body = build_response(args.meetings, args.attendees, args.seed)
+    print(f"getMeetings with {args.meetings} meetings of {args.attendees} attendees, {len(body) / 1e6:.1f} MB")
+
+    library_seconds, expected = measure(lambda: library_parse(body), args.rounds)
+    lean_seconds, result = measure(lambda: lean_parse(body), args.rounds)
+    assert result == expected, "The clients disagree"
+
+    server = serve(body)
+    url = f"http://127.0.0.1:{server.server_address[1]}/bigbluebutton/api/"
+    library = BigBlueButton(url, "secret")
+    lean = BBBApi(url, "secret")
+    library_http, _ = measure(lambda: library.get_meetings().get_meetings(), args.rounds)
+    lean_http, _ = measure(lambda: lean.get_meetings(FIELDS), args.rounds)
+    server.shutdown()
+
+    builder = UrlBuilder(url, "secret")
+    library_url, _ = measure(lambda: builder.buildUrl("isMeetingRunning", {"meetingID": "meeting-1"}), 10000)
+    lean_url, _ = measure(lambda: lean.build_url("isMeetingRunning", {"meetingID": "meeting-1"}), 10000)
+
+    print(f"{'client':<28}{'parse ms':>10}{'memory MB':>11}{'http ms':>9}{'url us':>8}")
+    for name, parse_seconds, function, http_seconds, url_seconds in (
+        ("bigbluebutton_api_python", library_seconds, library_parse, library_http, library_url),
+        ("children.bbb_api", lean_seconds, lean_parse, lean_http, lean_url),
+    ):
+        print(
+            f"{name:<28}{parse_seconds * 1e3:>10.1f}{peak_memory(lambda: function(body)) / 1e6:>11.1f}"
+            f"{http_seconds * 1e3:>9.1f}{url_seconds * 1e6:>8.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
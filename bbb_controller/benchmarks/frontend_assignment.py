@@ -0,0 +1,118 @@
+"""
+Compare joinStream's frontend policies
+
+Run from the django project's directory: `python -m benchmarks.frontend_assignment`
+
+Reports for each policy
+- imbalance: highest frontend load divided by the average load
+- sticky: share of reconnecting users landing on their previous frontend
+- churn: share of users which would be moved when a frontend is added or removed
+- time: microseconds per assignment
+"""
+import argparse
+import random
+import time
+
+from api.hashring import HashRing
+
+
+class LeastViewers:
+    """The default policy: pick the frontend with the fewest counted joins"""
+
+    name = "least_viewers"
+
+    def __init__(self, frontends):
+        self.loads = {frontend: 0 for frontend in frontends}
+
+    def assign(self, user):
+        frontend = min(self.loads, key=self.loads.get)
+        self.loads[frontend] += 1
+        return frontend
+
+    def leave(self, frontend):
+        # joinStream's counters are never decremented
+        pass
+
+    def remap(self, users, frontends):
+        policy = LeastViewers(frontends)
+        return {user: policy.assign(user) for user in users}
+
+
+class BoundedHashing:
+    """Consistent hashing with bounded loads keyed on the user"""
+
+    name = "consistent_hash"
+
+    def __init__(self, frontends, load_factor=1.25):
+        self.ring = HashRing(frontends)
+        self.loads = {frontend: 0 for frontend in frontends}
+        self.load_factor = load_factor
+
+    def assign(self, user):
+        frontend = self.ring.lookup(user, self.loads, self.load_factor)
+        self.loads[frontend] += 1
+        return frontend
+
+    def leave(self, frontend):
+        self.loads[frontend] -= 1
+
+    def remap(self, users, frontends):
+        policy = BoundedHashing(frontends, self.load_factor)
+        return {user: policy.assign(user) for user in users}
+
+
+def run(policy_class, frontends, users, reconnects, seed):
+    rng = random.Random(seed)
+    policy = policy_class(frontends)
+    names = [f"user-{i}" for i in range(users)]
+
+    started = time.perf_counter()
+    assignment = {user: policy.assign(user) for user in names}
+    elapsed = time.perf_counter() - started
+
+    loads = policy.loads.values()
+    imbalance = max(loads) / (sum(loads) / len(frontends))
+
+    # Users drop out and reconnect while everyone else stays
+    sticky = 0
+    for user in rng.sample(names, reconnects):
+        policy.leave(assignment[user])
+        frontend = policy.assign(user)
+        sticky += frontend == assignment[user]
+        assignment[user] = frontend
+
+    # Replay all users against a changed set of frontends
+    def churn(changed):
+        remapped = policy.remap(names, changed)
+        return sum(remapped[user] != assignment[user] for user in names) / users
+
+    return {
+        "imbalance": imbalance,
+        "sticky": sticky / reconnects,
+        "churn_add": churn(frontends + [max(frontends) + 1]),
+        "churn_remove": churn(frontends[1:]),
+        "time": elapsed / users * 1e6,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--frontends", type=int, default=8)
+    parser.add_argument("--users", type=int, default=20000)
+    parser.add_argument("--reconnects", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    frontends = list(range(1, args.frontends + 1))
+    print(f"{args.frontends} frontends, {args.users} users, {args.reconnects} reconnects")
+    print(f"{'policy':<16}{'imbalance':>10}{'sticky':>8}{'churn+1':>9}{'churn-1':>9}{'us/join':>9}")
+    for policy_class in (LeastViewers, BoundedHashing):
+        result = run(policy_class, frontends, args.users, args.reconnects, args.seed)
+        print(
+            f"{policy_class.name:<16}{result['imbalance']:>10.3f}{result['sticky']:>8.1%}"
+            f"{result['churn_add']:>9.1%}{result['churn_remove']:>9.1%}{result['time']:>9.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -11,31 +11,58 @@ def clickable_url(obj):
 clickable_url.__name__ = "url"
 
 
+def _set_state(state):
+    def action(modeladmin, request, queryset):
+        queryset.update(state=state)
+    action.__name__ = f"set_{state}"
+    action.short_description = f"Set selected to {state}"
+    return action
+
+
+class _ChildAdmin(admin.ModelAdmin):
+    list_display = ("__str__", clickable_url, "state")
+    list_filter = ("state",)
+    actions = [_set_state(state) for state in ChildState.values]
+
+
 @admin.register(BBBChat)
-class BBBChatAdmin(admin.ModelAdmin):
-    list_display = ("__str__", clickable_url)
+class BBBChatAdmin(_ChildAdmin):
+    pass
 
 
 @admin.register(BBB)
-class BBBAdmin(admin.ModelAdmin):
-    list_display = ("__str__", clickable_url)
+class BBBAdmin(_ChildAdmin):
+    pass
 
 
 @admin.register(BBBLive)
-class BBBLiveAdmin(admin.ModelAdmin):
-    list_display = ("__str__", clickable_url)
+class BBBLiveAdmin(_ChildAdmin):
+    pass
 
 
 @admin.register(StreamEdge)
-class StreamEdgeAdmin(admin.ModelAdmin):
-    list_display = ("__str__", clickable_url)
+class StreamEdgeAdmin(_ChildAdmin):
+    pass
 
 
 @admin.register(StreamFrontend)
-class StreamFrontendAdmin(admin.ModelAdmin):
-    list_display = ("__str__", clickable_url)
+class StreamFrontendAdmin(_ChildAdmin):
+    pass
 
 
 @admin.register(StreamChat)
-class StreamChatAdmin(admin.ModelAdmin):
-    list_display = ("__str__", clickable_url)
+class StreamChatAdmin(_ChildAdmin):
+    pass
+
+
+@admin.register(ChildCall)
+class ChildCallAdmin(admin.ModelAdmin):
+    list_display = ("meeting_id", "created", "method", "endpoint", "child", "seconds", "status_code", "success")
+    list_filter = ("success", "endpoint")
+    search_fields = ("meeting_id",)
+    ordering = ("-id",)
+    readonly_fields = ("meeting_id", "created", "child", "method", "endpoint", "seconds", "status_code", "success",
+                       "response")
+
+    def has_add_permission(self, request):
+        return False
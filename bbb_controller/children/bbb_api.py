@@ -0,0 +1,174 @@
+"""
+Client for the parts of BigBlueButton's API the controller uses
+
+Requests share one pooled keep-alive session. Responses are parsed while they are read,
+keeping only the requested fields instead of building the whole document.
+
+`benchmarks/bbb_api.py` runs it without configuring django.
+"""
+import hashlib
+from typing import Dict, Iterable, Iterator, List, Optional
+from urllib.parse import urlencode
+from xml.etree.ElementTree import XMLPullParser
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from children import deadline
+
+_session = None
+
+
+class BBBError(Exception):
+    """
+    BigBlueButton answered with returncode FAILED
+    """
+
+    def __init__(self, message_key: str, message: str):
+        super().__init__(f"{message_key}: {message}")
+        self.message_key = message_key
+        self.message = message
+
+
+def get_session(pool_size: int = 32) -> requests.Session:
+    """
+    Session shared by all clients, keeping up to `pool_size` connections per host
+    """
+    global _session
+    if _session is None:
+        session = requests.Session()
+        session.headers["user-agent"] = "bbb-controller"
+        adapter = HTTPAdapter(pool_connections=64, pool_maxsize=pool_size)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        _session = session
+    return _session
+
+
+def _base_url(url: str) -> str:
+    if not url.startswith(("http://", "https://")):
+        url = "http://" + url
+    url = url.rstrip("/")
+    if url.endswith("/bigbluebutton/api"):
+        return url + "/"
+    if url.endswith("/bigbluebutton"):
+        return url + "/api/"
+    return url + "/bigbluebutton/api/"
+
+
+def parse(chunks: Iterable[bytes], fields: Iterable[str], record: Optional[str] = None) -> Iterator[dict]:
+    """
+    Incrementally parse a response, yielding dicts of the wanted `fields`
+
+    Without `record` the fields are children of `<response>` and a single dict is yielded.
+    With `record` a dict is yielded for every `<response><*><record>` element, e.g. each meeting in getMeetings.
+    Everything else is dropped as soon as it is parsed. Raises `BBBError` for returncode FAILED.
+    """
+    fields = set(fields)
+    status = {}
+    parser = XMLPullParser(events=("start", "end"))
+    stack = []
+    current = {}
+    done = False
+
+    for chunk in chunks:
+        if done:
+            # Read the rest, so the connection can be reused
+            continue
+        parser.feed(chunk)
+        for event, element in parser.read_events():
+            if event == "start":
+                stack.append(element)
+                continue
+
+            stack.pop()
+            level = len(stack)
+            if level == 1:
+                if element.tag in ("returncode", "messageKey", "message"):
+                    status[element.tag] = element.text or ""
+                    if status.get("returncode") == "FAILED" and "message" in status:
+                        raise BBBError(status.get("messageKey", ""), status["message"])
+                if record is None and element.tag in fields:
+                    current[element.tag] = element.text or ""
+                    if len(current) == len(fields) and status.get("returncode") == "SUCCESS":
+                        done = True
+                        break
+            elif record is not None and level == 3 and element.tag in fields:
+                current[element.tag] = element.text or ""
+            elif record is not None and level == 2 and element.tag == record:
+                yield current
+                current = {}
+
+            # Forget everything seen so far
+            if stack:
+                stack[-1].remove(element)
+
+    if status.get("returncode") == "FAILED":
+        raise BBBError(status.get("messageKey", ""), status.get("message", ""))
+    if record is None:
+        yield current
+
+
+class BBBApi:
+    """
+    BigBlueButton's API of one server
+
+    Requests use the shared pooled session and only the time left of the current `deadline`.
+    """
+
+    def __init__(self, url: str, secret: str, verify=True, session: requests.Session = None):
+        self.base_url = _base_url(url)
+        self.secret = secret
+        self.verify = verify
+        self.session = session or get_session()
+        self._urls = {}
+
+    def build_url(self, call: str, params: Dict[str, str] = None) -> str:
+        """
+        Url of an api call, checksummed with the server's secret
+
+        Urls without parameters are computed only once.
+        """
+        if not params and call in self._urls:
+            return self._urls[call]
+
+        query = urlencode(params or {})
+        checksum = hashlib.sha1((call + query + self.secret).encode("utf-8")).hexdigest()
+        url = f"{self.base_url}{call}?{query}&checksum={checksum}" if query \
+            else f"{self.base_url}{call}?checksum={checksum}"
+        if not params:
+            self._urls[call] = url
+        return url
+
+    def _request(self, call: str, params: Dict[str, str] = None):
+        timeout = deadline.remaining()
+        if timeout == 0.0:
+            # requests doesn't accept a timeout of 0
+            raise requests.Timeout(f"The deadline was exceeded before requesting '{call}'.")
+        response = self.session.get(
+            self.build_url(call, params), verify=self.verify, timeout=timeout, stream=True
+        )
+        try:
+            response.raise_for_status()
+        except requests.HTTPError:
+            # The unread body would keep the connection out of the pool
+            response.close()
+            raise
+        return response
+
+    def _fields(self, call: str, params: Dict[str, str], fields: Iterable[str]) -> dict:
+        with self._request(call, params) as response:
+            return next(parse(response.iter_content(16384), fields))
+
+    def is_meeting_running(self, meeting_id: str) -> bool:
+        return self._fields("isMeetingRunning", {"meetingID": meeting_id}, ["running"]).get("running") == "true"
+
+    def get_meeting_info(self, meeting_id: str, fields=("internalMeetingID", "attendeePW")) -> Dict[str, str]:
+        return self._fields("getMeetingInfo", {"meetingID": meeting_id}, fields)
+
+    def get_meetings(self, fields=("meetingID", "internalMeetingID", "running")) -> List[Dict[str, str]]:
+        """
+        All meetings of the server in one request
+        """
+        with self._request("getMeetings") as response:
+            return list(parse(response.iter_content(16384), fields, record="meeting"))
@@ -0,0 +1,60 @@
+"""
+Time budget of the request currently being handled
+
+Child requests made inside `deadline(seconds)` only get the remaining time as timeout
+and fail right away once the budget is spent.
+"""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+_deadline: ContextVar[Optional[float]] = ContextVar("deadline", default=None)
+
+
+@contextmanager
+def deadline(seconds: Optional[float]):
+    """
+    Limit everything inside the block to `seconds`, None meaning no limit
+
+    A nested deadline can't extend the outer one.
+    """
+    if seconds is None:
+        yield
+        return
+
+    end = time.monotonic() + seconds
+    outer = _deadline.get()
+    if outer is not None:
+        end = min(end, outer)
+    token = _deadline.set(end)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining() -> Optional[float]:
+    """
+    Seconds left of the current deadline, None without a deadline
+    """
+    end = _deadline.get()
+    if end is None:
+        return None
+    return max(0.0, end - time.monotonic())
+
+
+def exceeded() -> bool:
+    return remaining() == 0.0
+
+
+@contextmanager
+def grace(seconds: float):
+    """
+    Give compensating calls a fresh budget of `seconds`, even if the request's budget is spent
+    """
+    token = _deadline.set(time.monotonic() + seconds)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
@@ -0,0 +1,43 @@
+# Generated by Django 3.2.25 on 2026-10-19 15:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('children', '0003_auto_20210507_1524'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bbb',
+            name='state',
+            field=models.CharField(choices=[('active', 'Active'), ('draining', 'Draining'), ('disabled', 'Disabled')], default='active', max_length=16),
+        ),
+        migrations.AddField(
+            model_name='bbbchat',
+            name='state',
+            field=models.CharField(choices=[('active', 'Active'), ('draining', 'Draining'), ('disabled', 'Disabled')], default='active', max_length=16),
+        ),
+        migrations.AddField(
+            model_name='bbblive',
+            name='state',
+            field=models.CharField(choices=[('active', 'Active'), ('draining', 'Draining'), ('disabled', 'Disabled')], default='active', max_length=16),
+        ),
+        migrations.AddField(
+            model_name='streamchat',
+            name='state',
+            field=models.CharField(choices=[('active', 'Active'), ('draining', 'Draining'), ('disabled', 'Disabled')], default='active', max_length=16),
+        ),
+        migrations.AddField(
+            model_name='streamedge',
+            name='state',
+            field=models.CharField(choices=[('active', 'Active'), ('draining', 'Draining'), ('disabled', 'Disabled')], default='active', max_length=16),
+        ),
+        migrations.AddField(
+            model_name='streamfrontend',
+            name='state',
+            field=models.CharField(choices=[('active', 'Active'), ('draining', 'Draining'), ('disabled', 'Disabled')], default='active', max_length=16),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 3.2.25 on 2026-10-19 15:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('children', '0004_child_state'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChildCall',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('meeting_id', models.CharField(db_index=True, max_length=255)),
+                ('created', models.DateTimeField()),
+                ('child', models.CharField(max_length=255)),
+                ('method', models.CharField(max_length=8)),
+                ('endpoint', models.CharField(max_length=64)),
+                ('seconds', models.FloatField()),
+                ('status_code', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('success', models.BooleanField()),
+                ('response', models.TextField(blank=True)),
+            ],
+        ),
+    ]
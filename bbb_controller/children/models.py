@@ -1,48 +1,129 @@
 import os
 import logging
+import time
 from json import JSONDecodeError
 
 from django.conf import settings
 from django.db import models
 from django.utils.functional import cached_property
-from bigbluebutton_api_python import BigBlueButton
 from django.utils.http import urlencode
 from rc_protocol import get_checksum
 import requests
 from requests import RequestException
 
+from children import deadline, recorder
+from children.bbb_api import BBBApi
+
 request_logger = logging.getLogger("children.requests")
 
 
-def _post(base_url, secret, endpoint, params):
+def _request(method, base_url, secret, endpoint, params):
     url = os.path.join(base_url, endpoint)
+    meeting_id = params.get("meeting_id") or params.get("chat_id")
     params["checksum"] = get_checksum(params, secret, endpoint)
 
+    # Only use what is left of the request's budget
+    timeout = deadline.remaining()
+    if timeout == 0.0:
+        result = {"success": False, "message": f"The deadline was exceeded before requesting '{url}'."}
+        if meeting_id:
+            recorder.record(meeting_id, time.time(), base_url, method, endpoint, 0.0, None, False, result["message"])
+        return result
+
+    started = time.time()
+    response = None
     try:
-        response = requests.post(
-            url,
-            json=params,
-            headers={"user-agent": "bbb-controller"},
-            verify=settings.VERIFY_SSL_CERTS
-        )
+        if method == "get":
+            response = requests.get(
+                url,
+                params=params,
+                headers={"user-agent": "bbb-controller"},
+                verify=settings.VERIFY_SSL_CERTS,
+                timeout=timeout
+            )
+        else:
+            response = requests.post(
+                url,
+                json=params,
+                headers={"user-agent": "bbb-controller"},
+                verify=settings.VERIFY_SSL_CERTS,
+                timeout=timeout
+            )
     except RequestException as err:
-        request_logger.exception(f"Couldn't request '{url}'")
-        return {"success": False, "message": f"The request failed with an '{repr(err)}'. "
-                                             "See the log for full traceback."}
+        request_logger.exception(f"Couldn't request '{url}'", extra={
+            "meeting_id": meeting_id, "child": base_url, "endpoint": endpoint, "latency": time.time() - started,
+        })
+        result = {"success": False, "message": f"The request failed with an '{repr(err)}'. "
+                                               "See the log for full traceback."}
+    else:
+        if response.status_code == 304:
+            result = {"success": True, "message": "Got '304'"}
+        else:
+            try:
+                result = response.json()
+            except JSONDecodeError:
+                result = {"success": False, "message": f"The response from {url} wasn't json. "
+                                                       f"Got '{response.status_code}: {response.reason}' instead."}
+
+    if meeting_id:
+        recorder.record(
+            meeting_id, started, base_url, method, endpoint, time.time() - started,
+            None if response is None else response.status_code,
+            isinstance(result, dict) and bool(result.get("success")),
+            result["message"] if response is None else response.text,
+        )
+    return result
 
-    if response.status_code == 304:
-        return {"success": True, "message": "Got '304'"}
 
-    try:
-        return response.json()
-    except JSONDecodeError:
-        return {"success": False, "message": f"The response from {url} wasn't json. "
-                                             f"Got '{response.status_code}: {response.reason}' instead."}
+def _post(base_url, secret, endpoint, params):
+    return _request("post", base_url, secret, endpoint, params)
+
+
+def _get(base_url, secret, endpoint, params):
+    return _request("get", base_url, secret, endpoint, params)
+
+
+class ChildCall(models.Model):
+    """
+    A request to a child, saved by the flight recorder
+    """
+    meeting_id = models.CharField(max_length=255, db_index=True)
+    created = models.DateTimeField()
+    child = models.CharField(max_length=255)
+    method = models.CharField(max_length=8)
+    endpoint = models.CharField(max_length=64)
+    seconds = models.FloatField()
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    success = models.BooleanField()
+    response = models.TextField(blank=True)
+
+    def __str__(self):
+        return f"{self.meeting_id}: {self.method.upper()} {self.endpoint}"
+
+    def as_dict(self):
+        return {
+            "time": self.created.isoformat(),
+            "child": self.child,
+            "method": self.method,
+            "endpoint": self.endpoint,
+            "seconds": round(self.seconds, 3),
+            "status_code": self.status_code,
+            "success": self.success,
+            "response": self.response,
+        }
+
+
+class ChildState(models.TextChoices):
+    ACTIVE = "active"
+    # Keeps its current work, but gets no new one
+    DRAINING = "draining"
+    DISABLED = "disabled"
 
 
 class _Child(models.Model):
     url: str
     secret: str
+    state = models.CharField(choices=ChildState.choices, default=ChildState.ACTIVE, max_length=16)
 
     def __str__(self):
         return self.url
@@ -67,7 +148,7 @@ class BBB(_Child):
 
     @cached_property
     def api(self):
-        return BigBlueButton(self.url, self.secret)
+        return BBBApi(self.url, self.secret, verify=settings.VERIFY_SSL_CERTS)
 
     def get_absolute_url(self):
         return f"https://mconf.github.io/api-mate/#server={self.url}&sharedSecret={self.secret}"
@@ -96,6 +177,9 @@ class BBBChat(_Child):
     def end_chat(self, meeting_id):
         return _post(self.url, self.secret, "endChat", {"chat_id": meeting_id})
 
+    def running_chats(self):
+        return _get(self.url, self.secret, "runningChats", {})
+
 
 class BBBLive(_Child):
     url = models.CharField(default="", max_length=255)
@@ -105,6 +189,11 @@ class BBBLive(_Child):
     def api_url(self):
         return os.path.join(self.url, "api", "v1")
 
+    def prepare_stream(self, meeting_id):
+        return _post(self.api_url, self.secret, "prepareStream", {
+            "meeting_id": meeting_id,
+        })
+
     def start_stream(self, rtmp_uri, meeting_id, meeting_password):
         return _post(self.api_url, self.secret, "startStream", {
             "rtmp_uri": rtmp_uri,
@@ -117,6 +206,14 @@ class BBBLive(_Child):
             "meeting_id": meeting_id,
         })
 
+    def stream_status(self, meeting_id):
+        return _post(self.api_url, self.secret, "streamStatus", {
+            "meeting_id": meeting_id,
+        })
+
+    def running_streams(self):
+        return _get(self.api_url, self.secret, "runningStreams", {})
+
 
 class StreamEdge(_Child):
     url = models.CharField(default="", max_length=255)
@@ -136,6 +233,9 @@ class StreamEdge(_Child):
             "meeting_id": meeting_id,
         })
 
+    def open_channels(self):
+        return _get(self.api_url, self.secret, "openChannels", {})
+
 
 class StreamFrontend(_Child):
     url = models.CharField(default="", max_length=255)
@@ -145,12 +245,14 @@ class StreamFrontend(_Child):
     def api_url(self):
         return os.path.join(self.url, "api", "v1")
 
-    def open_channel(self, meeting_id, welcome_msg=None, redirect_url=None, **kwargs):
+    def open_channel(self, meeting_id, welcome_msg=None, redirect_url=None, stream_edges=None, **kwargs):
         params = {"meeting_id": meeting_id}
         if welcome_msg:
             params["welcome_msg"] = welcome_msg
         if redirect_url:
             params["redirect_url"] = redirect_url
+        if stream_edges:
+            params["stream_edges"] = stream_edges
 
         return _post(self.api_url, self.secret, "openChannel", params)
 
@@ -159,6 +261,9 @@ class StreamFrontend(_Child):
             "meeting_id": meeting_id,
         })
 
+    def viewer_counts(self):
+        return _post(self.api_url, self.secret, "viewerCounts", {})
+
 
 class StreamChat(_Child):
     url = models.CharField(default="", max_length=255)
@@ -178,3 +283,16 @@ class StreamChat(_Child):
 
     def end_chat(self, meeting_id):
         return _post(self.api_url, self.secret, "endChat", {"chat_id": meeting_id})
+
+    def running_chats(self):
+        return _get(self.api_url, self.secret, "runningChats", {})
+
+
+CHILD_TYPES = {
+    "bbb": BBB,
+    "bbb-chat": BBBChat,
+    "bbb-live": BBBLive,
+    "stream-edge": StreamEdge,
+    "stream-frontend": StreamFrontend,
+    "stream-chat": StreamChat,
+}
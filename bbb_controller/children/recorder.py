@@ -0,0 +1,155 @@
+"""
+Flight recorder of every child request made for a meeting
+
+Requests only append a tuple to an in-memory ring buffer. A background thread
+bulk inserts the buffer into `ChildCall` every `FLIGHT_RECORDER_FLUSH_INTERVAL` seconds
+and keeps the newest `FLIGHT_RECORDER_PER_MEETING` calls of each meeting.
+If the database can't keep up, the oldest unsaved calls are dropped and counted.
+"""
+import atexit
+import logging
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta, timezone
+
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger("children.recorder")
+
+# (meeting_id, timestamp, child, method, endpoint, seconds, status_code, success, response)
+_buffer = deque(maxlen=settings.FLIGHT_RECORDER_BUFFER)
+_dropped = 0
+_flusher = None
+_flusher_lock = threading.Lock()
+_flush_lock = threading.Lock()
+
+
+def record(meeting_id, started, child, method, endpoint, seconds, status_code, success, response):
+    """
+    Remember a child request, never touches the database
+    """
+    global _dropped
+    if len(_buffer) == _buffer.maxlen:
+        _dropped += 1
+    _buffer.append((
+        meeting_id, started, child, method, endpoint, seconds,
+        status_code, success, response[:settings.FLIGHT_RECORDER_RESPONSE_LENGTH],
+    ))
+    if _flusher is None:
+        _start_flusher()
+
+
+def dropped() -> int:
+    """
+    Number of calls which fell out of the buffer before they could be saved
+    """
+    return _dropped
+
+
+def pending(meeting_id: str):
+    """
+    Calls of a meeting which aren't saved yet, as `ChildCall.as_dict()`
+    """
+    return [_as_dict(entry) for entry in list(_buffer) if entry[0] == meeting_id]
+
+
+def _as_dict(entry):
+    meeting_id, started, child, method, endpoint, seconds, status_code, success, response = entry
+    return {
+        "time": datetime.fromtimestamp(started, timezone.utc).isoformat(),
+        "child": child,
+        "method": method,
+        "endpoint": endpoint,
+        "seconds": round(seconds, 3),
+        "status_code": status_code,
+        "success": success,
+        "response": response,
+    }
+
+
+def _save(entries):
+    from children.models import ChildCall
+
+    ChildCall.objects.bulk_create([
+        ChildCall(
+            meeting_id=meeting_id,
+            created=datetime.fromtimestamp(started, timezone.utc),
+            child=child[:255],
+            method=method,
+            endpoint=endpoint[:64],
+            seconds=seconds,
+            status_code=status_code,
+            success=success,
+            response=response,
+        )
+        for meeting_id, started, child, method, endpoint, seconds, status_code, success, response in entries
+    ], batch_size=500)
+
+
+def _requeue(entries):
+    """
+    Put entries which couldn't be saved back in front of the buffer, counting what doesn't fit anymore
+    """
+    global _dropped
+    room = _buffer.maxlen - len(_buffer)
+    kept = entries[len(entries) - room:] if room < len(entries) else entries
+    _dropped += len(entries) - len(kept)
+    _buffer.extendleft(reversed(kept))
+
+
+def flush():
+    """
+    Save everything buffered in one bulk insert and enforce the limits
+    """
+    from children.models import ChildCall
+
+    with _flush_lock:
+        entries = []
+        while _buffer:
+            try:
+                entries.append(_buffer.popleft())
+            except IndexError:
+                break
+        if not entries:
+            return 0
+
+        try:
+            _save(entries)
+        except Exception:
+            _requeue(entries)
+            raise
+
+        for meeting_id in {entry[0] for entry in entries}:
+            oldest_kept = ChildCall.objects.filter(meeting_id=meeting_id).order_by("-id") \
+                .values_list("id", flat=True)[settings.FLIGHT_RECORDER_PER_MEETING - 1:settings.FLIGHT_RECORDER_PER_MEETING]
+            oldest_kept = list(oldest_kept)
+            if oldest_kept:
+                ChildCall.objects.filter(meeting_id=meeting_id, id__lt=oldest_kept[0]).delete()
+        ChildCall.objects.filter(
+            created__lt=datetime.now(timezone.utc) - timedelta(seconds=settings.FLIGHT_RECORDER_MAX_AGE)
+        ).delete()
+        return len(entries)
+
+
+def _run():
+    while True:
+        time.sleep(settings.FLIGHT_RECORDER_FLUSH_INTERVAL)
+        try:
+            flush()
+        except Exception:
+            logger.exception("Couldn't save the flight recorder")
+        finally:
+            connection.close()
+
+
+def _start_flusher():
+    global _flusher
+    with _flusher_lock:
+        if _flusher is not None:
+            return
+        _flusher = threading.Thread(target=_run, name="flight-recorder", daemon=True)
+        _flusher.start()
+        # Short lived processes like management commands save their calls on exit
+        atexit.register(flush)
@@ -1,3 +1,154 @@
+import time
+from collections import deque
+from unittest import mock
+
+import requests
 from django.test import TestCase
 
-# Create your tests here.
+from children import deadline, recorder
+from children.bbb_api import BBBApi, BBBError, parse
+from children.models import ChildCall, _request
+from children.views import call_fleet
+
+
+class DeadlineTest(TestCase):
+
+    def test_without_deadline(self):
+        self.assertIsNone(deadline.remaining())
+        self.assertFalse(deadline.exceeded())
+
+    def test_nested_deadline_cant_extend(self):
+        with deadline.deadline(1):
+            with deadline.deadline(10):
+                self.assertLessEqual(deadline.remaining(), 1)
+            with deadline.deadline(None):
+                self.assertLessEqual(deadline.remaining(), 1)
+        self.assertIsNone(deadline.remaining())
+
+    def test_spent(self):
+        with deadline.deadline(0.01):
+            time.sleep(0.02)
+            self.assertEqual(deadline.remaining(), 0.0)
+            self.assertTrue(deadline.exceeded())
+            with deadline.grace(5):
+                self.assertGreater(deadline.remaining(), 4)
+            self.assertTrue(deadline.exceeded())
+
+    @mock.patch("children.models.requests.post")
+    def test_child_request_gets_remaining_time(self, post):
+        post.return_value.status_code = 200
+        post.return_value.json.return_value = {"success": True, "message": ""}
+        with deadline.deadline(2):
+            _request("post", "https://child/api/v1", "secret", "endpoint", {})
+        self.assertLessEqual(post.call_args.kwargs["timeout"], 2)
+
+    @mock.patch("children.models.requests.post")
+    def test_child_request_with_spent_budget(self, post):
+        with deadline.deadline(0):
+            response = _request("post", "https://child/api/v1", "secret", "endpoint", {})
+        self.assertFalse(response["success"])
+        post.assert_not_called()
+
+
+class RecorderTest(TestCase):
+
+    def setUp(self):
+        patcher = mock.patch.multiple(recorder, _buffer=deque(maxlen=3), _dropped=0, _flusher=object())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def record(self, meeting_id):
+        recorder.record(meeting_id, time.time(), "https://child", "post", "startStream", 0.1, 200, True, "{}")
+
+    def test_flush(self):
+        self.record("a")
+        self.record("b")
+        self.assertEqual(recorder.flush(), 2)
+        self.assertEqual(sorted(ChildCall.objects.values_list("meeting_id", flat=True)), ["a", "b"])
+        self.assertEqual(recorder.pending("a"), [])
+
+    def test_failed_flush_keeps_entries(self):
+        self.record("a")
+        self.record("b")
+        with mock.patch.object(recorder, "_save", side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                recorder.flush()
+        self.assertEqual([entry[0] for entry in recorder._buffer], ["a", "b"])
+        self.assertEqual(recorder.dropped(), 0)
+
+    def test_failed_flush_counts_what_doesnt_fit(self):
+        for meeting_id in "abc":
+            self.record(meeting_id)
+
+        def save(entries):
+            # Recorded while the flush was running
+            self.record("d")
+            self.record("e")
+            raise RuntimeError
+
+        with mock.patch.object(recorder, "_save", side_effect=save):
+            with self.assertRaises(RuntimeError):
+                recorder.flush()
+        self.assertEqual([entry[0] for entry in recorder._buffer], ["c", "d", "e"])
+        self.assertEqual(recorder.dropped(), 2)
+
+
+class BBBApiTest(TestCase):
+
+    def test_parse(self):
+        body = (
+            b"<response><returncode>SUCCESS</returncode><meetings>"
+            b"<meeting><meetingID>a</meetingID><attendees><attendee><userID>1</userID></attendee></attendees></meeting>"
+            b"<meeting><meetingID>b</meetingID></meeting>"
+            b"</meetings></response>"
+        )
+        chunks = [body[i:i + 7] for i in range(0, len(body), 7)]
+        self.assertEqual(list(parse(chunks, ["meetingID"], record="meeting")), [{"meetingID": "a"}, {"meetingID": "b"}])
+
+    def test_parse_failed(self):
+        body = (
+            b"<response><returncode>FAILED</returncode>"
+            b"<messageKey>notFound</messageKey><message>No</message></response>"
+        )
+        with self.assertRaises(BBBError):
+            list(parse([body], ["running"]))
+
+    def test_spent_budget(self):
+        session = mock.Mock()
+        api = BBBApi("https://bbb", "secret", session=session)
+        with deadline.deadline(0):
+            with self.assertRaises(requests.Timeout):
+                api.is_meeting_running("m")
+        session.get.assert_not_called()
+
+    def test_error_status_closes_response(self):
+        response = mock.Mock()
+        response.raise_for_status.side_effect = requests.HTTPError("500")
+        api = BBBApi("https://bbb", "secret", session=mock.Mock(**{"get.return_value": response}))
+        with self.assertRaises(requests.HTTPError):
+            api.is_meeting_running("m")
+        response.close.assert_called_once_with()
+
+
+class FleetCallTest(TestCase):
+
+    def test_majority_and_outliers(self):
+        answers = {
+            "a": (200, '{"success": true}', 10),
+            "b": (200, '{"success": true}', 12),
+            "c": (200, '{"success": true}', 50),
+            "d": (200, '{"success": false}', 11),
+            "e": (None, "ConnectionError()", 9),
+        }
+
+        def call(child, method, endpoint, parameters):
+            status_code, text, milliseconds = answers[child]
+            return {"child": child, "status_code": status_code, "milliseconds": milliseconds, "text": text}
+
+        with mock.patch("children.views._call_child", side_effect=call):
+            rows = call_fleet(list(answers), "post", "openChannels", {})
+        self.assertEqual([row["child"] for row in rows if row["diverging"]], ["d", "e"])
+        self.assertEqual([row["child"] for row in rows if row["slow"]], ["c"])
+
+    def test_no_children(self):
+        self.assertEqual(call_fleet([], "post", "openChannels", {}), [])
@@ -1,5 +1,9 @@
 import json
 import os
+import statistics
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from typing import List
 
 import requests
@@ -10,6 +14,9 @@ from django.utils.http import urlencode
 from django.views.generic import TemplateView
 from django.contrib.auth.mixins import LoginRequiredMixin
 from rc_protocol import get_checksum
+from requests import RequestException
+
+from children.models import CHILD_TYPES
 
 
 class Endpoint:
@@ -48,6 +55,68 @@ apis = list(enumerate([
 ]))
 
 
+# BBB itself doesn't use rc_protocol's checksums
+FLEET_TYPES = [name for name in CHILD_TYPES if name != "bbb"]
+
+
+def _summarize(text: str):
+    try:
+        content = json.loads(text)
+    except json.decoder.JSONDecodeError:
+        return text
+    return json.dumps(content, sort_keys=True)
+
+
+def _call_child(child, method, endpoint, parameters):
+    """
+    Call an endpoint on a child and measure it, never raises
+    """
+    parameters = dict(parameters)
+    parameters["checksum"] = get_checksum(parameters, child.secret, endpoint)
+    url = os.path.join(child.api_url, endpoint)
+
+    started = time.monotonic()
+    try:
+        if method == "post":
+            response = requests.post(url, json=parameters, verify=settings.VERIFY_SSL_CERTS,
+                                     headers={"user-agent": "bbb-controller"}, timeout=settings.FLEET_CALL_TIMEOUT)
+        else:
+            response = requests.get(url, params=parameters, verify=settings.VERIFY_SSL_CERTS,
+                                    headers={"user-agent": "bbb-controller"}, timeout=settings.FLEET_CALL_TIMEOUT)
+    except RequestException as err:
+        status_code, text = None, repr(err)
+    else:
+        status_code, text = response.status_code, _summarize(response.text)
+
+    return {
+        "child": child,
+        "status_code": status_code,
+        "milliseconds": round((time.monotonic() - started) * 1000),
+        "text": text,
+    }
+
+
+def call_fleet(children, method, endpoint, parameters):
+    """
+    Call the same endpoint on all children concurrently
+
+    Rows whose response differs from the most common one are marked `diverging`,
+    rows taking more than twice the median are marked `slow`.
+    """
+    with ThreadPoolExecutor(max_workers=max(1, min(len(children), 32))) as executor:
+        rows = list(executor.map(lambda child: _call_child(child, method, endpoint, parameters), children))
+    if not rows:
+        return rows
+
+    common, _ = Counter(row["text"] for row in rows).most_common(1)[0]
+    median = statistics.median(row["milliseconds"] for row in rows)
+    for row in rows:
+        row["diverging"] = row["status_code"] != 200 or row["text"] != common
+        row["slow"] = row["milliseconds"] > 2 * median
+        row["summary"] = row["text"][:200]
+    return rows
+
+
 class MakeCallsView(LoginRequiredMixin, TemplateView):
 
     template_name = "calls.html"
@@ -68,8 +137,13 @@ class MakeCallsView(LoginRequiredMixin, TemplateView):
             "parameters": json.dumps(parameters, indent=4),
             "redirect": redirect,
             "apis": apis,
+            "fleet_types": FLEET_TYPES,
         }
 
+        fleet = request.GET.get("fleet")
+        if fleet in FLEET_TYPES:
+            return self.fleet(request, fleet, method, parameters, context)
+
         if method not in ("get", "post"):
             pass
 
@@ -95,3 +169,26 @@ class MakeCallsView(LoginRequiredMixin, TemplateView):
             }
 
         return render(request, self.template_name, context=context)
+
+    def fleet(self, request, fleet, method, parameters, context):
+        """
+        Fleet mode: call an endpoint on every child of a type or on the chosen ones
+        """
+        children = list(CHILD_TYPES[fleet].objects.order_by("id"))
+        chosen = {int(pk) for pk in request.GET.getlist("child") if pk.isdigit()}
+        endpoint = request.GET.get("endpoint", "")
+
+        context = {
+            **context,
+            "fleet": fleet,
+            "endpoint": endpoint,
+            "children": [(child, not chosen or child.id in chosen) for child in children],
+        }
+        if endpoint:
+            started = time.monotonic()
+            context["rows"] = call_fleet(
+                [child for child in children if not chosen or child.id in chosen], method, endpoint, parameters
+            )
+            context["milliseconds"] = round((time.monotonic() - started) * 1000)
+
+        return render(request, self.template_name, context=context)
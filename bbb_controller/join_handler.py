@@ -0,0 +1,101 @@
+"""
+Minimal WSGI handler answering joinStream from the published join table
+
+It doesn't set up django. Run it next to the controller, for example with
+`gunicorn --bind unix:/run/bbb-controller-join.sock join_handler:application`,
+and route `/api/v1/joinStream` to it (see controller.nginx).
+
+Requests it can't answer from the table get a 404, which nginx hands over to django.
+"""
+import hmac
+import json
+import os
+import random
+import threading
+import time
+from urllib.parse import parse_qsl, urlencode
+
+from rc_protocol import get_checksum, validate_checksum
+
+from bbb_controller import settings
+
+
+def _respond(start_response, status, message, headers=()):
+    body = json.dumps({"success": False, "message": message}).encode("utf-8")
+    start_response(status, [("Content-Type", "application/json"), *headers])
+    return [body]
+
+
+class JoinTable:
+
+    def __init__(self, path):
+        self.path = str(path)
+        self.mtime = None
+        self.table = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        with open(self.path) as file:
+            content = json.load(file)
+        payload = content["payload"]
+        signature = hmac.new(settings.SHARED_SECRET.encode("utf-8"), payload.encode("utf-8"), "sha256").hexdigest()
+        if not hmac.compare_digest(signature, content["signature"]):
+            return None
+
+        table = json.loads(payload)
+        table["frontends"] = {int(key): value for key, value in table["frontends"].items()}
+        return table
+
+    def get(self):
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except FileNotFoundError:
+            return None
+
+        with self._lock:
+            if mtime != self.mtime:
+                self.table = self._load()
+                self.mtime = mtime
+
+        if self.table is None or time.time() - self.table["created"] > settings.JOIN_TABLE_MAX_AGE:
+            return None
+        return self.table
+
+
+join_table = JoinTable(settings.JOIN_TABLE_PATH)
+
+
+def application(environ, start_response):
+    parameters = dict(parse_qsl(environ.get("QUERY_STRING", "")))
+    if "checksum" not in parameters:
+        return _respond(start_response, "400 Bad Request", "No checksum was given.")
+    if not validate_checksum(dict(parameters), settings.SHARED_SECRET, "joinStream", settings.SHARED_SECRET_TIME_DELTA):
+        return _respond(start_response, "400 Bad Request", "Checksum was incorrect.")
+    for param in ("meeting_id", "user_name"):
+        if param not in parameters:
+            return _respond(start_response, "400 Bad Request", f"Parameter {param} is mandatory but missing.")
+
+    meeting_id = parameters["meeting_id"]
+    table = join_table.get()
+    if table is None or meeting_id not in table["channels"]:
+        return _respond(start_response, "404 Not Found", "No channel was opened for this meeting")
+
+    # Pick a frontend by the weights computed from the last known viewer counts
+    assignments = table["channels"][meeting_id]
+    frontend_id, = random.choices(
+        [frontend for frontend, _ in assignments],
+        weights=[weight for _, weight in assignments],
+    )
+    url, secret = table["frontends"][frontend_id]
+
+    # Record the join for 'manage.py publish_join_table'
+    with open(settings.JOIN_SPOOL_PATH, "a") as spool:
+        spool.write(f"{meeting_id}\t{frontend_id}\n")
+
+    get = {
+        "meeting_id": meeting_id,
+        "user_name": parameters["user_name"],
+    }
+    get["checksum"] = get_checksum(get, secret, "join")
+    start_response("302 Found", [("Location", os.path.join(url, "api/v1/join?") + urlencode(get))])
+    return [b""]
@@ -27,12 +27,29 @@ import multiprocessing
 workers = 2 * multiprocessing.cpu_count()
 worker_class = "sync"
 threads = 1
+# Seconds a worker may be busy before it is killed together with its background operations
+# Keep it above REQUEST_BUDGET + COMPENSATION_BUDGET and OPERATION_MAX_WAIT of the django settings
+timeout = 120
 
 # [ LOGGING ]
 loglevel = "info"
-# "-" is stdout
-accesslog = "-"
-errorlog = "-"
+# Access and error log are written to stdout as JSON lines by a background thread, see bbb_controller/log.py
+logconfig_dict = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "formatters": {},
+    "filters": {
+        "repeats": {"()": "bbb_controller.log.RepeatFilter", "window": 60},
+    },
+    "handlers": {
+        "queue": {"class": "bbb_controller.log.QueueHandler", "queue_size": 10000, "filters": ["repeats"]},
+    },
+    "root": {"level": "INFO", "handlers": ["queue"]},
+    "loggers": {
+        "gunicorn.error": {"level": "INFO", "handlers": ["queue"], "propagate": False},
+        "gunicorn.access": {"level": "INFO", "handlers": ["queue"], "propagate": False},
+    },
+}
 
 # [ DEPLOYMENT ]
 # X-Forwarded-For trusted sources, comma seperated